@@ -0,0 +1,149 @@
+"""End-to-end throughput benchmarks of the request pipeline against a mock PSI API.
+
+Runs run_requests() and the report writers for each URL count and output
+format against benchmarks/mock_server.py, so no API quota is used. Each
+benchmark runs in a fresh process so its peak RSS isn't inflated by earlier
+ones. Reports URLs/s, p50/p99 request latency (from scheduling to response,
+including retries) and peak RSS.
+
+Typical usage example:
+    python benchmarks/bench.py
+    python benchmarks/bench.py --sizes 100 1000 --formats excel --error-rate 0.02
+    python benchmarks/bench.py --json before.json  # Save results to compare
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_server import MockPSIServer, add_config_args, config_from_args  # noqa: E402
+
+from pyspeedinsights.api import request  # noqa: E402
+from pyspeedinsights.api.response import get_fields_mask  # noqa: E402
+from pyspeedinsights.core.writer import ReportWriter  # noqa: E402
+
+Result = dict[str, Any]
+
+
+def run_benchmark(size: int, format: str, args: argparse.Namespace) -> Result:
+    """Runs a single benchmark and gets its results."""
+    logging.basicConfig(level=logging.ERROR)
+    os.environ["PSI_API_KEYS"] = ",".join(f"bench-key-{i}" for i in range(args.keys))
+    latencies = []
+    get_response = request.get_response
+
+    async def timed_get_response(*args: Any, **kwargs: Any) -> dict:
+        start = time.perf_counter()
+        try:
+            return await get_response(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    request.get_response = timed_get_response  # type: ignore[assignment]
+    urls = [f"https://example.com/page-{i}" for i in range(size)]
+    api_args_dict = {
+        "category": ["performance"],
+        "strategy": ["desktop"],
+        "fields": None if args.full_response else get_fields_mask(format),
+    }
+
+    with MockPSIServer(config_from_args(args)) as server:
+        # Reports are written to the working directory. The quota ledger and
+        # caches go there too so benchmarks don't use up the real daily quota.
+        cwd, output_dir = os.getcwd(), tempfile.mkdtemp(prefix="psi-bench-")
+        os.environ["PSI_CACHE_DIR"] = output_dir
+        request.PSI_API_URL = server.url
+        os.chdir(output_dir)
+        writer = ReportWriter(format, ["performance"])
+        start = time.perf_counter()
+        request.run_requests(
+            urls,
+            api_args_dict,
+            writer.write,
+            rate=args.rate,
+            concurrency=args.concurrency,
+            min_concurrency=args.min_concurrency,
+            no_cache=True,
+            decode_in_thread=args.decode_in_thread,
+            use_uvloop=args.uvloop,
+            rate_limit_retries=args.retries,
+            server_retries=args.retries,
+        )
+        writer.finalize()
+        elapsed = time.perf_counter() - start
+        statuses = dict(server.stats)
+    os.chdir(cwd)
+    shutil.rmtree(output_dir)
+
+    # ru_maxrss is in KB on Linux and bytes on macOS.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024**2 if sys.platform == "darwin" else 1024)
+    latencies.sort()
+    return {
+        "size": size,
+        "format": format,
+        "seconds": round(elapsed, 3),
+        "urls_per_second": round(size / elapsed, 1),
+        "p50_latency": round(statistics.median(latencies), 4),
+        "p99_latency": round(latencies[int(0.99 * (len(latencies) - 1))], 4),
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "statuses": statuses,
+    }
+
+
+def _run_in_process(size: int, format: str, args: argparse.Namespace) -> Result:
+    """Runs a benchmark in a fresh process and gets its results."""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(run_benchmark, (size, format, args))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument(
+        "--formats", nargs="+", default=["json", "excel"], choices=["json", "excel"]
+    )
+    parser.add_argument("--rate", type=float, default=10000.0)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--min-concurrency", type=int, default=1)
+    parser.add_argument("--keys", type=int, default=1, help="API keys in the pool.")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--decode-in-thread", action="store_true")
+    parser.add_argument("--uvloop", action="store_true")
+    parser.add_argument("--full-response", action="store_true")
+    parser.add_argument("--json", type=Path, help="Save the results to a file.")
+    add_config_args(parser)
+    args = parser.parse_args()
+
+    header = f"{'URLs':>6} {'format':>6} {'URLs/s':>8} {'p50 s':>8} {'p99 s':>8}"
+    print(f"{header} {'RSS MB':>8}  statuses")
+    results = []
+    for format in args.formats:
+        for size in args.sizes:
+            result = _run_in_process(size, format, args)
+            results.append(result)
+            print(
+                f"{size:>6} {format:>6} {result['urls_per_second']:>8} "
+                f"{result['p50_latency']:>8} {result['p99_latency']:>8} "
+                f"{result['peak_rss_mb']:>8}  {result['statuses']}"
+            )
+
+    if args.json is not None:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
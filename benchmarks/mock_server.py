@@ -0,0 +1,261 @@
+"""Local stand-in for the PSI API's runPagespeed endpoint.
+
+Serves PSI-shaped responses with a configurable latency distribution, injected
+429 and 5xx errors and padding to simulate the size of real reports (which are
+mostly screenshots). Responses are generated from the sample results in
+`tests/excel/sample_data.py` unless a recorded response is given as a fixture.
+
+Typical usage example:
+    with MockPSIServer(MockConfig(latency_median=0.2)) as server:
+        request.PSI_API_URL = server.url
+        ...  # Run requests against the mock server
+
+Or standalone, e.g. to point other tools at it:
+    python benchmarks/mock_server.py --port 8080 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import sys
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tests.excel.sample_data import audit_results  # noqa: E402
+
+CRUX_METRICS = (
+    "CUMULATIVE_LAYOUT_SHIFT_SCORE",
+    "EXPERIMENTAL_INTERACTION_TO_NEXT_PAINT",
+    "EXPERIMENTAL_TIME_TO_FIRST_BYTE",
+    "FIRST_CONTENTFUL_PAINT_MS",
+    "FIRST_INPUT_DELAY_MS",
+    "INTERACTION_TO_NEXT_PAINT",
+    "LARGEST_CONTENTFUL_PAINT_MS",
+)
+
+
+@dataclass
+class MockConfig:
+    """Class for the behaviour of the mock PSI API.
+
+    Latency is drawn from a lognormal distribution with the given median (in
+    seconds) and shape `latency_sigma`. `error_rate` and `rate_limit_rate` are
+    the probabilities of responding with a 500 or a 429, respectively.
+    `payload_kb` pads full responses with a fake screenshot of that size.
+    Responses requested with a `fields` mask aren't padded.
+    """
+
+    latency_median: float = 0.05
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    payload_kb: int = 0
+    fixture: Optional[Path] = None
+    seed: Optional[int] = None
+
+
+class MockPSIServer:
+    """Class for running the mock PSI API in a background thread.
+
+    The server gets its own event loop so it can be used alongside
+    run_requests(), which runs its own loop with asyncio.run().
+    """
+
+    def __init__(self, config: Optional[MockConfig] = None, port: int = 0) -> None:
+        self.config = config or MockConfig()
+        self.port = port
+        self.stats: Counter[int] = Counter()
+        self._random = random.Random(self.config.seed)  # nosec - not cryptography
+        self._fixture = None
+        if self.config.fixture is not None:
+            self._fixture = json.loads(self.config.fixture.read_text(encoding="utf-8"))
+        padding = os.urandom(self.config.payload_kb * 768)
+        self._screenshot = base64.b64encode(padding).decode("ascii")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """The URL of the mock runPagespeed endpoint."""
+        return f"http://127.0.0.1:{self.port}/pagespeedonline/v5/runPagespeed"
+
+    def start(self) -> None:
+        """Starts the server and waits until it's accepting connections."""
+        ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._serve, args=(ready,), daemon=True, name="mock-psi"
+        )
+        self._thread.start()
+        ready.wait()
+
+    def stop(self) -> None:
+        """Shuts down the server and its event loop."""
+        if self._loop is None or self._thread is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._cleanup(), self._loop)
+        future.result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = self._thread = None
+
+    def __enter__(self) -> "MockPSIServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    async def handle(self, req: web.Request) -> web.Response:
+        """Responds to a runPagespeed request after a simulated analysis."""
+        config = self.config
+        latency = self._random.lognormvariate(0, config.latency_sigma)
+        await asyncio.sleep(config.latency_median * latency)
+
+        roll = self._random.random()
+        if roll < config.rate_limit_rate:
+            self.stats[429] += 1
+            return web.json_response(
+                {"error": {"code": 429, "message": "Quota exceeded per minute."}},
+                status=429,
+                headers={"Retry-After": "1"},
+            )
+        if roll < config.rate_limit_rate + config.error_rate:
+            self.stats[500] += 1
+            return web.json_response(
+                {"error": {"code": 500, "message": "Lighthouse returned error."}},
+                status=500,
+            )
+
+        self.stats[200] += 1
+        query = req.query
+        categories = query.getall("category", ["performance"])
+        strategy = query.get("strategy", "desktop")
+        partial = "fields" in query
+        body = self._get_body(query["url"], categories, strategy, partial)
+        return web.json_response(body)
+
+    def _get_body(
+        self, url: str, categories: list[str], strategy: str, partial: bool
+    ) -> dict:
+        """Builds a PSI-shaped response for the request."""
+        if self._fixture is not None:
+            return self._fixture
+
+        audits = {
+            audit_id: {"id": audit_id, "score": score, "numericValue": value}
+            for audit_id, (score, value) in audit_results.items()
+        }
+        audit_refs = [{"id": audit_id} for audit_id in audits]
+        body: dict[str, Any] = {
+            "analysisUTCTimestamp": datetime.now(timezone.utc).isoformat(),
+            "lighthouseResult": {
+                "finalUrl": url,
+                "configSettings": {"formFactor": strategy},
+                "categories": {
+                    category: {"score": 0.9, "auditRefs": audit_refs}
+                    for category in categories
+                },
+                "audits": audits,
+            },
+            "loadingExperience": {
+                "metrics": {
+                    metric: {"distributions": [{"proportion": 0.9}]}
+                    for metric in CRUX_METRICS
+                }
+            },
+        }
+        if not partial and self._screenshot:
+            body["lighthouseResult"]["fullPageScreenshot"] = {
+                "screenshot": {"data": f"data:image/webp;base64,{self._screenshot}"}
+            }
+        return body
+
+    def _serve(self, ready: threading.Event) -> None:
+        """Runs the server's event loop in the background thread."""
+        assert self._loop is not None
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._setup())
+        ready.set()
+        self._loop.run_forever()
+
+    async def _setup(self) -> None:
+        app = web.Application()
+        app.router.add_get("/pagespeedonline/v5/runPagespeed", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def _cleanup(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a mock PSI API server.")
+    parser.add_argument("--port", type=int, default=8080)
+    add_config_args(parser)
+    args = parser.parse_args()
+
+    server = MockPSIServer(config_from_args(args), args.port)
+    server.start()
+    print(f"Mock PSI API listening on {server.url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+def add_config_args(parser: argparse.ArgumentParser) -> None:
+    """Adds arguments for each MockConfig option to a parser."""
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Median latency in seconds."
+    )
+    parser.add_argument(
+        "--latency-sigma", type=float, default=0.5, help="Lognormal latency shape."
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of 500 responses."
+    )
+    parser.add_argument(
+        "--rate-limit-rate", type=float, default=0.0, help="Share of 429 responses."
+    )
+    parser.add_argument(
+        "--payload-kb", type=int, default=0, help="Size of full response padding."
+    )
+    parser.add_argument(
+        "--fixture", type=Path, help="A recorded PSI API response to serve."
+    )
+    parser.add_argument("--seed", type=int, help="Seed for latency and errors.")
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    """Creates a MockConfig from parsed arguments."""
+    return MockConfig(
+        latency_median=args.latency,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        payload_kb=args.payload_kb,
+        fixture=args.fixture,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
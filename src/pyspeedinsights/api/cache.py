@@ -0,0 +1,197 @@
+"""Persistent on-disk cache of PSI API responses.
+
+Responses are stored in a SQLite database keyed by a hash of the normalized
+request URL and query params, so repeated runs with the same category, strategy
+and locale are served locally instead of spending API quota.
+Responses are stored as the compressed raw body sent by the API. Compression and
+decoding are separate from the database access (see get_compressed() and
+set_compressed()), so they can run in a worker thread.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Optional
+
+from ..utils.paths import get_cache_dir
+from ..utils.serialization import loads
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_TTL = 24.0  # Hours
+DEFAULT_CACHE_SIZE = 500.0  # Megabytes
+EXCLUDED_PARAMS = ("key",)  # Params that don't affect the analysis
+
+
+class ResponseCache:
+    """Class for storing and retrieving PSI API responses with a TTL and max size.
+
+    Entries older than the TTL are treated as misses. Once the cache grows past
+    its max size, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: Path, ttl: float, max_size: int) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, "
+            "created_at REAL NOT NULL, "
+            "accessed_at REAL NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "body BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_accessed_at ON responses (accessed_at)"
+        )
+        self._conn.commit()
+        self._size = self._get_total_size()
+
+    @staticmethod
+    def make_key(params: dict[str, Any]) -> str:
+        """Hashes the request params (excluding the API key) into a cache key.
+
+        Repeated params like `category` are order-independent.
+        """
+        cache_params = {
+            k: sorted(v) if isinstance(v, list) else v
+            for k, v in params.items()
+            if k not in EXCLUDED_PARAMS
+        }
+        serialized = json.dumps(cache_params, sort_keys=True)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def get(self, params: dict[str, Any]) -> Optional[dict]:
+        """Gets a cached response for the request params if one hasn't expired."""
+        compressed = self.get_compressed(params)
+        return None if compressed is None else decompress_response(compressed)
+
+    def get_compressed(self, params: dict[str, Any]) -> Optional[bytes]:
+        """Gets the compressed body of an unexpired cached response.
+
+        See decompress_response() to decode it.
+        """
+        key = self.make_key(params)
+        row = self._conn.execute(
+            "SELECT created_at, body FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        created_at, body = row
+        now = time.time()
+        if now - created_at > self.ttl:
+            logger.debug(f"Cached response expired. ({params.get('url')})")
+            self._delete(key)
+            return None
+
+        self._conn.execute(
+            "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+        )
+        self._conn.commit()
+        self.hits += 1
+        return body
+
+    def contains(self, params: dict[str, Any]) -> bool:
+        """Checks if an unexpired response is cached for the request params.
+
+        Unlike get(), the response isn't loaded and doesn't count as a hit.
+        """
+        row = self._conn.execute(
+            "SELECT created_at FROM responses WHERE key = ?", (self.make_key(params),)
+        ).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl
+
+    def set(self, params: dict[str, Any], body: bytes) -> None:
+        """Stores the raw body of a response for the request params."""
+        self.set_compressed(params, compress_response(body))
+
+    def set_compressed(self, params: dict[str, Any], compressed: bytes) -> None:
+        """Stores a compressed response body and evicts entries if needed.
+
+        See compress_response() to compress it.
+        """
+        key = self.make_key(params)
+        if len(compressed) > self.max_size:
+            logger.debug("Response is larger than the cache. Not caching.")
+            return
+
+        self._delete(key)
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO responses VALUES (?, ?, ?, ?, ?)",
+            (key, now, now, len(compressed), compressed),
+        )
+        self._conn.commit()
+        self._size += len(compressed)
+        self._evict()
+
+    def close(self) -> None:
+        """Closes the connection to the cache database."""
+        self._conn.close()
+
+    def _delete(self, key: str) -> None:
+        """Deletes a single entry from the cache."""
+        row = self._conn.execute(
+            "SELECT size FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+            self._size -= row[0]
+
+    def _evict(self) -> None:
+        """Evicts the least recently used entries until the cache fits its max size."""
+        while self._size > self.max_size:
+            row = self._conn.execute(
+                "SELECT key FROM responses ORDER BY accessed_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            logger.debug("Cache full. Evicting least recently used response.")
+            self._delete(row[0])
+
+    def _get_total_size(self) -> int:
+        """Gets the total size in bytes of all cached responses."""
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses")
+        return row.fetchone()[0]
+
+
+def compress_response(body: bytes) -> bytes:
+    """Compresses the raw body of a response for the cache."""
+    return zlib.compress(body)
+
+
+def decompress_response(compressed: bytes) -> dict:
+    """Decompresses and decodes a cached response body."""
+    return loads(zlib.decompress(compressed))
+
+
+def open_cache(
+    ttl: float = DEFAULT_CACHE_TTL, max_size: float = DEFAULT_CACHE_SIZE
+) -> Optional[ResponseCache]:
+    """Opens the response cache in the local cache directory.
+
+    Args:
+        ttl: Hours until a cached response expires.
+        max_size: Megabytes the cache can grow to before evicting responses.
+    Returns:
+        A ResponseCache instance or None if the cache couldn't be opened,
+        in which case requests simply aren't cached.
+    """
+    try:
+        path = get_cache_dir() / "responses.sqlite3"
+        cache = ResponseCache(path, ttl * 3600, int(max_size * 1024 * 1024))
+    except (OSError, sqlite3.Error) as err:
+        logger.warning(f"Unable to open response cache. Caching disabled: {err}")
+        return None
+    logger.info(f"Using response cache ({path})")
+    return cache
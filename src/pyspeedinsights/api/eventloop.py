@@ -0,0 +1,139 @@
+"""Running the event loop of a run and monitoring how responsive it is.
+
+uvloop is used when requested and installed (e.g. `pip install
+pyspeedinsights[fast]`). Loop lag, the delay between when a callback should
+run and when it does, is sampled throughout every run. High lag means the loop
+itself is the bottleneck (e.g. blocking logging or JSON decoding) rather than
+the network.
+
+Typical usage example:
+    slow_callbacks = SlowCallbackLog()
+    with record_slow_callbacks(slow_callbacks):
+        run(main(), use_uvloop=True, debug=True)
+    slow_callbacks.log_slowest()
+"""
+
+import asyncio
+import heapq
+import logging
+from contextlib import contextmanager
+from typing import Any, Coroutine, Iterator, Optional, TypeVar
+
+from .telemetry import Histogram
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None  # type: ignore[assignment]
+
+T = TypeVar("T")
+logger = logging.getLogger(__name__)
+
+LAG_INTERVAL = 0.1  # Seconds between loop lag samples
+SLOW_CALLBACK_DURATION = 0.05  # Seconds a callback can block before it's recorded
+SLOWEST_CALLBACKS = 10  # Number of slow callbacks to report
+
+
+def run(
+    coro: Coroutine[Any, Any, T], use_uvloop: bool = False, debug: bool = False
+) -> T:
+    """Runs a coroutine in a new event loop, using uvloop if requested.
+
+    In `debug` mode, asyncio logs each callback that blocks the loop for longer
+    than SLOW_CALLBACK_DURATION (see record_slow_callbacks()).
+    """
+    policy = asyncio.get_event_loop_policy()
+    if use_uvloop and uvloop is None:
+        logger.warning("uvloop isn't installed. Using the default event loop.")
+    elif use_uvloop:
+        logger.info("Using the uvloop event loop.")
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    try:
+        return asyncio.run(_set_up_loop(coro, debug), debug=debug)
+    finally:
+        asyncio.set_event_loop_policy(policy)
+
+
+async def monitor_loop_lag(
+    histogram: Histogram, interval: float = LAG_INTERVAL
+) -> None:
+    """Samples the loop lag into a histogram every `interval` seconds until cancelled.
+
+    The lag is how much later than requested a sleep of `interval` resumes.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started_at = loop.time()
+        await asyncio.sleep(interval)
+        histogram.observe(max(0.0, loop.time() - started_at - interval))
+
+
+class SlowCallbackLog(logging.Filter):
+    """Class for keeping the slowest callbacks reported by asyncio's debug mode.
+
+    As a filter of the asyncio logger, it takes the slow callback records out
+    of the log and lets every other record through.
+    """
+
+    def __init__(self, limit: int = SLOWEST_CALLBACKS) -> None:
+        super().__init__()
+        self.limit = limit
+        self.count = 0
+        self._slowest: list[tuple[float, str]] = []
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # asyncio logs "Executing <handle> took <seconds> seconds".
+        args = record.args
+        if (
+            not str(record.msg).startswith("Executing")
+            or not isinstance(args, tuple)
+            or len(args) != 2
+            or not isinstance(args[1], (int, float))
+        ):
+            return True
+        self.count += 1
+        item = (float(args[1]), str(args[0]))
+        if len(self._slowest) < self.limit:
+            heapq.heappush(self._slowest, item)
+        else:
+            heapq.heappushpop(self._slowest, item)
+        return False
+
+    @property
+    def slowest(self) -> list[tuple[float, str]]:
+        """The slowest callbacks as (seconds, callback) tuples, slowest first."""
+        return sorted(self._slowest, reverse=True)
+
+    def log_slowest(self) -> None:
+        """Logs the number of slow callbacks and the slowest ones."""
+        logger.info(
+            f"{self.count} callback(s) blocked the event loop for more than "
+            f"{SLOW_CALLBACK_DURATION}s."
+        )
+        for seconds, handle in self.slowest:
+            logger.info(f"Blocked the event loop for {seconds:.3f}s: {handle}")
+
+
+@contextmanager
+def record_slow_callbacks(handler: Optional[SlowCallbackLog]) -> Iterator[None]:
+    """Collects the slow callbacks logged by asyncio instead of logging each one.
+
+    Other asyncio warnings and errors are still logged. Does nothing if
+    `handler` is None.
+    """
+    if handler is None:
+        yield
+        return
+    asyncio_logger = logging.getLogger("asyncio")
+    asyncio_logger.addFilter(handler)
+    try:
+        yield
+    finally:
+        asyncio_logger.removeFilter(handler)
+
+
+async def _set_up_loop(coro: Coroutine[Any, Any, T], debug: bool) -> T:
+    """Configures the running loop before awaiting the coroutine."""
+    if debug:
+        asyncio.get_running_loop().slow_callback_duration = SLOW_CALLBACK_DURATION
+    return await coro
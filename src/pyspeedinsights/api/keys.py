@@ -5,14 +5,21 @@ Verifying an API key is stored: `keyring get system psikey`
 Removing an API key from keyring: `keyring del system psikey`
 
 If no key is set in keyring, the user will be manually prompted for their key.
+
+Multiple keys can be pooled to spread requests across their quotas. They're read
+from a keys file (one key per line), the comma-separated `PSI_API_KEYS` env var,
+or additional keyring entries: `keyring set system psikey2`, `psikey3`, etc.
 """
 
 import logging
+import os
+from typing import Optional
 
 import keyring
 from keyring.errors import KeyringError
 
 logger = logging.getLogger(__name__)
+MAX_KEYRING_KEYS = 50
 
 
 class RetryLimitExceededError(KeyringError):
@@ -23,6 +30,10 @@ class InputTerminatedError(KeyringError):
     """Exception if the user manually terminates retry for entering an API key."""
 
 
+class KeyPoolExhaustedError(KeyringError):
+    """Exception if every API key has been taken out of rotation."""
+
+
 def get_api_key() -> str:
     """Gets the user's PSI API key from their keyring store.
 
@@ -68,3 +79,51 @@ def get_api_key() -> str:
 
     logger.info("API key retrieval successful.")
     return psi_api_key
+
+
+def get_api_keys(keys_file: Optional[str] = None) -> list[str]:
+    """Gets all of the user's PSI API keys for the key pool.
+
+    Keys are read from the keys file if given, otherwise from the `PSI_API_KEYS`
+    env var, otherwise from the keyring entries `psikey`, `psikey2`, `psikey3`...
+    Blank lines and lines starting with `#` in the keys file are ignored.
+
+    Returns:
+        A list of unique str PSI API keys.
+    Raises:
+        KeyringError: The keys file couldn't be read or manual entry failed.
+    """
+    if keys_file is not None:
+        logger.info(f"Reading API keys from file ({keys_file})")
+        try:
+            with open(keys_file, encoding="utf-8") as f:
+                keys = [line.strip() for line in f]
+        except OSError as err:
+            # Logged as CRITICAL in main()
+            raise KeyringError(f"Unable to read API keys file: {err}")
+    elif os.environ.get("PSI_API_KEYS"):
+        logger.info("Reading API keys from PSI_API_KEYS.")
+        keys = [k.strip() for k in os.environ["PSI_API_KEYS"].split(",")]
+    else:
+        keys = [get_api_key(), *_get_numbered_keyring_keys()]
+
+    keys = [k for k in dict.fromkeys(keys) if k and not k.startswith("#")]
+    if not keys:
+        logger.warning("No API keys found. Defaulting to keystore.")
+        keys = [get_api_key()]
+    logger.info(f"{len(keys)} API key(s) retrieved.")
+    return keys
+
+
+def _get_numbered_keyring_keys() -> list[str]:
+    """Gets the keys stored as `psikey2`, `psikey3`... in the keyring store."""
+    keys: list[str] = []
+    for suffix in range(2, MAX_KEYRING_KEYS + 1):
+        try:
+            key = keyring.get_password("system", f"psikey{suffix}")
+        except KeyringError:
+            break
+        if not key or key in keys:
+            break
+        keys.append(key)
+    return keys
@@ -0,0 +1,176 @@
+"""Daily PSI API quota tracking and planning of runs that exceed it.
+
+The daily usage of each API key is recorded locally, so a run can be capped at
+the quota left for the day. Requests beyond it are deferred, and sitemap runs
+can be continued on a later day with `--resume`.
+
+Usage is stored in a SQLite database and added to as each call is sent, so runs
+sharing the cache directory (e.g. shards of a sitemap) don't overwrite each
+other's usage, and a run that's killed still records the calls it sent.
+
+Typical usage example:
+    ledger = open_ledger()
+    remaining = ledger.get_remaining(key, DEFAULT_DAILY_QUOTA)
+    plan = plan_requests(calls, remaining, num_keys, rate, concurrency)
+    ledger.record(key, 1)
+    ledger.close()
+"""
+
+import hashlib
+import logging
+import math
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone, tzinfo
+from pathlib import Path
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from ..utils.paths import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DAILY_QUOTA = 25000  # PSI API queries per day per key
+ESTIMATED_LATENCY = 15.0  # Typical seconds for a Lighthouse analysis
+
+# Daily quotas reset at midnight Pacific Time.
+try:
+    PACIFIC_TIME: tzinfo = ZoneInfo("America/Los_Angeles")
+except ZoneInfoNotFoundError:
+    PACIFIC_TIME = timezone(timedelta(hours=-8))
+
+
+class QuotaLedger:
+    """Class for recording the number of requests sent with each key per day.
+
+    Keys are stored as hashes so the ledger never contains the keys themselves.
+    Usage from a previous day is treated as 0.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS quota_usage ("
+            "key_id TEXT NOT NULL, "
+            "day TEXT NOT NULL, "
+            "used INTEGER NOT NULL, "
+            "PRIMARY KEY (key_id, day))"
+        )
+        self._conn.execute("DELETE FROM quota_usage WHERE day < ?", (get_quota_day(),))
+        self._conn.commit()
+
+    def get_used(self, key: str) -> int:
+        """Gets the number of requests sent with a key today."""
+        row = self._conn.execute(
+            "SELECT used FROM quota_usage WHERE key_id = ? AND day = ?",
+            (_get_key_id(key), get_quota_day()),
+        ).fetchone()
+        return 0 if row is None else row[0]
+
+    def get_remaining(self, key: str, daily_quota: int) -> int:
+        """Gets the number of requests a key can still send today."""
+        return max(0, daily_quota - self.get_used(key))
+
+    def record(self, key: str, calls: int) -> None:
+        """Adds requests sent with a key to today's usage.
+
+        The usage is added to in place, so calls recorded by other runs since
+        the ledger was opened are kept.
+        """
+        try:
+            self._conn.execute(
+                "INSERT INTO quota_usage VALUES (?, ?, ?) "
+                "ON CONFLICT (key_id, day) DO UPDATE SET used = used + excluded.used",
+                (_get_key_id(key), get_quota_day(), calls),
+            )
+            self._conn.commit()
+        except sqlite3.Error as err:
+            logger.warning(f"Unable to record quota usage: {err}")
+
+    def close(self) -> None:
+        """Closes the connection to the ledger database."""
+        self._conn.close()
+
+
+@dataclass
+class RequestPlan:
+    """Class for the planned requests of a run.
+
+    `batch` is the number of calls that fit in today's remaining quota.
+    `seconds` is the estimated duration of the batch and `days` the number of
+    days needed for every call, including today.
+    """
+
+    calls: int
+    batch: int
+    remaining_quota: int
+    keys: int
+    seconds: float
+    days: int
+
+    @property
+    def deferred(self) -> int:
+        """The number of calls that don't fit in today's quota."""
+        return self.calls - self.batch
+
+
+def open_ledger() -> Optional[QuotaLedger]:
+    """Opens the quota ledger in the local cache directory.
+
+    Returns:
+        A QuotaLedger instance or None if the cache directory couldn't be
+        created, in which case quota usage isn't tracked.
+    """
+    try:
+        return QuotaLedger(get_cache_dir() / "quota.sqlite3")
+    except (OSError, sqlite3.Error) as err:
+        logger.warning(f"Unable to open quota usage. Usage won't be tracked: {err}")
+        return None
+
+
+def get_quota_day() -> str:
+    """Gets the current day of the PSI API's daily quota as YYYY-MM-DD."""
+    return datetime.now(PACIFIC_TIME).strftime("%Y-%m-%d")
+
+
+def plan_requests(
+    calls: int,
+    remaining_quota: int,
+    keys: int,
+    rate: float,
+    concurrency: int,
+    daily_quota: int = DEFAULT_DAILY_QUOTA,
+) -> RequestPlan:
+    """Plans the calls of a run against the remaining daily quota of its keys.
+
+    The duration is limited by either the rate limit of the keys or the number
+    of analyses that can run at once, whichever is slower.
+    """
+    batch = min(calls, remaining_quota)
+    seconds = max(batch / (rate * keys), batch * ESTIMATED_LATENCY / concurrency)
+    deferred = calls - batch
+    days = 1 + math.ceil(deferred / (daily_quota * keys)) if deferred else 1
+    return RequestPlan(calls, batch, remaining_quota, keys, seconds, days)
+
+
+def log_plan(plan: RequestPlan, dry_run: bool = False) -> None:
+    """Logs the expected calls, duration and days of a plan."""
+    duration = timedelta(seconds=round(plan.seconds))
+    logger.info(
+        f"Plan: {plan.calls} call(s). {plan.remaining_quota} call(s) left in "
+        f"today's quota across {plan.keys} key(s)."
+    )
+    verb = "would be" if dry_run else "will be"
+    logger.info(f"{plan.batch} call(s) {verb} sent today, taking about {duration}.")
+    if plan.deferred:
+        logger.warning(
+            f"{plan.deferred} call(s) exceed today's quota and {verb} deferred. "
+            f"The run needs {plan.days} day(s) in total."
+        )
+
+
+def _get_key_id(key: str) -> str:
+    """Gets a hash that identifies a key in the ledger."""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
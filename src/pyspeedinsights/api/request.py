@@ -3,42 +3,244 @@
 import asyncio
 import logging
 import ssl
+import time
 from collections import Counter
-from typing import Any, Coroutine, Optional, Union
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Coroutine,
+    Optional,
+    TypeAlias,
+    Union,
+)
 
 import aiohttp
 
 from ..utils.generic import remove_nonetype_dict_items
-from ..utils.urls import InvalidURLError, validate_url
-from .keys import KeyringError, get_api_key
+from ..utils.serialization import loads
+from ..utils.urls import InvalidURLError
+from .cache import (
+    DEFAULT_CACHE_SIZE,
+    DEFAULT_CACHE_TTL,
+    ResponseCache,
+    compress_response,
+    decompress_response,
+    open_cache,
+)
+from .eventloop import SlowCallbackLog, monitor_loop_lag, record_slow_callbacks, run
+from .keys import KeyPoolExhaustedError, KeyringError, get_api_keys
+from .quota import (
+    DEFAULT_DAILY_QUOTA,
+    QuotaLedger,
+    log_plan,
+    open_ledger,
+    plan_requests,
+)
+from .retry import RATE_LIMIT, SERVER, RetryPolicy, get_retry_after
+from .scheduler import RequestScheduler
+from .telemetry import RunMetrics
 
+ResponseHandler: TypeAlias = Callable[[str, str, dict], None]
+# Request URLs are either known upfront or discovered while requests are sent.
+RequestURLs: TypeAlias = Union[list[str], AsyncIterator[str]]
 logger = logging.getLogger(__name__)
-next_delay = 1  # Global for applying a 1s delay between requests
+
+PSI_API_URL = "https://www.googleapis.com/pagespeedonline/v5/runPagespeed"
+DEFAULT_RATE = 4.0  # PSI API quota is 240 queries per minute
+DEFAULT_CONCURRENCY = 50
+DNS_CACHE_TTL = 300  # Seconds to cache resolved PSI API hosts
+KEEPALIVE_TIMEOUT = 30  # Seconds to keep idle pooled connections open
+DEFAULT_CONNECT_TIMEOUT = 10.0  # Seconds to connect to the PSI API
+DEFAULT_READ_TIMEOUT = 120.0  # Seconds to wait for data, i.e. for the analysis
+DEFAULT_TOTAL_TIMEOUT = 180.0  # Seconds for a whole request
+PIPELINE_QUEUE_SIZE = 1000  # Discovered requests waiting for a free worker
+
+
+@dataclass
+class RequestContext:
+    """Class for the state shared by every request made during a run.
+
+    `unfinished` holds the (url, strategy) pairs of requests that haven't been
+    handled or skipped yet, in the order they were scheduled. `metrics` collects
+    the run's telemetry. Each call sent is recorded in the `ledger` if given.
+    """
+
+    session: aiohttp.ClientSession
+    scheduler: RequestScheduler
+    retry_policy: RetryPolicy
+    cache: Optional[ResponseCache] = None
+    refresh: bool = False
+    decode_in_thread: bool = False
+    ledger: Optional[QuotaLedger] = None
+    unfinished: dict[tuple[str, str], None] = field(default_factory=dict)
+    metrics: RunMetrics = field(default_factory=RunMetrics)
 
 
 async def get_response(
-    key: str,
+    context: RequestContext,
     url: str,
-    category: Optional[str] = None,
+    category: Union[str, list[str], None] = None,
     locale: Optional[str] = None,
     strategy: Optional[str] = None,
     utm_campaign: Optional[str] = None,
     utm_source: Optional[str] = None,
     captcha_token: Optional[str] = None,
+    fields: Optional[str] = None,
 ) -> dict:
     """Makes async GET calls to the PSI API for the requested page's URL.
 
     Args of NoneType will not be added as query params. They'll use PSI API defaults.
+    Multiple categories are sent as repeated `category` params in a single request.
+    `fields` is a partial response selector that limits the response to the parts
+    that will be processed (see get_fields_mask() in pyspeedinsights.api.response).
+    The context's scheduler throttles requests to the configured rate and
+    concurrency and picks the API key for each attempt. Its session is shared by
+    all requests so pooled connections are reused. Failed requests are re-issued
+    according to its retry policy. Unexpired cached responses are returned without
+    calling the API unless the context is set to refresh them.
+    Responses are decoded from raw bytes with the fastest available JSON backend,
+    optionally in a worker thread so the event loop isn't blocked while decoding.
+    Cached responses are then compressed and decoded in a worker thread too.
+    Responses that aren't valid JSON are retried like network errors.
 
     Returns:
-        The awaited json response from the server as a str.
+        The awaited json response from the server as a dict.
     Raises:
-        aiohttp.ClientError: The retry limit was reached for failed requests.
+        aiohttp.ClientError: The request failed with a non-retryable error
+            or the retry limit for its error class was reached.
+        asyncio.TimeoutError: The request timed out more times than the
+            network retry limit.
+    """
+    params = get_request_params(
+        url, category, locale, strategy, utm_campaign, utm_source, captcha_token, fields
+    )
+    req_url = params["url"]
+
+    cache = context.cache
+    if cache is not None and not context.refresh:
+        cached_resp = await _get_cached_response(context, cache, params)
+        if cached_resp is not None:
+            logger.info(f"Using cached response. ({req_url})")
+            context.metrics.cache_hits += 1
+            return cached_resp
+
+    metrics = context.metrics
+    retry_policy = context.retry_policy
+    retries: Counter[str] = Counter()
+    while True:
+        logger.debug(f"Waiting for a request slot. ({req_url})")
+        queued_at = time.monotonic()
+        async with context.scheduler.slot() as key_state:
+            logger.info(f"Sending request... ({req_url})")
+            sent_at = time.monotonic()
+            metrics.queue_wait.observe(sent_at - queued_at)
+            req_params = {**params, "key": key_state.key}
+            quota_exceeded = False
+            try:
+                # Make async call with query params to PSI API and await response.
+                async with context.session.get(
+                    url=PSI_API_URL, params=req_params
+                ) as resp:
+                    if resp.status == 429:
+                        quota_exceeded = _is_quota_exceeded(await resp.text())
+                    resp.raise_for_status()
+                    body = await resp.read()
+                    received_at = time.monotonic()
+                    metrics.request_latency.observe(received_at - sent_at)
+                    metrics.bytes_received += len(body)
+                    try:
+                        if context.decode_in_thread:
+                            json_resp = await asyncio.to_thread(loads, body)
+                        else:
+                            json_resp = loads(body)
+                    except ValueError as err_d:
+                        # Retried like a truncated response.
+                        raise aiohttp.ClientPayloadError(
+                            f"Invalid JSON response: {err_d}"
+                        ) from err_d
+                    metrics.stage_seconds["decode"] += time.monotonic() - received_at
+                    logger.info(f"Request successful! ({req_url})")
+                    context.scheduler.report_success(key_state)
+                    if cache is not None:
+                        await _cache_response(context, cache, params, body)
+                    return json_resp
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err_c:
+                err = err_c
+                metrics.request_latency.observe(time.monotonic() - sent_at)
+                if isinstance(err, aiohttp.ClientResponseError) and err.status == 429:
+                    context.scheduler.report_rate_limited(
+                        key_state, quota_exceeded, get_retry_after(err)
+                    )
+            finally:
+                # Recorded as each call is sent so a killed run keeps its usage.
+                if context.ledger is not None:
+                    context.ledger.record(key_state.key, 1)
+
+        # Back off outside of the request slot so other requests can proceed.
+        error_class = retry_policy.classify(err)
+        # Daily quota errors are handled by the key pool, not by backing off.
+        if error_class in (RATE_LIMIT, SERVER) and not quota_exceeded:
+            context.scheduler.report_overloaded(sent_at)
+        if error_class is None:
+            logger.error(err, exc_info=True)
+            logger.warning(f"Request failed with a non-retryable error. ({req_url})")
+            raise err
+        attempt = retries[error_class]
+        if attempt >= retry_policy.get_limit(error_class):
+            logger.error(err, exc_info=True)
+            logger.warning(f"Retry limit for URL reached. Skipping ({req_url})")
+            raise err
+        retries[error_class] += 1
+        metrics.retries[error_class] += 1
+        delay = retry_policy.get_delay(attempt, err)
+        logger.warning(f"Request failed ({error_class}). Retrying in {delay:.1f}s.")
+        logger.info(
+            f"{retry_policy.get_limit(error_class) - retries[error_class]} "
+            f"{error_class} retries left ({req_url})"
+        )
+        await asyncio.sleep(delay)
+
+
+async def _get_cached_response(
+    context: RequestContext, cache: ResponseCache, params: dict[str, Any]
+) -> Optional[dict]:
+    """Gets a cached response, decoded in a worker thread if set to."""
+    if not context.decode_in_thread:
+        return cache.get(params)
+    compressed = cache.get_compressed(params)
+    if compressed is None:
+        return None
+    return await asyncio.to_thread(decompress_response, compressed)
+
+
+async def _cache_response(
+    context: RequestContext, cache: ResponseCache, params: dict[str, Any], body: bytes
+) -> None:
+    """Caches a response's raw body, compressed in a worker thread if set to."""
+    if not context.decode_in_thread:
+        cache.set(params, body)
+        return
+    compressed = await asyncio.to_thread(compress_response, body)
+    cache.set_compressed(params, compressed)
+
+
+def get_request_params(
+    url: str,
+    category: Union[str, list[str], None] = None,
+    locale: Optional[str] = None,
+    strategy: Optional[str] = None,
+    utm_campaign: Optional[str] = None,
+    utm_source: Optional[str] = None,
+    captcha_token: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> dict[str, Any]:
+    """Gets the query params of a request, which also identify its cached response.
+
+    Args of NoneType are left out so they use PSI API defaults.
     """
-    base_url = "https://www.googleapis.com/pagespeedonline/v5/runPagespeed"
-    url = validate_url(url)
     params = {
-        "key": key,
         "url": url,
         "category": category,
         "locale": locale,
@@ -46,103 +248,518 @@ async def get_response(
         "utm_campaign": utm_campaign,
         "utm_source": utm_source,
         "captcha_token": captcha_token,
+        "fields": fields,
     }
-    # Use API defaults instead of passing None values as query params.
-    params = remove_nonetype_dict_items(params)
-    req_url = params["url"]
+    return remove_nonetype_dict_items(params)
 
-    # Add a 1s delay between calls to avoid 500 errors from server.
-    global next_delay
-    next_delay += 1
-    logger.debug("Sleeping request to prevent server errors.")
-    await asyncio.sleep(next_delay)
-
-    logger.info(f"Sending request... ({req_url})")
-    # Make async call with query params to PSI API and await response.
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url=base_url, params=params) as resp:
-            json_resp = None
-            retry_attempts = 5
-            while json_resp is None:
-                try:
-                    resp.raise_for_status()
-                    json_resp = await resp.json()
-                    logger.info(f"Request successful! ({req_url})")
-                except aiohttp.ClientError as err_c:
-                    if retry_attempts < 1:
-                        logger.error(err_c, exc_info=True)
-                        logger.warning(
-                            f"Retry limit for URL reached. Skipping ({req_url})"
-                        )
-                        raise aiohttp.ClientError(err_c)
-                    else:
-                        retry_attempts -= 1
-                        logger.warning("Request failed. Retrying.")
-                        logger.info(f"{retry_attempts} retries left ({req_url})")
-                        await asyncio.sleep(1)
-    return json_resp
+
+def _is_cached(
+    cache: Optional[ResponseCache],
+    refresh: bool,
+    api_args_dict: dict[str, Any],
+    pair: tuple[str, str],
+) -> bool:
+    """Checks if a request will be served from the cache without calling the API."""
+    if cache is None or refresh:
+        return False
+    api_args = {**api_args_dict, "url": pair[0], "strategy": pair[1]}
+    return cache.contains(get_request_params(**api_args))
+
+
+def _is_quota_exceeded(error_body: str) -> bool:
+    """Checks if a 429 response is due to the key's daily quota being exceeded.
+
+    Per-minute rate limits and daily quota errors both use 429 in the PSI API,
+    but only the latter names the daily limit in the error message.
+    """
+    error_body = error_body.lower()
+    return "per day" in error_body or "dailylimitexceeded" in error_body
 
 
 def run_requests(
-    request_urls: list[str], api_args_dict: dict[str, Union[str, None]]
-) -> list[dict]:
-    """Runs async requests to PSI API and gathers responses.
+    request_urls: RequestURLs,
+    api_args_dict: dict[str, Union[str, None]],
+    handle_response: ResponseHandler,
+    completed: Optional[set[tuple[str, str]]] = None,
+    rate: float = DEFAULT_RATE,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    min_concurrency: int = 1,
+    no_cache: bool = False,
+    refresh: bool = False,
+    cache_ttl: float = DEFAULT_CACHE_TTL,
+    cache_size: float = DEFAULT_CACHE_SIZE,
+    keys_file: Optional[str] = None,
+    decode_in_thread: bool = False,
+    connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+    read_timeout: float = DEFAULT_READ_TIMEOUT,
+    total_timeout: float = DEFAULT_TOTAL_TIMEOUT,
+    deadline: Optional[float] = None,
+    metrics_file: Optional[str] = None,
+    prometheus_file: Optional[str] = None,
+    daily_quota: int = DEFAULT_DAILY_QUOTA,
+    dry_run: bool = False,
+    use_uvloop: bool = False,
+    monitor_loop: bool = False,
+    **retry_limits: int,
+) -> list[tuple[str, str]]:
+    """Runs async requests to PSI API and hands off responses as they complete.
 
     Called within main() in pyspeedinsights.app.
+    `handle_response` is called with the request URL, strategy and response of
+    each successful request, in order of completion, so no response is held in
+    memory longer than it takes to process it.
+    Any (url, strategy) pairs in `completed` are skipped, e.g. when resuming a run.
+    `request_urls` can also be an async iterator of URLs that are still being
+    discovered (e.g. by a sitemap crawl). Requests are then sent as the URLs
+    arrive (see schedule_requests()). Since their number isn't known upfront,
+    such runs are capped at the quota left today instead of being planned and
+    can't be dry runs.
+    `rate` caps requests sent per second per API key. Requests in flight adapt
+    to the API's error rate between `min_concurrency` and `concurrency`.
+    Keys are read from `keys_file` if given (see get_api_keys()).
+    Responses are cached for `cache_ttl` hours in a cache of up to `cache_size` MB
+    unless `no_cache` is set. `refresh` ignores cached responses but still
+    updates the cache. `decode_in_thread` decodes responses in a worker thread.
+    Each request times out after `connect_timeout`, `read_timeout` and
+    `total_timeout` seconds. If the run takes longer than `deadline` seconds,
+    requests still outstanding are cancelled.
+    Run metrics are logged at the end and written as JSON to `metrics_file` and
+    as a Prometheus textfile to `prometheus_file` if given.
+    Requests are planned against the `daily_quota` left for each key today and
+    those that don't fit are deferred (see pyspeedinsights.api.quota). Requests
+    with a cached response cost no quota, so they're never deferred.
+    With `dry_run`, the plan is logged and no requests are sent.
+    The event loop is uvloop's if `use_uvloop` is set and it's installed.
+    `monitor_loop` runs the loop in debug mode to log the callbacks that
+    block it the longest (see pyspeedinsights.api.eventloop).
+    `retry_limits` override the default retry limit of each error class
+    (e.g. `server_retries=5`).
+
+    Returns:
+        A list of the (url, strategy) pairs left unfinished at the deadline
+        or when every key exceeded its quota mid-run.
     """
-    tasks = get_tasks(request_urls, api_args_dict)
-    return asyncio.run(gather_responses(tasks))
-
-
-async def gather_responses(tasks: list[Coroutine]) -> list[dict]:
-    """Gathers tasks and awaits the return of the responses for processing."""
-    logger.info(f"Gathering {len(tasks)} URL(s) and scheduling tasks.")
-    responses = await asyncio.gather(*tasks, return_exceptions=True)
-
-    # Generator expression for bubbling up critical exceptions (handled in main())
-    # Purposefully explicit here to avoid raising exceptions for aiohttp.ClientError,
-    # as we don't want a single client failure to invalidate the entire run.
-    # OSError and ssl errors are all subclassed by aiohttp exceptions.
-    critical_exception = next(
-        (
-            r
-            for r in responses
-            if isinstance(
-                r,
-                (
-                    KeyringError,
-                    InvalidURLError,
-                    OSError,
-                    ssl.SSLError,
-                    ssl.CertificateError,
+    keys = get_api_keys(keys_file)
+    ledger = open_ledger()
+    remaining = {
+        key: daily_quota if ledger is None else ledger.get_remaining(key, daily_quota)
+        for key in keys
+    }
+    if dry_run and not isinstance(request_urls, list):
+        raise ValueError("Only runs with a list of request URLs can be planned.")
+    cache = None if no_cache else open_cache(cache_ttl, cache_size)
+    completed = set(completed or set())
+    max_requests = None
+    if isinstance(request_urls, list):
+        pairs = get_request_pairs(request_urls, api_args_dict, completed)
+        calls = [p for p in pairs if not _is_cached(cache, refresh, api_args_dict, p)]
+        cached = len(pairs) - len(calls)
+        if cached:
+            logger.info(f"{cached} request(s) will be served from the cache.")
+        plan = plan_requests(
+            len(calls),
+            sum(remaining.values()),
+            len(keys),
+            rate,
+            concurrency,
+            daily_quota,
+        )
+        log_plan(plan, dry_run)
+        if dry_run or (plan.batch == 0 and plan.deferred and not cached):
+            if not dry_run:
+                logger.warning("No quota left today. Not sending any requests.")
+            if cache is not None:
+                cache.close()
+            if ledger is not None:
+                ledger.close()
+            return []
+        # Deferred requests are skipped like completed ones.
+        completed.update(calls[plan.batch :])
+    else:
+        max_requests = sum(remaining.values())
+        logger.info(
+            f"Sending requests as URLs are discovered. {max_requests} call(s) "
+            f"left in today's quota across {len(keys)} key(s)."
+        )
+        if max_requests == 0:
+            logger.warning("No quota left today. Only cached responses will be used.")
+
+    logger.info(
+        f"Scheduling requests at {rate} request(s)/s for each of {len(keys)} "
+        f"API key(s) with {min_concurrency} to {concurrency} in flight."
+    )
+    scheduler = RequestScheduler(rate, concurrency, keys, min_concurrency)
+    for key_state in scheduler.keys:
+        key_state.exhausted = remaining[key_state.key] == 0
+    retry_policy = RetryPolicy(**retry_limits)
+    timeout = aiohttp.ClientTimeout(
+        total=total_timeout, connect=connect_timeout, sock_read=read_timeout
+    )
+    metrics = RunMetrics()
+    slow_callbacks = SlowCallbackLog() if monitor_loop else None
+    try:
+        with record_slow_callbacks(slow_callbacks):
+            return run(
+                schedule_requests(
+                    request_urls,
+                    api_args_dict,
+                    handle_response,
+                    completed,
+                    scheduler,
+                    retry_policy,
+                    cache,
+                    refresh,
+                    decode_in_thread,
+                    timeout,
+                    deadline,
+                    metrics,
+                    max_requests,
+                    ledger,
                 ),
+                use_uvloop,
+                debug=monitor_loop,
             )
-        ),
-        None,
+    finally:
+        scheduler.log_key_usage()
+        if ledger is not None:
+            ledger.close()
+        if cache is not None:
+            logger.info(f"{cache.hits} response(s) served from cache.")
+            cache.close()
+        metrics.finish()
+        metrics.log_summary()
+        if slow_callbacks is not None:
+            slow_callbacks.log_slowest()
+        if metrics_file is not None:
+            metrics.write_json(metrics_file)
+        if prometheus_file is not None:
+            metrics.write_prometheus(prometheus_file)
+
+
+async def schedule_requests(
+    request_urls: RequestURLs,
+    api_args_dict: dict[str, Any],
+    handle_response: ResponseHandler,
+    completed: set[tuple[str, str]],
+    scheduler: RequestScheduler,
+    retry_policy: RetryPolicy,
+    cache: Optional[ResponseCache] = None,
+    refresh: bool = False,
+    decode_in_thread: bool = False,
+    timeout: Optional[aiohttp.ClientTimeout] = None,
+    deadline: Optional[float] = None,
+    metrics: Optional[RunMetrics] = None,
+    max_requests: Optional[int] = None,
+    ledger: Optional[QuotaLedger] = None,
+) -> list[tuple[str, str]]:
+    """Sets up the session within the event loop and streams responses.
+
+    If `request_urls` is an async iterator, its URLs are requested as they're
+    discovered, up to `max_requests` requests (see _handle_pipelined_responses()).
+    Each call sent is recorded in the quota `ledger` if given.
+    The session and its connection pool are closed once all responses are in,
+    the deadline has passed or every key has exceeded its quota, whichever
+    comes first.
+
+    Returns:
+        A list of the (url, strategy) pairs left unfinished at the deadline
+        or when the keys ran out of quota.
+    """
+    async with create_session(scheduler.max_concurrency, timeout) as session:
+        context = RequestContext(
+            session, scheduler, retry_policy, cache, refresh, decode_in_thread, ledger
+        )
+        if metrics is not None:
+            context.metrics = metrics
+        if isinstance(request_urls, list):
+            tasks = get_tasks(request_urls, api_args_dict, context, completed)
+            handling = _handle_responses(tasks, handle_response, context)
+        else:
+            handling = _handle_pipelined_responses(
+                request_urls,
+                api_args_dict,
+                handle_response,
+                context,
+                completed,
+                max_requests,
+            )
+        lag_monitor = asyncio.create_task(monitor_loop_lag(context.metrics.loop_lag))
+        try:
+            await asyncio.wait_for(handling, deadline)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Run deadline of {deadline}s reached. Cancelled "
+                f"{len(context.unfinished)} unfinished request(s)."
+            )
+        except KeyPoolExhaustedError as err:
+            logger.error(
+                f"{err} Stopped sending requests. Cancelled "
+                f"{len(context.unfinished)} unfinished request(s)."
+            )
+        finally:
+            lag_monitor.cancel()
+    return list(context.unfinished)
+
+
+async def _handle_responses(
+    tasks: list[Coroutine], handle_response: ResponseHandler, context: RequestContext
+) -> None:
+    """Hands off each response as it completes and marks its request finished."""
+    async for request_url, strategy, response in stream_responses(tasks):
+        started_at = time.monotonic()
+        handle_response(request_url, strategy, response)
+        context.metrics.stage_seconds["write"] += time.monotonic() - started_at
+        context.unfinished.pop((request_url, strategy), None)
+
+
+async def _handle_pipelined_responses(
+    request_urls: AsyncIterator[str],
+    api_args_dict: dict[str, Any],
+    handle_response: ResponseHandler,
+    context: RequestContext,
+    completed: set[tuple[str, str]],
+    max_requests: Optional[int] = None,
+) -> None:
+    """Requests URLs as they're discovered and hands off each response.
+
+    Discovered requests go onto a bounded queue that workers drain, one worker
+    per request the scheduler allows in flight. Discovery waits while the queue
+    is full, so URLs are never buffered far ahead of the requests.
+    Critical exceptions, including those raised while discovering URLs, cancel
+    the discovery and every worker and are bubbled up to be handled in main().
+    """
+    queue: asyncio.Queue[Optional[tuple[str, str]]] = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+    tasks = [
+        asyncio.create_task(
+            _enqueue_requests(
+                request_urls, api_args_dict, queue, context, completed, max_requests
+            )
+        )
+    ]
+    for _ in range(context.scheduler.max_concurrency):
+        tasks.append(
+            asyncio.create_task(
+                _drain_requests(queue, api_args_dict, handle_response, context)
+            )
+        )
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    metrics = context.metrics
+    logger.info(
+        f"{metrics.successes}/{metrics.successes + metrics.failures} request(s) "
+        f"processed successfully. "
+    )
+    logger.warning(f"{metrics.failures} skipped due to errors.")
+
+
+async def _enqueue_requests(
+    request_urls: AsyncIterator[str],
+    api_args_dict: dict[str, Any],
+    queue: asyncio.Queue[Optional[tuple[str, str]]],
+    context: RequestContext,
+    completed: set[tuple[str, str]],
+    max_requests: Optional[int] = None,
+) -> None:
+    """Puts the (url, strategy) pair of each discovered URL onto the queue.
+
+    Queued pairs are unfinished until they're handled or fail. Completed pairs
+    are skipped and pairs past `max_requests` are deferred, unless they're
+    cached and cost no quota. Each worker is sent None once every URL has
+    been discovered.
+    """
+    queued = calls = deferred = 0
+    async for url in request_urls:
+        for pair in get_request_pairs([url], api_args_dict, completed):
+            if max_requests is not None and not _is_cached(
+                context.cache, context.refresh, api_args_dict, pair
+            ):
+                if calls >= max_requests:
+                    deferred += 1
+                    continue
+                calls += 1
+            queued += 1
+            context.unfinished[pair] = None
+            await queue.put(pair)
+    logger.info(f"All URLs discovered. {queued} request(s) queued in total.")
+    if deferred:
+        logger.warning(f"{deferred} call(s) exceed today's quota and are deferred.")
+    for _ in range(context.scheduler.max_concurrency):
+        await queue.put(None)
+
+
+async def _drain_requests(
+    queue: asyncio.Queue[Optional[tuple[str, str]]],
+    api_args_dict: dict[str, Any],
+    handle_response: ResponseHandler,
+    context: RequestContext,
+) -> None:
+    """Sends the queued requests one at a time and hands off each response.
+
+    Failed requests are skipped like in stream_responses(). Returns once
+    None is taken from the queue.
+    """
+    while True:
+        pair = await queue.get()
+        if pair is None:
+            return
+        url, strategy = pair
+        api_args = {**api_args_dict, "url": url, "strategy": strategy}
+        try:
+            _, _, response = await _get_url_response(context, **api_args)
+        except asyncio.TimeoutError:
+            continue
+        except (
+            KeyringError,
+            InvalidURLError,
+            OSError,
+            ssl.SSLError,
+            ssl.CertificateError,
+        ):
+            raise
+        except aiohttp.ClientError:
+            continue
+        started_at = time.monotonic()
+        handle_response(url, strategy, response)
+        context.metrics.stage_seconds["write"] += time.monotonic() - started_at
+        context.unfinished.pop(pair, None)
+
+
+def create_session(
+    concurrency: int, timeout: Optional[aiohttp.ClientTimeout] = None
+) -> aiohttp.ClientSession:
+    """Creates a client session with a connection pool sized for the scheduler.
+
+    DNS lookups are cached and idle connections are kept alive between requests
+    so TCP and TLS handshakes with the PSI API aren't repeated for every URL.
+    Requests use the session's `timeout` (aiohttp's default if None).
+    """
+    connector = aiohttp.TCPConnector(
+        limit=concurrency,
+        limit_per_host=concurrency,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
     )
+    if timeout is None:
+        return aiohttp.ClientSession(connector=connector)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
 
-    if critical_exception is not None:
-        raise critical_exception
+async def stream_responses(
+    tasks: list[Coroutine],
+) -> AsyncIterator[tuple[str, str, dict]]:
+    """Schedules tasks and yields each response as soon as it completes.
 
-    type_counts = Counter(type(r) for r in responses)
-    c_success, c_fail = type_counts[dict], type_counts[aiohttp.ClientError]
-    logger.info(f"{c_success}/{len(tasks)} URL(s) processed successfully. ")
-    logger.warning(f"{c_fail} skipped due to errors. Removing failed URL(s).")
+    Failed requests are skipped and counted. Critical exceptions cancel the
+    remaining tasks and are bubbled up to be handled in main().
+
+    Yields:
+        A tuple of the request URL, strategy and json response.
+    """
+    logger.info(f"Streaming {len(tasks)} request(s) and scheduling tasks.")
+    # Tasks are dropped once done so their responses can be freed after handling.
+    pending: set[asyncio.Task[tuple[str, str, dict]]] = set()
+    for t in tasks:
+        task = asyncio.ensure_future(t)
+        task.add_done_callback(pending.discard)
+        pending.add(task)
+    c_success = c_fail = 0
+    try:
+        # as_completed() copies its argument into a set of its own and drops
+        # each task from it once done. The discard done callback above drops it
+        # from `pending` too, so its response is freed once it's been handled.
+        # A spent iterator is passed so no list of every task outlives the copy.
+        for next_done in asyncio.as_completed(iter(list(pending))):
+            try:
+                request_url, strategy, response = await next_done
+            # Timeouts are skipped like client errors. They're subclasses of
+            # OSError in recent Python versions, so they're caught first.
+            except asyncio.TimeoutError:
+                c_fail += 1
+                continue
+            # Purposefully explicit here to avoid raising exceptions for
+            # aiohttp.ClientError, as we don't want a single client failure to
+            # invalidate the entire run.
+            # OSError and ssl errors are all subclassed by aiohttp exceptions.
+            except (
+                KeyringError,
+                InvalidURLError,
+                OSError,
+                ssl.SSLError,
+                ssl.CertificateError,
+            ):
+                raise
+            except aiohttp.ClientError:
+                c_fail += 1
+                continue
+            c_success += 1
+            yield request_url, strategy, response
+    finally:
+        for task in list(pending):
+            task.cancel()
 
-    # Remove failures for response processing
-    responses = [r for r in responses if type(r) == dict]
-    return responses
+    logger.info(f"{c_success}/{len(tasks)} request(s) processed successfully. ")
+    logger.warning(f"{c_fail} skipped due to errors.")
+
+
+async def _get_url_response(
+    context: RequestContext, **api_args: Any
+) -> tuple[str, str, dict]:
+    """Calls get_response() and pairs the response with its URL and strategy.
+
+    Requests that fail are no longer unfinished since they won't be retried.
+    """
+    try:
+        json_resp = await get_response(context, **api_args)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        context.metrics.failures += 1
+        context.unfinished.pop((api_args["url"], api_args["strategy"]), None)
+        raise
+    context.metrics.successes += 1
+    return api_args["url"], api_args["strategy"], json_resp
 
 
 def get_tasks(
-    request_urls: list[str], api_args_dict: dict[str, Any]
+    request_urls: list[str],
+    api_args_dict: dict[str, Any],
+    context: RequestContext,
+    completed: Optional[set[tuple[str, str]]] = None,
 ) -> list[Coroutine]:
-    """Creates a list of tasks that call get_response() with request params."""
+    """Creates a list of tasks that call get_response() with request params.
+
+    One task is created per URL and strategy (see get_request_pairs()).
+    """
     logger.info("Creating list of tasks based on parsed URL(s).")
-    key = get_api_key()
     tasks = []
-    for url in request_urls:
-        api_args_dict["url"] = url
-        api_args_dict["key"] = key
-        tasks.append(get_response(**api_args_dict))
+    for url, strategy in get_request_pairs(request_urls, api_args_dict, completed):
+        api_args = {**api_args_dict, "url": url, "strategy": strategy}
+        tasks.append(_get_url_response(context, **api_args))
+        context.unfinished[(url, strategy)] = None
     return tasks
+
+
+def get_request_pairs(
+    request_urls: list[str],
+    api_args_dict: dict[str, Any],
+    completed: Optional[set[tuple[str, str]]] = None,
+) -> list[tuple[str, Any]]:
+    """Gets the (url, strategy) pair of each request to send, in order.
+
+    Strategies are interleaved per URL so every strategy progresses at the same
+    pace under the shared scheduler. Pairs that were already completed are skipped.
+    """
+    completed = completed or set()
+    strategies = api_args_dict.get("strategy") or [None]
+    if isinstance(strategies, str):
+        strategies = [strategies]
+    return [
+        (url, strategy)
+        for url in request_urls
+        for strategy in strategies
+        if (url, strategy) not in completed
+    ]
@@ -1,11 +1,11 @@
 """Response processing and parsing for PSI API results."""
 
-import json
 import logging
 from datetime import datetime
-from typing import Union
+from typing import Optional, Union
 
 from ..utils.generic import sort_dict_alpha
+from ..utils.serialization import dumps
 
 logger = logging.getLogger(__name__)
 
@@ -19,30 +19,59 @@ METRICS_ABBR = {
     "LARGEST_CONTENTFUL_PAINT_MS": "LCP",
 }
 
+# Partial response selector for the parts of a response read by process_excel().
+# Skips screenshots, audit details and i18n tables, which make up most of a report.
+EXCEL_FIELDS = (
+    "analysisUTCTimestamp,"
+    "loadingExperience/metrics,"
+    "lighthouseResult("
+    "finalUrl,"
+    "configSettings/formFactor,"
+    "categories/*(score,auditRefs/id),"
+    "audits/*(score,numericValue)"
+    ")"
+)
 
-def process_json(json_resp: dict, category: str, strategy: str) -> None:
+
+def get_fields_mask(format: str) -> Optional[str]:
+    """Gets the PSI API `fields` selector for the parts of a response a format uses.
+
+    Returns:
+        A str partial response selector or None if the format needs
+        the full response (i.e. json).
+    """
+    if format in ("excel", "sitemap"):
+        return EXCEL_FIELDS
+    return None
+
+
+def process_json(
+    json_resp: dict, category: str, strategy: str, pretty: bool = False
+) -> None:
     """Dumps raw json response to a file in the working directory.
 
-    Called within main() in pyspeedinsights.app.
-    If json format is selected this is where program execution ends.
+    Called for each response by ReportWriter in pyspeedinsights.core.writer.
+    Output is compact unless `pretty` is set.
     """
     date = _get_timestamp(json_resp)
     filename = f"psi-s-{strategy}-c-{category}-{date}.json"
 
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(json_resp, f, ensure_ascii=False, indent=4)
+    with open(filename, "wb") as f:
+        f.write(dumps(json_resp, pretty))
         logger.info("JSON processed. Check your current working directory.")
 
 
 def process_excel(json_resp: dict, category: str) -> dict[str, Union[dict, None]]:
     """Calls various parsing operations for Excel / Sitemap formats.
 
-    Called within main() in pyspeedinsights.app.
+    Called for each requested category by ReportWriter in pyspeedinsights.core.writer,
+    so a response with several categories is split into per-category results.
     Metrics results are only included if the category is performance.
     """
     json_err = "Malformed JSON response. Skipping Excel processing for URL: "
     try:
-        audits_base = _get_audits_base(json_resp)  # Location of audits in json response
+        # Location of the category's audits in json response
+        audits_base = _get_audits_base(json_resp, category)
         metadata = _parse_metadata(json_resp, category)
         audit_results = _parse_audits(audits_base)
     except KeyError as err:
@@ -137,9 +166,23 @@ def _parse_metrics(metrics_base: dict) -> dict[str, Union[int, float]]:
     return {k: metrics_results[k] for k in desired_order_list}
 
 
-def _get_audits_base(json_resp: dict) -> dict:
-    """Gets the location of audits in the JSON response."""
-    return json_resp["lighthouseResult"]["audits"]
+def _get_audits_base(json_resp: dict, category: Optional[str] = None) -> dict:
+    """Gets the location of audits in the JSON response.
+
+    If the response covers multiple categories, only the audits referenced
+    by the given category are included.
+    """
+    json_base = json_resp["lighthouseResult"]
+    audits = json_base["audits"]
+    categories = json_base.get("categories", {})
+    if category is None or len(categories) < 2:
+        return audits
+
+    audit_refs = categories[category].get("auditRefs")
+    if not audit_refs:
+        return audits
+    audit_ids = {ref["id"] for ref in audit_refs}
+    return {k: v for k, v in audits.items() if k in audit_ids}
 
 
 def _get_metrics_base(json_resp: dict) -> dict:
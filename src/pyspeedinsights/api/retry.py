@@ -0,0 +1,96 @@
+"""Retry policy for failed PSI API requests.
+
+Failed requests are classified by error class, each with its own retry limit.
+Retries use exponential backoff with full jitter and honour `Retry-After`
+headers sent with 429 and 503 responses.
+"""
+
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT = "rate_limit"
+SERVER = "server"
+NETWORK = "network"
+
+
+@dataclass
+class RetryPolicy:
+    """Class for deciding whether and when a failed request is re-issued."""
+
+    rate_limit_retries: int = 5
+    server_retries: int = 3
+    network_retries: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    def classify(self, err: Exception) -> Optional[str]:
+        """Gets the error class of a failed request.
+
+        Returns:
+            A str error class or None if the error is not retryable
+            (4xx errors other than 429, SSL and certificate errors).
+        """
+        if isinstance(err, asyncio.TimeoutError):
+            return NETWORK
+        if isinstance(err, aiohttp.ClientResponseError):
+            if err.status == 429:
+                return RATE_LIMIT
+            if err.status >= 500:
+                return SERVER
+            return None
+        if isinstance(err, (aiohttp.ClientSSLError, aiohttp.ServerFingerprintMismatch)):
+            return None
+        if isinstance(err, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)):
+            return NETWORK
+        return None
+
+    def get_limit(self, error_class: str) -> int:
+        """Gets the retry limit for an error class."""
+        return getattr(self, f"{error_class}_retries")
+
+    def get_delay(self, attempt: int, err: Exception) -> float:
+        """Gets the seconds to wait before the given retry attempt (starting at 0).
+
+        A `Retry-After` header takes precedence when it asks for a longer wait.
+        """
+        backoff = min(self.max_delay, self.base_delay * 2**attempt)
+        delay = random.uniform(0, backoff)  # nosec - jitter, not cryptography
+        retry_after = get_retry_after(err)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+def get_retry_after(err: Exception) -> Optional[float]:
+    """Parses the `Retry-After` header of a 429 or 503 response in seconds.
+
+    The header can either be a number of seconds or an HTTP date.
+    """
+    if not isinstance(err, aiohttp.ClientResponseError):
+        return None
+    if err.status not in (429, 503) or not err.headers:
+        return None
+    value = err.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        logger.debug(f"Unable to parse Retry-After header: {value}")
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,295 @@
+"""Request scheduling for rate limiting and bounding concurrent PSI API calls.
+
+Requests are spread across a pool of API keys, each with its own rate limit.
+Keys that are rate limited are rested and keys that exceed their daily quota
+are taken out of rotation for the rest of the run.
+
+The number of requests in flight adapts to the API's error rate (AIMD): it's
+raised additively while requests succeed and cut multiplicatively when the API
+responds with 429 or 5xx errors.
+
+Typical usage example:
+    scheduler = RequestScheduler(rate=4.0, max_concurrency=50, keys=keys)
+    async with scheduler.slot() as key_state:
+        ...  # Send the request with key_state.key
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from .keys import KeyPoolExhaustedError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COOLDOWN = 60.0  # Seconds to rest a rate limited key without Retry-After
+INITIAL_CONCURRENCY = 8  # Requests in flight before the limit adapts
+DECREASE_FACTOR = 0.5  # Multiplier for the concurrency limit after an error
+
+
+class TokenBucket:
+    """Async token bucket that limits callers to a sustained rate per second.
+
+    Tokens refill continuously at `rate` per second up to `capacity`, which
+    allows short bursts while keeping the long-run rate at or below `rate`.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError("Rate must be greater than 0.")
+        self.rate = rate
+        self.capacity = max(1.0, rate) if capacity is None else capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Waits until a token is available and consumes it.
+
+        Waiters are served in FIFO order since the lock is held while sleeping.
+        """
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def get_wait_time(self) -> float:
+        """Gets the seconds until a token is available, ignoring queued waiters."""
+        self._refill()
+        return max(0.0, (1 - self._tokens) / self.rate)
+
+    def _refill(self) -> None:
+        """Adds the tokens accrued since the last refill, up to capacity."""
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+
+class AdaptiveConcurrency:
+    """Async concurrency limit with additive increase, multiplicative decrease.
+
+    The limit starts low and grows by 1 per success (slow start) until the first
+    error, after which it grows by about 1 per `limit` successes. Each 429 or 5xx
+    error cuts it by `DECREASE_FACTOR`, but only once per burst: errors from
+    requests sent before the last cut are ignored since they were sent under
+    the old limit. The limit is always kept between `minimum` and `maximum`.
+
+    Waiters are served in FIFO order and each freed slot wakes a single waiter,
+    so the cost of scheduling stays flat however many requests are waiting.
+    """
+
+    def __init__(self, minimum: int, maximum: int) -> None:
+        if minimum < 1:
+            raise ValueError("Min concurrency must be at least 1.")
+        if maximum < minimum:
+            raise ValueError("Max concurrency must be at least the min concurrency.")
+        self.minimum = minimum
+        self.maximum = maximum
+        self._limit = float(max(minimum, min(maximum, INITIAL_CONCURRENCY)))
+        self._threshold = float(maximum)  # Slow start until the first error
+        self._decreased_at = 0.0
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    @property
+    def limit(self) -> int:
+        """The current max number of requests in flight."""
+        return int(self._limit)
+
+    async def acquire(self) -> None:
+        """Waits until the number of requests in flight is under the limit."""
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # A slot handed to a waiter that was cancelled is passed on.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """Frees the slot of a finished request."""
+        self._in_flight -= 1
+        self._wake_waiters()
+
+    def increase(self) -> None:
+        """Raises the limit after a successful request."""
+        previous = self.limit
+        if self._limit < self._threshold:
+            self._limit += 1
+        else:
+            self._limit += 1 / self._limit
+        self._limit = min(self._limit, float(self.maximum))
+        if self.limit != previous:
+            logger.info(f"Concurrency raised to {self.limit} request(s) in flight.")
+            self._wake_waiters()
+
+    def decrease(self, sent_at: float) -> None:
+        """Cuts the limit after a 429 or 5xx error for a request sent at `sent_at`."""
+        if sent_at < self._decreased_at:
+            return
+        self._decreased_at = time.monotonic()
+        previous = self.limit
+        self._limit = max(float(self.minimum), self._limit * DECREASE_FACTOR)
+        self._threshold = self._limit
+        if self.limit != previous:
+            logger.warning(
+                f"Concurrency cut to {self.limit} request(s) in flight "
+                "due to API errors."
+            )
+
+    def _wake_waiters(self) -> None:
+        """Hands the free slots to the longest waiting requests."""
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            # Cancelled waiters are left in the queue and skipped here.
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
+
+
+@dataclass
+class KeyState:
+    """Class for tracking the rate limit, rotation status and usage of an API key."""
+
+    key: str
+    bucket: TokenBucket
+    requests: int = 0
+    successes: int = 0
+    rate_limited: int = 0
+    resting_until: float = 0.0
+    exhausted: bool = False
+
+    @property
+    def label(self) -> str:
+        """A masked version of the key that's safe to log."""
+        return f"...{self.key[-4:]}"
+
+    def is_available(self) -> bool:
+        """Checks if the key is in rotation and not resting."""
+        return not self.exhausted and time.monotonic() >= self.resting_until
+
+
+class RequestScheduler:
+    """Schedules requests under a per-key rate, a concurrency limit and a key pool.
+
+    A token is only taken from a key's bucket once a concurrency slot is free,
+    so tokens aren't spent on requests that can't be sent yet. Each request goes
+    to the available key that can send soonest. The concurrency limit adapts
+    between `min_concurrency` and `max_concurrency` (see AdaptiveConcurrency).
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        max_concurrency: int,
+        keys: list[str],
+        min_concurrency: int = 1,
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("Max concurrency must be at least 1.")
+        if not keys:
+            raise ValueError("At least 1 API key is required.")
+        self.max_concurrency = max_concurrency
+        self.concurrency = AdaptiveConcurrency(
+            min(min_concurrency, max_concurrency), max_concurrency
+        )
+        self.keys = [KeyState(key, TokenBucket(rate)) for key in keys]
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[KeyState]:
+        """Holds a concurrency slot and a key's rate token for a request.
+
+        Yields:
+            The KeyState of the API key to send the request with.
+        Raises:
+            KeyPoolExhaustedError: Every key has exceeded its quota.
+        """
+        await self.concurrency.acquire()
+        try:
+            key_state = await self._acquire_key()
+            key_state.requests += 1
+            yield key_state
+        finally:
+            self.concurrency.release()
+
+    def report_success(self, key_state: KeyState) -> None:
+        """Records a successful request for a key and raises the concurrency limit."""
+        key_state.successes += 1
+        self.concurrency.increase()
+
+    def report_overloaded(self, sent_at: float) -> None:
+        """Cuts the concurrency limit after a 429 or 5xx error.
+
+        Args:
+            sent_at: The time.monotonic() time the failed request was sent.
+        """
+        self.concurrency.decrease(sent_at)
+
+    def report_rate_limited(
+        self,
+        key_state: KeyState,
+        quota_exceeded: bool = False,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        """Takes a key out of rotation after a 429 response.
+
+        Keys that exceeded their daily quota are removed for the rest of the run.
+        Otherwise, the key rests for `retry_after` seconds or a default cooldown.
+        """
+        key_state.rate_limited += 1
+        if quota_exceeded:
+            if not key_state.exhausted:
+                logger.warning(
+                    f"API key {key_state.label} exceeded its quota. "
+                    "Removing it from rotation."
+                )
+            key_state.exhausted = True
+        else:
+            cooldown = DEFAULT_COOLDOWN if retry_after is None else retry_after
+            key_state.resting_until = time.monotonic() + cooldown
+            logger.warning(
+                f"API key {key_state.label} was rate limited. Resting for {cooldown}s."
+            )
+
+    def log_key_usage(self) -> None:
+        """Logs the requests, successes and rate limits of each key in the pool."""
+        for key_state in self.keys:
+            status = "exhausted" if key_state.exhausted else "active"
+            logger.info(
+                f"API key {key_state.label} ({status}): "
+                f"{key_state.requests} request(s), "
+                f"{key_state.successes} successful, "
+                f"{key_state.rate_limited} rate limited."
+            )
+
+    async def _acquire_key(self) -> KeyState:
+        """Waits for the available key that can send soonest and takes its token."""
+        while True:
+            available = [k for k in self.keys if k.is_available()]
+            if not available:
+                in_rotation = [k for k in self.keys if not k.exhausted]
+                if not in_rotation:
+                    # Ends the run in schedule_requests()
+                    raise KeyPoolExhaustedError("All API keys exceeded their quota.")
+                now = time.monotonic()
+                await asyncio.sleep(min(k.resting_until for k in in_rotation) - now)
+                continue
+
+            key_state = min(available, key=lambda k: k.bucket.get_wait_time())
+            await key_state.bucket.acquire()
+            # The key may have been rate limited while waiting for its token.
+            if key_state.is_available():
+                return key_state
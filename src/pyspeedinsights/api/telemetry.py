@@ -0,0 +1,259 @@
+"""Structured metrics collected over a run of PSI API requests.
+
+Metrics are exported at the end of a run as JSON and optionally as a Prometheus
+textfile for node_exporter's textfile collector.
+
+Typical usage example:
+    metrics = RunMetrics()
+    metrics.request_latency.observe(12.5)
+    metrics.write_json("psi-metrics.json")
+    metrics.write_prometheus("/var/lib/node_exporter/psi.prom")
+"""
+
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Union
+
+logger = logging.getLogger(__name__)
+
+# Lighthouse analyses usually take 5-30 seconds.
+LATENCY_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 120.0)
+WAIT_BUCKETS = (0.01, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+
+class Histogram:
+    """Distribution of observed values in seconds.
+
+    Counts are kept per bucket for Prometheus. The values themselves are kept
+    to report exact quantiles, which is cheap at the scale of a PSI run.
+    """
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is +Inf
+        self.values: list[float] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.values)
+
+    @property
+    def sum(self) -> float:
+        return sum(self.values)
+
+    def observe(self, value: float) -> None:
+        """Records a single value."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.values.append(value)
+
+    def quantile(self, q: float) -> float:
+        """Gets the value at quantile `q` (from 0 to 1), or 0 with no values."""
+        if not self.values:
+            return 0.0
+        values = sorted(self.values)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def summary(self) -> dict[str, Union[int, float]]:
+        """Gets the count, sum and common quantiles of the values."""
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "p50": round(self.quantile(0.5), 3),
+            "p90": round(self.quantile(0.9), 3),
+            "p99": round(self.quantile(0.99), 3),
+            "max": round(max(self.values, default=0.0), 3),
+        }
+
+
+@dataclass
+class RunMetrics:
+    """Class for the metrics of a single run of requests.
+
+    `request_latency` covers each attempt from sending the request to receiving
+    the full response. `queue_wait` covers the time each attempt waited for the
+    scheduler's rate limit, concurrency limit and key pool. `loop_lag` samples
+    how late the event loop runs callbacks. `stage_seconds` holds the total
+    time spent decoding and writing responses.
+    """
+
+    request_latency: Histogram = field(
+        default_factory=lambda: Histogram(LATENCY_BUCKETS)
+    )
+    queue_wait: Histogram = field(default_factory=lambda: Histogram(WAIT_BUCKETS))
+    loop_lag: Histogram = field(default_factory=lambda: Histogram(LAG_BUCKETS))
+    retries: Counter[str] = field(default_factory=Counter)
+    stage_seconds: defaultdict[str, float] = field(
+        default_factory=lambda: defaultdict(float)
+    )
+    bytes_received: int = 0
+    successes: int = 0
+    failures: int = 0
+    cache_hits: int = 0
+    started_at: float = field(default_factory=time.time)
+    finished_at: float = 0.0
+
+    @property
+    def duration(self) -> float:
+        """The seconds the run took, or has taken so far."""
+        return (self.finished_at or time.time()) - self.started_at
+
+    def finish(self) -> None:
+        """Marks the end of the run."""
+        self.finished_at = time.time()
+
+    def to_dict(self) -> dict[str, Any]:
+        """Gets the metrics as a JSON-serializable dict."""
+        return {
+            "started_at": self.started_at,
+            "duration_seconds": round(self.duration, 3),
+            "successes": self.successes,
+            "failures": self.failures,
+            "cache_hits": self.cache_hits,
+            "retries": dict(self.retries),
+            "bytes_received": self.bytes_received,
+            "request_latency_seconds": self.request_latency.summary(),
+            "queue_wait_seconds": self.queue_wait.summary(),
+            "loop_lag_seconds": self.loop_lag.summary(),
+            "stage_seconds": {k: round(v, 3) for k, v in self.stage_seconds.items()},
+        }
+
+    def log_summary(self) -> None:
+        """Logs the main metrics of the run."""
+        latency = self.request_latency.summary()
+        wait = self.queue_wait.summary()
+        lag = self.loop_lag.summary()
+        logger.info(
+            f"Run metrics: {self.successes} succeeded, {self.failures} failed, "
+            f"{sum(self.retries.values())} retried, "
+            f"{self.bytes_received / 1024**2:.1f} MB received in "
+            f"{self.duration:.1f}s. Request latency p50 {latency['p50']}s, "
+            f"p99 {latency['p99']}s. Queue wait p50 {wait['p50']}s, "
+            f"p99 {wait['p99']}s. Event loop lag p50 {lag['p50']}s, "
+            f"p99 {lag['p99']}s, max {lag['max']}s."
+        )
+
+    def write_json(self, path: Union[str, Path]) -> None:
+        """Writes the metrics to a JSON file."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        logger.info(f"Run metrics written to {path}")
+
+    def write_prometheus(self, path: Union[str, Path]) -> None:
+        """Writes the metrics to a Prometheus textfile.
+
+        The file is written atomically, as required by node_exporter's textfile
+        collector, so a scrape never sees a partially written file.
+        """
+        path = Path(path)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(self.to_prometheus(), encoding="utf-8")
+        os.replace(tmp_path, path)
+        logger.info(f"Prometheus metrics written to {path}")
+
+    def to_prometheus(self) -> str:
+        """Gets the metrics in the Prometheus text exposition format."""
+        lines: list[str] = []
+        _add_histogram(
+            lines,
+            "psi_request_duration_seconds",
+            "Latency of PSI API request attempts.",
+            self.request_latency,
+        )
+        _add_histogram(
+            lines,
+            "psi_queue_wait_seconds",
+            "Time request attempts waited for the scheduler.",
+            self.queue_wait,
+        )
+        _add_histogram(
+            lines,
+            "psi_event_loop_lag_seconds",
+            "How late the event loop ran scheduled callbacks.",
+            self.loop_lag,
+        )
+        _add_metric(
+            lines,
+            "psi_requests_total",
+            "counter",
+            "Requests by result.",
+            {'result="success"': self.successes, 'result="failure"': self.failures},
+        )
+        _add_metric(
+            lines,
+            "psi_retries_total",
+            "counter",
+            "Retried request attempts by error class.",
+            {f'error_class="{k}"': v for k, v in sorted(self.retries.items())},
+        )
+        _add_metric(
+            lines,
+            "psi_stage_seconds_total",
+            "counter",
+            "Time spent processing responses by stage.",
+            {f'stage="{k}"': v for k, v in sorted(self.stage_seconds.items())},
+        )
+        _add_metric(
+            lines,
+            "psi_cache_hits_total",
+            "counter",
+            "Responses served from the response cache.",
+            {"": self.cache_hits},
+        )
+        _add_metric(
+            lines,
+            "psi_received_bytes_total",
+            "counter",
+            "Bytes of PSI API responses received.",
+            {"": self.bytes_received},
+        )
+        _add_metric(
+            lines,
+            "psi_run_duration_seconds",
+            "gauge",
+            "Duration of the run.",
+            {"": round(self.duration, 3)},
+        )
+        _add_metric(
+            lines,
+            "psi_run_start_time_seconds",
+            "gauge",
+            "Unix time the run started.",
+            {"": round(self.started_at, 3)},
+        )
+        return "\n".join(lines) + "\n"
+
+
+def _add_metric(
+    lines: list[str],
+    name: str,
+    metric_type: str,
+    description: str,
+    samples: dict[str, Union[int, float]],
+) -> None:
+    """Adds a metric with a sample per label set to Prometheus text lines."""
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} {metric_type}")
+    for labels, value in samples.items():
+        lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+
+def _add_histogram(
+    lines: list[str], name: str, description: str, histogram: Histogram
+) -> None:
+    """Adds a histogram with cumulative buckets to Prometheus text lines."""
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} histogram")
+    cumulative = 0
+    bounds = [str(b) for b in histogram.buckets] + ["+Inf"]
+    for bound, count in zip(bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+    lines.append(f"{name}_sum {round(histogram.sum, 6)}")
+    lines.append(f"{name}_count {histogram.count}")
@@ -1,21 +1,45 @@
 import logging
 import ssl
 import sys
+from pathlib import Path
+from typing import AsyncIterator, Optional
 
 from keyring.errors import KeyringError
 
-from .api.request import run_requests
-from .api.response import process_excel, process_json
-from .cli.commands import arg_group_to_dict, create_arg_groups, set_up_arg_parser
-from .core.excel import ExcelWorkbook
+from .api.request import RequestURLs, ResponseHandler, run_requests
+from .api.response import get_fields_mask
+from .cli.commands import (
+    arg_group_to_dict,
+    create_arg_groups,
+    set_up_arg_parser,
+    set_up_merge_parser,
+)
+from .core.history import (
+    DEFAULT_MAX_AGE,
+    get_run_id,
+    open_history,
+    sort_by_priority,
+)
+from .core.journal import RunJournal, get_journal_path
 from .core.sitemap import (
+    SitemapEntry,
     SitemapError,
-    process_sitemap,
-    request_sitemap,
+    get_sitemap_entries,
+    stream_sitemap_entries,
     validate_sitemap_url,
 )
-from .utils.generic import remove_dupes_from_list
-from .utils.urls import InvalidURLError
+from .core.sitemap_cache import SitemapCache, open_sitemap_cache
+from .core.writer import ReportWriter
+from .utils.generic import remove_nonetype_dict_items
+from .utils.urls import (
+    InvalidURLError,
+    URLDeduplicator,
+    canonicalize_url,
+    in_shard,
+    index_urls,
+)
+
+logger = logging.getLogger(__name__)
 
 
 def main() -> None:
@@ -23,47 +47,91 @@ def main() -> None:
 
     Parses cli arguments into separate groups for API calls and response processing.
     Gets request urls from sitemap or mulitple sitemaps via sitemap index.
-    Prepares async API calls, awaits and returns their responses.
-    Iterates through each response and writes them to the chosen format.
+    Prepares async API calls and writes each response to the chosen format
+    as soon as it arrives. Sitemap runs send requests while the sitemap tree
+    is still being crawled, unless they're dry runs or incremental, which need
+    every URL upfront.
     """
-    logging.basicConfig(
-        level=logging.INFO,
-        style="{",
-        format="[{asctime}] {levelname:^8s} --- {message} ({filename}:{lineno})",
-        handlers=(logging.FileHandler("psi.log"), logging.StreamHandler()),
-    )
-    logger = logging.getLogger(__name__)
+    _set_up_logging()
     logger.info("---Starting---")
 
     parser = set_up_arg_parser()
     args = parser.parse_args()
     arg_groups = create_arg_groups(parser, args)
     api_args_dict = arg_group_to_dict(arg_groups, "API Group")
+    req_args_dict = arg_group_to_dict(arg_groups, "Request Group")
     proc_args_dict = arg_group_to_dict(arg_groups, "Processing Group")
 
     logger.info("Parsing CLI arguments.")
 
     format = proc_args_dict.get("format")
+    resume = proc_args_dict.get("resume")
+    shard = proc_args_dict.get("shard")
+    dry_run = req_args_dict.get("dry_run")
+    full_response = proc_args_dict.get("full_response")
+    pretty = bool(proc_args_dict.get("pretty"))
+    trailing_slash = proc_args_dict.get("trailing_slash") or "keep"
+    incremental = proc_args_dict.get("incremental")
+    max_age = proc_args_dict.get("max_age") or DEFAULT_MAX_AGE
 
     url = api_args_dict.get("url")
     category = api_args_dict.get("category")
     strategy = api_args_dict.get("strategy")
+    sitemap_kwargs = remove_nonetype_dict_items(
+        {
+            "url": url,
+            "max_depth": proc_args_dict.get("max_sitemap_depth"),
+            "concurrency": proc_args_dict.get("sitemap_concurrency"),
+        }
+    )
 
     # API's default category and strategy with no query params.
-    category = "performance" if category is None else category
-    strategy = "desktop" if strategy is None else strategy
-
-    json_output = format == "json" or format is None
-    excel_output = format in ("excel", "sitemap")
+    # Repeated categories are only requested and reported once.
+    categories = ["performance"] if category is None else list(dict.fromkeys(category))
+    api_args_dict["category"] = categories
+    strategies = ["desktop"] if strategy is None else list(dict.fromkeys(strategy))
+    api_args_dict["strategy"] = strategies
+    format = "json" if format is None else format
+    # Only download the parts of each response that will be processed.
+    if not full_response:
+        api_args_dict["fields"] = get_fields_mask(format)
 
+    request_urls: RequestURLs = []
+    sitemap_entries: dict[str, SitemapEntry] = {}
+    sitemap_cache: Optional[SitemapCache] = None
+    pipelined = format == "sitemap" and not incremental and not dry_run
     if format == "sitemap" and url is not None:
+        # Unchanged sitemaps are reused unless caching is disabled.
+        if not req_args_dict.get("no_cache"):
+            sitemap_cache = open_sitemap_cache()
+        sitemap_kwargs["cache"] = sitemap_cache
+    # Errors that stop a pipelined crawl after requests were sent.
+    discovery_errors: list[Exception] = []
+    if pipelined and url is not None:
+        # URLs are deduplicated and sharded as they're discovered.
+        request_urls = _stream_request_urls(
+            stream_sitemap_entries(**sitemap_kwargs),
+            trailing_slash,
+            discovery_errors,
+            len(strategies),
+            shard,
+        )
+    elif format == "sitemap" and url is not None:
         try:
-            sitemap = request_sitemap(url)
-            request_urls = remove_dupes_from_list(process_sitemap(sitemap))
+            entries = get_sitemap_entries(**sitemap_kwargs)
+            url_index = index_urls([entry.loc for entry in entries], trailing_slash)
         # Let these exceptions bubble up from `core/sitemap.py`
         except (SitemapError, InvalidURLError) as err:
             logger.critical(err, exc_info=True)
             sys.exit(1)
+        request_urls = list(url_index)
+        sitemap_entries = {u: entries[i] for u, i in url_index.items()}
+        duplicates = len(entries) - len(request_urls)
+        if duplicates:
+            logger.info(
+                f"Removed {duplicates} duplicate URL(s), saving "
+                f"{duplicates * len(strategies)} API call(s)."
+            )
     elif url is not None:
         logger.info("Sitemap format not specified. Only 1 URL to process.")
         if validate_sitemap_url(url):
@@ -71,10 +139,71 @@ def main() -> None:
                 "Sitemaps can only be processed if sitemap format is specified."
             )
             sys.exit(1)
-        request_urls = [url]
+        try:
+            request_urls = [canonicalize_url(url, trailing_slash)]
+        except InvalidURLError as err:
+            logger.critical(err, exc_info=True)
+            sys.exit(1)
+
+    # Each shard of a sitemap run gets a stable, disjoint subset of its URLs.
+    if shard is not None and format != "sitemap":
+        logger.warning("Only sitemap runs can be sharded. Processing all URLs.")
+    elif shard is not None and pipelined:
+        logger.info(f"Processing shard {shard[0]}/{shard[1]}.")
+    elif shard is not None and isinstance(request_urls, list):
+        shard_index, shard_count = shard
+        request_urls = [
+            u for u in request_urls if in_shard(u, shard_index, shard_count)
+        ]
+        logger.info(
+            f"Processing shard {shard_index}/{shard_count}: "
+            f"{len(request_urls)} URL(s)."
+        )
+
+    # Each completed request of a sitemap run is journaled so it can be resumed.
+    journal = None
+    completed: set[tuple[str, str]] = set()
+    if format == "sitemap" and url is not None:
+        journal = RunJournal(get_journal_path(url, api_args_dict, format, shard))
+    elif resume:
+        logger.warning("Only sitemap runs can be resumed. Starting from scratch.")
+    writer = ReportWriter(format, categories, journal, pretty)
+
+    if journal is not None and resume:
+        logger.info(f"Resuming run from journal ({journal.path})")
+        for record in journal.load():
+            completed.add((record["url"], record["strategy"]))
+            writer.replay(record)
+        logger.info(f"{len(completed)} completed request(s) will be skipped.")
+    elif journal is not None and not dry_run:
+        journal.reset()
+
+    # Incremental runs skip pages that haven't changed since they were last tested.
+    history = None
+    if incremental and format != "sitemap":
+        logger.warning("Only sitemap runs can be incremental. Processing all URLs.")
+    elif incremental:
+        history = open_history(get_run_id(api_args_dict))
+    handle_response: ResponseHandler = writer.write
+    if history is not None and isinstance(request_urls, list):
+        handle_response = history.recording(writer.write)
+        request_urls = sort_by_priority(request_urls, sitemap_entries)
+        unchanged = history.get_unchanged(
+            {u: sitemap_entries[u] for u in request_urls}, strategies, max_age
+        )
+        completed |= unchanged
+        logger.info(f"{len(unchanged)} unchanged request(s) will be skipped.")
+        # Cached responses of changed pages would predate the change.
+        req_args_dict["refresh"] = True
+
+    logger.info("Processing response data as it arrives.")
 
     try:
-        responses = run_requests(request_urls, api_args_dict)
+        # Unset request options fall back to the scheduler defaults.
+        req_kwargs = remove_nonetype_dict_items(req_args_dict)
+        unfinished = run_requests(
+            request_urls, api_args_dict, handle_response, completed, **req_kwargs
+        )
     # Let these exceptions bubble up from `api/request.py`
     except (
         KeyringError,
@@ -85,63 +214,106 @@ def main() -> None:
     ) as err:
         logger.critical(err, exc_info=True)
         sys.exit(1)
+    finally:
+        if history is not None:
+            history.close()
+        if sitemap_cache is not None:
+            sitemap_cache.close()
 
-    logger.info("Processing response data.")
-
-    resp_num = 1  # use instead of enumerate for more control over skipping failures
-    for response in responses:
-        if json_output:
-            logger.info("JSON format selected. Processing JSON.")
-            process_json(response, category, strategy)
-        elif excel_output:
-            excel_results = process_excel(response, category)
-
-            try:
-                final_url = response["lighthouseResult"]["finalUrl"]
-            except KeyError as err:
-                # For now, log this as critical and exit.
-                # A better solution would be to preserve the original request URL
-                # as a fallback. Temporarily, this is more helpful than just KeyError.
-                logger.critical(
-                    f"The response data contains no URL: {err}", exc_info=True
-                )
-                sys.exit(1)
-
-            if not excel_results:
-                # Empty results from process_excel() means skip due to processing issue.
-                # Don't increment resp_num here in case error occurs on first response
-                # (would result in the workbook not existing for subsequent responses).
-                logger.warning(
-                    f"Skipping Excel processing for {final_url} due to malformed JSON."
-                )
-                continue
+    if dry_run:
+        return
+    writer.finalize()
+
+    if unfinished:
+        logger.warning(f"{len(unfinished)} request(s) were left unfinished:")
+        for unfinished_url, unfinished_strategy in unfinished:
+            logger.warning(f"Unfinished: {unfinished_url} ({unfinished_strategy})")
+        if journal is not None:
+            logger.info("Re-run the same command with --resume to finish them.")
 
-            metadata = excel_results.get("metadata")
-            audit_results = excel_results.get("audit_results")
-            metrics_results = excel_results.get("metrics_results")
-
-            first_resp = resp_num == 1
-            if metadata is not None and audit_results is not None:
-                if first_resp:
-                    logger.info("Excel format selected. Creating Excel workbook.")
-                    workbook = ExcelWorkbook(
-                        final_url, metadata, audit_results, metrics_results
-                    )
-                    workbook.set_up_worksheet()
-                else:
-                    # Simply update the workbook attrs after the first response.
-                    workbook.url = final_url
-                    workbook.metadata = metadata
-                    workbook.audit_results = audit_results
-                    workbook.metrics_results = metrics_results
-                    logger.info("Updating workbook to process next URL.")
-
-                workbook.write_to_worksheet(first_resp)
-                resp_num += 1
-        else:
-            f_err = "Invalid report format specified. Please try again."
-            logger.critical(f_err)
+    if discovery_errors:
+        logger.critical(
+            f"Sitemap crawl stopped early: {discovery_errors[0]} "
+            "Only the URLs discovered before it were processed."
+        )
+        sys.exit(1)
+
+
+def merge() -> None:
+    """Point of execution with `psi-merge` from cli.
+
+    Merges the journals of a sharded sitemap run into a single Excel report.
+    Requests that appear in more than one journal are only written once.
+    Merged workbooks are named with a `-merged` suffix so they don't overwrite
+    the workbook of the shard their first record came from.
+    """
+    _set_up_logging()
+    logger.info("---Merging---")
+
+    parser = set_up_merge_parser()
+    args = parser.parse_args()
+
+    writer = ReportWriter("sitemap", [], workbook_suffix="-merged")
+    merged = set()
+    for path in args.journals:
+        journal = RunJournal(Path(path))
+        if not journal.path.exists():
+            logger.critical(f"Journal not found: {path}")
             sys.exit(1)
+        logger.info(f"Merging journal ({path})")
+        for record in journal.load():
+            request = (record["url"], record["strategy"])
+            if request in merged:
+                continue
+            merged.add(request)
+            writer.replay(record)
+
+    logger.info(
+        f"{len(merged)} request(s) merged from {len(args.journals)} journal(s)."
+    )
+    writer.finalize()
+
+
+async def _stream_request_urls(
+    entries: AsyncIterator[SitemapEntry],
+    trailing_slash: str,
+    errors: list[Exception],
+    num_strategies: int,
+    shard: Optional[tuple[int, int]] = None,
+) -> AsyncIterator[str]:
+    """Canonicalizes, deduplicates and shards sitemap URLs as they're discovered.
 
-    if excel_output:
-        workbook.finalize_and_save()
+    Requests may already have been sent when the crawl fails, so its error is
+    added to `errors` and ends the stream instead of aborting the run. The
+    requests for the URLs discovered so far still finish and are reported.
+    The API calls saved by removing duplicates are logged once the stream ends,
+    like for sitemaps that are crawled before the run.
+    """
+    deduplicator = URLDeduplicator(trailing_slash)
+    try:
+        async for entry in entries:
+            request_url = deduplicator.add(entry.loc)
+            if request_url is None:
+                continue
+            if shard is not None and not in_shard(request_url, *shard):
+                continue
+            yield request_url
+    except (SitemapError, InvalidURLError) as err:
+        logger.error(f"Sitemap crawl stopped: {err}")
+        errors.append(err)
+    duplicates = deduplicator.duplicates
+    if duplicates:
+        logger.info(
+            f"Removed {duplicates} duplicate URL(s), saving "
+            f"{duplicates * num_strategies} API call(s)."
+        )
+
+
+def _set_up_logging() -> None:
+    """Logs to the console and to psi.log in the working directory."""
+    logging.basicConfig(
+        level=logging.INFO,
+        style="{",
+        format="[{asctime}] {levelname:^8s} --- {message} ({filename}:{lineno})",
+        handlers=(logging.FileHandler("psi.log"), logging.StreamHandler()),
+    )
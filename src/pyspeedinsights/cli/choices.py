@@ -50,4 +50,5 @@ COMMAND_CHOICES = {
         "vi",
     ),
     "format": ("json", "excel", "sitemap"),
+    "trailing_slash": ("keep", "strip", "add"),
 }
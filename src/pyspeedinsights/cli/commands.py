@@ -8,12 +8,14 @@ Typical usage example:
 """
 
 import logging
-from argparse import ArgumentParser, Namespace
+import math
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
 from typing import Any, TypeAlias, Union
 
 from .choices import COMMAND_CHOICES
 
 ArgGroups: TypeAlias = dict[str, Namespace]
+Shard: TypeAlias = tuple[int, int]
 logger = logging.getLogger(__name__)
 
 
@@ -23,7 +25,7 @@ def set_up_arg_parser() -> ArgumentParser:
     Commands are used in PSI API request query params and response processing.
 
     Returns:
-        An argparse.ArgumentParser instance with 2 argument groups.
+        An argparse.ArgumentParser instance with 3 argument groups.
     """
     logger.info("Setting up CLI arguments.")
     parser = ArgumentParser(prog="pyspeedinsights")
@@ -38,11 +40,13 @@ def set_up_arg_parser() -> ArgumentParser:
         "--category",
         metavar="\b",
         dest="category",
+        nargs="+",
         choices=COMMAND_CHOICES["category"],
         help=(
-            "The Lighthouse category to run: "
+            "The Lighthouse categories to run: "
             "`accessibility`, `best-practices`, "
-            "`performance` (default), `pwa` or `seo`."
+            "`performance` (default), `pwa` or `seo`. "
+            "Multiple categories are analyzed in a single request per URL."
         ),
     )
     api_group.add_argument(
@@ -58,8 +62,12 @@ def set_up_arg_parser() -> ArgumentParser:
         "--strategy",
         metavar="\b",
         dest="strategy",
+        nargs="+",
         choices=COMMAND_CHOICES["strategy"],
-        help="The analysis strategy to use: `desktop` (default) or `mobile`.",
+        help=(
+            "The analysis strategies to use: `desktop` (default) or `mobile`. "
+            "Both can be run at once."
+        ),
     )
     api_group.add_argument(
         "-uc",
@@ -83,6 +91,188 @@ def set_up_arg_parser() -> ArgumentParser:
         help="The captcha token passed when filling out a captcha.",
     )
 
+    # Add argument options for how API requests are scheduled and sent.
+    req_group = parser.add_argument_group("Request Group")
+    req_group.add_argument(
+        "-r",
+        "--rate",
+        metavar="\b",
+        dest="rate",
+        type=parse_positive_float,
+        help=(
+            "The maximum number of requests sent per second per API key. "
+            "Defaults to 4."
+        ),
+    )
+    req_group.add_argument(
+        "-cc",
+        "--concurrency",
+        metavar="\b",
+        dest="concurrency",
+        type=parse_positive_int,
+        help=(
+            "The maximum number of requests in flight at once. "
+            "Requests in flight adapt to API errors up to this limit. Defaults to 50."
+        ),
+    )
+    req_group.add_argument(
+        "--min-concurrency",
+        metavar="\b",
+        dest="min_concurrency",
+        type=parse_positive_int,
+        help=(
+            "The minimum number of requests in flight at once after API errors. "
+            "Defaults to 1."
+        ),
+    )
+    req_group.add_argument(
+        "--rate-limit-retries",
+        metavar="\b",
+        dest="rate_limit_retries",
+        type=int,
+        help="How many times to retry a request rate limited (429). Defaults to 5.",
+    )
+    req_group.add_argument(
+        "--server-retries",
+        metavar="\b",
+        dest="server_retries",
+        type=int,
+        help="How many times to retry a request after a 5xx error. Defaults to 3.",
+    )
+    req_group.add_argument(
+        "--network-retries",
+        metavar="\b",
+        dest="network_retries",
+        type=int,
+        help="How many times to retry a request after a network error. Defaults to 3.",
+    )
+    req_group.add_argument(
+        "-k",
+        "--keys-file",
+        metavar="\b",
+        dest="keys_file",
+        help="A file with one PSI API key per line to spread requests across.",
+    )
+    req_group.add_argument(
+        "--no-cache",
+        dest="no_cache",
+        action="store_true",
+        default=None,
+        help="Don't read or write cached responses or sitemaps.",
+    )
+    req_group.add_argument(
+        "--refresh",
+        dest="refresh",
+        action="store_true",
+        default=None,
+        help="Ignore cached responses and replace them with fresh ones.",
+    )
+    req_group.add_argument(
+        "--cache-ttl",
+        metavar="\b",
+        dest="cache_ttl",
+        type=float,
+        help="The hours until a cached response expires. Defaults to 24.",
+    )
+    req_group.add_argument(
+        "--cache-size",
+        metavar="\b",
+        dest="cache_size",
+        type=float,
+        help="The max size of the response cache in MB. Defaults to 500.",
+    )
+
+    req_group.add_argument(
+        "--decode-in-thread",
+        dest="decode_in_thread",
+        action="store_true",
+        default=None,
+        help="Decode responses in a worker thread so requests aren't held up.",
+    )
+    req_group.add_argument(
+        "--connect-timeout",
+        metavar="\b",
+        dest="connect_timeout",
+        type=float,
+        help="The seconds to wait to connect to the API. Defaults to 10.",
+    )
+    req_group.add_argument(
+        "--read-timeout",
+        metavar="\b",
+        dest="read_timeout",
+        type=float,
+        help="The seconds to wait for a response to be sent. Defaults to 120.",
+    )
+    req_group.add_argument(
+        "--timeout",
+        metavar="\b",
+        dest="total_timeout",
+        type=float,
+        help="The seconds a whole request can take. Defaults to 180.",
+    )
+    req_group.add_argument(
+        "--deadline",
+        metavar="\b",
+        dest="deadline",
+        type=float,
+        help=(
+            "The seconds the requests of a run can take in total. Unfinished "
+            "requests are cancelled and the results so far are written."
+        ),
+    )
+
+    req_group.add_argument(
+        "--metrics-file",
+        metavar="\b",
+        dest="metrics_file",
+        help="A file to write the run's request metrics to as JSON.",
+    )
+    req_group.add_argument(
+        "--prometheus-file",
+        metavar="\b",
+        dest="prometheus_file",
+        help=(
+            "A file to write the run's request metrics to in Prometheus text "
+            "format, e.g. for node_exporter's textfile collector."
+        ),
+    )
+
+    req_group.add_argument(
+        "--daily-quota",
+        metavar="\b",
+        dest="daily_quota",
+        type=int,
+        help=(
+            "The daily request quota of each API key. Requests beyond the quota "
+            "left today are deferred. Defaults to 25000."
+        ),
+    )
+    req_group.add_argument(
+        "--plan",
+        dest="dry_run",
+        action="store_true",
+        default=None,
+        help="Show the expected requests and duration without sending anything.",
+    )
+
+    req_group.add_argument(
+        "--uvloop",
+        dest="use_uvloop",
+        action="store_true",
+        default=None,
+        help="Use the uvloop event loop if it's installed.",
+    )
+    req_group.add_argument(
+        "--monitor-loop",
+        dest="monitor_loop",
+        action="store_true",
+        default=None,
+        help=(
+            "Log the callbacks that block the event loop the longest. "
+            "Runs the loop in debug mode, which adds overhead."
+        ),
+    )
+
     # Add other argument options for how to process the API response.
     proc_group = parser.add_argument_group("Processing Group")
     proc_group.add_argument(
@@ -100,9 +290,150 @@ def set_up_arg_parser() -> ArgumentParser:
             "and PageSpeed Insights metrics for all the pages in your sitemap to Excel."
         ),
     )
+    proc_group.add_argument(
+        "--shard",
+        metavar="\b",
+        dest="shard",
+        type=parse_shard,
+        help=(
+            "Only process a stable subset of the sitemap's URLs, e.g. `3/8` for "
+            "the 3rd of 8 shards. Merge the results with `psi-merge`."
+        ),
+    )
+    proc_group.add_argument(
+        "--max-sitemap-depth",
+        metavar="\b",
+        dest="max_sitemap_depth",
+        type=parse_positive_int,
+        help="Levels of nested sitemap indexes to follow. Defaults to 3.",
+    )
+    proc_group.add_argument(
+        "--sitemap-concurrency",
+        metavar="\b",
+        dest="sitemap_concurrency",
+        type=parse_positive_int,
+        help="The max number of sitemaps fetched at once. Defaults to 10.",
+    )
+    proc_group.add_argument(
+        "--incremental",
+        dest="incremental",
+        action="store_true",
+        default=None,
+        help=(
+            "Only request sitemap pages modified (per `<lastmod>`) since they "
+            "were last tested, or last tested more than `--max-age` days ago."
+        ),
+    )
+    proc_group.add_argument(
+        "--max-age",
+        metavar="\b",
+        dest="max_age",
+        type=float,
+        help="Days until a page is tested again in incremental runs. Defaults to 7.",
+    )
+    proc_group.add_argument(
+        "--trailing-slash",
+        metavar="\b",
+        dest="trailing_slash",
+        choices=COMMAND_CHOICES["trailing_slash"],
+        help=(
+            "How to treat trailing slashes when deduplicating URLs: `keep` the "
+            "first form seen (default), `strip` them or `add` them."
+        ),
+    )
+    proc_group.add_argument(
+        "--pretty",
+        dest="pretty",
+        action="store_true",
+        default=None,
+        help="Indent the `json` format output instead of writing it compactly.",
+    )
+    proc_group.add_argument(
+        "--full-response",
+        dest="full_response",
+        action="store_true",
+        default=None,
+        help=(
+            "Request the full API response for `excel` and `sitemap` formats "
+            "instead of only the parts written to Excel."
+        ),
+    )
+    proc_group.add_argument(
+        "--resume",
+        dest="resume",
+        action="store_true",
+        default=None,
+        help=(
+            "Resume an interrupted run with the same URL and arguments. "
+            "Completed requests are skipped and the report is rebuilt."
+        ),
+    )
+    return parser
+
+
+def set_up_merge_parser() -> ArgumentParser:
+    """Sets up the argument parser for merging the journals of sharded runs.
+
+    Returns:
+        An argparse.ArgumentParser instance.
+    """
+    parser = ArgumentParser(prog="psi-merge")
+    parser.add_argument(
+        "journals",
+        nargs="+",
+        help="The journal files (psi-journal-*.jsonl) of each shard to merge.",
+    )
     return parser
 
 
+def parse_positive_int(value: str) -> int:
+    """Parses an argument that must be a whole number greater than 0.
+
+    Raises:
+        ArgumentTypeError: The value isn't a positive whole number.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise ArgumentTypeError(f"Invalid number: {value}. Use a whole number.")
+    if number < 1:
+        raise ArgumentTypeError(f"Invalid number: {value}. Must be at least 1.")
+    return number
+
+
+def parse_positive_float(value: str) -> float:
+    """Parses an argument that must be a number greater than 0.
+
+    Raises:
+        ArgumentTypeError: The value isn't a positive number.
+    """
+    try:
+        number = float(value)
+    except ValueError:
+        raise ArgumentTypeError(f"Invalid number: {value}.")
+    if not 0 < number < math.inf:
+        raise ArgumentTypeError(f"Invalid number: {value}. Must be greater than 0.")
+    return number
+
+
+def parse_shard(value: str) -> Shard:
+    """Parses a shard argument in the format `index/count` (e.g. `3/8`).
+
+    Returns:
+        A tuple of the 1-based shard index and the shard count.
+    Raises:
+        ArgumentTypeError: The shard is malformed or out of range.
+    """
+    err = f"Invalid shard: {value}. Use the format index/count, e.g. 3/8."
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ArgumentTypeError(err)
+    if not 1 <= index <= count:
+        raise ArgumentTypeError(err)
+    return index, count
+
+
 def create_arg_groups(parser: ArgumentParser, args: Namespace) -> ArgGroups:
     """Creates separate namespaces for each arg group.
 
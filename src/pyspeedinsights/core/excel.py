@@ -15,12 +15,16 @@ logger = logging.getLogger(__name__)
 
 @dataclass
 class ExcelWorkbook:
-    """Class for creating an Excel Workbook and writing the PSI API results to it."""
+    """Class for creating an Excel Workbook and writing the PSI API results to it.
+
+    `suffix` is appended to the workbook's name, e.g. to tell merged reports apart.
+    """
 
     url: str
     metadata: dict[str, Any]
     audit_results: AuditResults
     metrics_results: MetricsResults = None
+    suffix: str = ""
     workbook: Workbook = None
     worksheet: Workbook.worksheet_class = None
     cur_cell: list[int] = field(default_factory=list)
@@ -85,7 +89,9 @@ class ExcelWorkbook:
         strategy = self.metadata["strategy"]
         category = self.metadata["category"]
         date = self.metadata["timestamp"]
-        self.workbook = Workbook(f"psi-s-{strategy}-c-{category}-{date}.xlsx")
+        self.workbook = Workbook(
+            f"psi-s-{strategy}-c-{category}-{date}{self.suffix}.xlsx"
+        )
         logger.info("Excel workbook created.")
 
     def _write_page_url(self) -> None:
@@ -0,0 +1,149 @@
+"""Local history of when each URL was last tested, for incremental sitemap runs.
+
+Incremental runs only request pages that changed since they were last tested
+according to their sitemap `<lastmod>`, or whose last test is older than a max
+age. Everything else is skipped like a completed request of a resumed run.
+
+Each run identity (the categories, locale, fields mask and other request args
+besides the URL and strategy) has its own history, so a page tested for one set
+of categories still gets tested for another.
+
+Typical usage example:
+    history = open_history(get_run_id(api_args_dict))
+    skipped = history.get_unchanged(entries, strategies, max_age)
+    history.record(url, strategy)
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from ..api.request import ResponseHandler
+from ..utils.paths import get_cache_dir
+from .sitemap import SitemapEntry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE = 7.0  # Days
+
+
+class RunHistory:
+    """Class for storing the last time each URL was tested with each strategy.
+
+    Only tests of the run identified by `run_id` are read and recorded
+    (see get_run_id()).
+    """
+
+    def __init__(self, path: Path, run_id: str = "") -> None:
+        self.path = path
+        self.run_id = run_id
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tested_runs ("
+            "run_id TEXT NOT NULL, "
+            "url TEXT NOT NULL, "
+            "strategy TEXT NOT NULL, "
+            "tested_at REAL NOT NULL, "
+            "PRIMARY KEY (run_id, url, strategy))"
+        )
+        self._conn.commit()
+
+    def get_tested_at(self, url: str, strategy: Optional[str]) -> Optional[float]:
+        """Gets the Unix time a URL was last tested with a strategy, if ever."""
+        row = self._conn.execute(
+            "SELECT tested_at FROM tested_runs "
+            "WHERE run_id = ? AND url = ? AND strategy = ?",
+            (self.run_id, url, str(strategy)),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def record(
+        self, url: str, strategy: Optional[str], tested_at: Optional[float] = None
+    ) -> None:
+        """Records that a URL was tested with a strategy, now by default."""
+        tested_at = time.time() if tested_at is None else tested_at
+        self._conn.execute(
+            "INSERT OR REPLACE INTO tested_runs VALUES (?, ?, ?, ?)",
+            (self.run_id, url, str(strategy), tested_at),
+        )
+        self._conn.commit()
+
+    def recording(self, handle_response: ResponseHandler) -> ResponseHandler:
+        """Wraps a response handler so each handled response is recorded as tested."""
+
+        def handle_and_record(url: str, strategy: str, json_resp: dict) -> None:
+            handle_response(url, strategy, json_resp)
+            self.record(url, strategy)
+
+        return handle_and_record
+
+    def get_unchanged(
+        self,
+        entries: dict[str, SitemapEntry],
+        strategies: list[str],
+        max_age: float = DEFAULT_MAX_AGE,
+    ) -> set[tuple[str, str]]:
+        """Gets the (url, strategy) pairs that don't need to be tested again.
+
+        A pair needs testing if it was never tested, if its sitemap entry was
+        modified after its last test or if its last test is older than
+        `max_age` days.
+
+        Args:
+            entries: The sitemap entry of each request URL.
+        """
+        oldest = time.time() - max_age * 86400
+        unchanged = set()
+        for url, entry in entries.items():
+            for strategy in strategies:
+                tested_at = self.get_tested_at(url, strategy)
+                if tested_at is None or tested_at < oldest:
+                    continue
+                if entry.lastmod is not None and entry.lastmod > tested_at:
+                    continue
+                unchanged.add((url, strategy))
+        return unchanged
+
+    def close(self) -> None:
+        """Closes the connection to the history database."""
+        self._conn.close()
+
+
+def get_run_id(api_args_dict: dict[str, Any]) -> str:
+    """Gets an id for the request args that affect what a test reports.
+
+    The URL and strategy are left out since the history records them per test.
+    """
+    run_args = {
+        k: sorted(v) if isinstance(v, list) else v
+        for k, v in api_args_dict.items()
+        if k not in ("url", "strategy")
+    }
+    identity = json.dumps(run_args, sort_keys=True)
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:12]
+
+
+def open_history(run_id: str = "") -> Optional[RunHistory]:
+    """Opens the history of a run in the local cache directory.
+
+    Returns:
+        A RunHistory instance or None if the history couldn't be opened.
+    """
+    try:
+        path = get_cache_dir() / "history.sqlite3"
+        history = RunHistory(path, run_id)
+    except (OSError, sqlite3.Error) as err:
+        logger.warning(f"Unable to open run history: {err}")
+        return None
+    logger.info(f"Using run history ({path})")
+    return history
+
+
+def sort_by_priority(urls: list[str], entries: dict[str, SitemapEntry]) -> list[str]:
+    """Sorts URLs by their sitemap priority, highest first, keeping ties in order."""
+    return sorted(urls, key=lambda url: -entries[url].priority)
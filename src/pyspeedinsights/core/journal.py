@@ -0,0 +1,104 @@
+"""Append-only checkpoint journal of completed requests for resumable runs.
+
+Each completed request is recorded as a line of JSON with its processed results
+as soon as it arrives, so a run that dies part way through can be resumed
+without re-requesting finished URLs. The outputs are rebuilt from the journal.
+
+Typical usage example:
+    journal = RunJournal(get_journal_path(url, api_args_dict, format))
+    completed = {(r["url"], r["strategy"]) for r in journal.load()}
+    journal.record(request_url, strategy, final_url, results)
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+JournalRecord = dict[str, Any]
+
+
+class RunJournal:
+    """Class for recording and replaying the completed requests of a run."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._line_ended = False
+
+    def record(
+        self,
+        url: str,
+        strategy: str,
+        final_url: Optional[str] = None,
+        results: Optional[list[dict]] = None,
+    ) -> None:
+        """Appends a completed request and its processed results to the journal.
+
+        The record is flushed and synced to disk before returning. Before the
+        first record, a truncated last line (e.g. from a crash mid-write) is
+        ended so the record isn't appended to it.
+        """
+        record = {
+            "url": url,
+            "strategy": strategy,
+            "final_url": final_url,
+            "results": results,
+        }
+        line = json.dumps(record, ensure_ascii=False)
+        if not self._line_ended:
+            self._end_last_line()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self) -> Iterator[JournalRecord]:
+        """Reads the records in the journal in the order they were completed.
+
+        A truncated last line (e.g. from a crash mid-write) is ignored.
+        """
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line_num, line in enumerate(f, 1):
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(
+                        f"Ignoring malformed journal record on line {line_num}."
+                    )
+
+    def reset(self) -> None:
+        """Clears the journal to start a new run."""
+        self.path.unlink(missing_ok=True)
+
+    def _end_last_line(self) -> None:
+        """Adds a newline to the journal if its last line is missing one."""
+        if self.path.exists() and self.path.stat().st_size > 0:
+            with open(self.path, "rb+") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        self._line_ended = True
+
+
+def get_journal_path(
+    url: str,
+    api_args_dict: dict[str, Any],
+    format: str,
+    shard: Optional[tuple[int, int]] = None,
+    directory: str = ".",
+) -> Path:
+    """Gets a journal path that's unique to the run's URL, request args and format.
+
+    Runs of the same sitemap with the same args share a journal so they can
+    be resumed. Each shard of a sharded run has its own journal.
+    """
+    run_args = {k: v for k, v in api_args_dict.items() if k != "url"}
+    identity = json.dumps([url, format, run_args, shard], sort_keys=True)
+    digest = hashlib.sha256(identity.encode("utf-8")).hexdigest()[:12]
+    return Path(directory) / f"psi-journal-{digest}.jsonl"
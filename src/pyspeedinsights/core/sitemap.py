@@ -1,21 +1,52 @@
 """Requesting and parsing of sitemaps to obtain request URLs for API calls.
 
 Includes support for recursive parsing of multiple sitemaps via a sitemap index.
+Child sitemaps are fetched concurrently over a shared connection pool.
+Sitemaps are parsed incrementally as their responses stream in, so memory use
+is bounded by the entries not yet consumed rather than the size of the sitemap.
+Gzipped sitemaps (`.xml.gz`) are decompressed as they stream in too.
+Unchanged sitemaps can be served from a SitemapCache via conditional requests
+(see pyspeedinsights.core.sitemap_cache).
 """
 
+import asyncio
 import logging
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from os.path import splitext
-from typing import Any, Optional, TypeAlias
+from typing import TYPE_CHECKING, AsyncIterator, Optional, Union
 from urllib.parse import urlsplit
 
+import aiohttp
+import defusedxml
 import defusedxml.ElementTree as ET
-import requests
 
-from ..utils.urls import validate_url
+from ..utils.urls import InvalidURLError, validate_url
+
+if TYPE_CHECKING:
+    from .sitemap_cache import SitemapCache
 
-XMLElement: TypeAlias = Any
 logger = logging.getLogger(__name__)
 
+NAMESPACE = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+DEFAULT_PRIORITY = 0.5  # Per the sitemaps.org protocol
+DEFAULT_MAX_DEPTH = 3  # Levels of nested sitemap indexes to follow
+DEFAULT_SITEMAP_CONCURRENCY = 10  # Sitemaps fetched at once
+CHUNK_SIZE = 64 * 1024  # Bytes of a sitemap parsed at a time
+GZIP_MAGIC = b"\x1f\x8b"
+# Sitemaps are limited to 50 MB uncompressed. Anything far past that is a gzip bomb.
+MAX_DECOMPRESSED_SIZE = 100 * 1024 * 1024
+SITEMAP_EXTENSIONS = (".xml", ".xml.gz")
+SITEMAP_TIMEOUT = aiohttp.ClientTimeout(sock_connect=3.05, sock_read=5)
+# Set a dummy user agent to avoid bot detection by firewalls
+# e.g. CloudFlare issues a 403 if it detects the default user-agent of HTTP clients
+DUMMY_USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/104.0.5112.79 Safari/537.36"
+)
+
 
 class SitemapError(Exception):
     """A base class for Sitemap exceptions."""
@@ -29,26 +60,104 @@ class SitemapParseError(SitemapError):
     """A class for Sitemap parsing exceptions."""
 
 
-def request_sitemap(url: str) -> str:
-    """Retrieves the sitemap from the given URL.
+@dataclass
+class SitemapEntry:
+    """Class for a `<url>` of a sitemap and its optional metadata.
+
+    `lastmod` is a Unix timestamp, or None if it's missing or invalid.
+    """
+
+    loc: str
+    lastmod: Optional[float] = None
+    priority: float = DEFAULT_PRIORITY
+    changefreq: Optional[str] = None
+
+
+# Parsed items are the entries of a sitemap or the child sitemap URLs of an index.
+SitemapItem = Union[SitemapEntry, str]
+
+
+@dataclass
+class SitemapValidators:
+    """Class for the HTTP cache validators of a sitemap response.
+
+    Passed to fetch_sitemap() to request the sitemap conditionally. They're
+    updated with the validators of the response, and `not_modified` is set if
+    the server responded with 304 Not Modified.
+    """
+
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    not_modified: bool = False
+
+
+def get_sitemap_entries(
+    url: str,
+    max_depth: int = DEFAULT_MAX_DEPTH,
+    concurrency: int = DEFAULT_SITEMAP_CONCURRENCY,
+    cache: Optional["SitemapCache"] = None,
+) -> list[SitemapEntry]:
+    """Retrieves a sitemap or sitemap index and gets all of its entries.
+
+    Child sitemaps of an index are fetched `concurrency` at a time over a shared
+    connection pool, in up to `max_depth` levels of nested indexes. Each
+    sitemap is only fetched once, so indexes that reference each other are
+    only followed until they repeat. Sitemaps in `cache` are requested
+    conditionally and reused if they haven't changed.
+
+    Returns:
+        A full list of sitemap entries for use in requests, in sitemap order.
+    Raises:
+        SitemapRetrievalError: A sitemap URL is invalid or a request failed.
+        SitemapParseError: A sitemap couldn't be parsed or no URLs were found.
+    """
+    return asyncio.run(_crawl(url, max_depth, concurrency, cache))
+
+
+async def stream_sitemap_entries(
+    url: str,
+    max_depth: int = DEFAULT_MAX_DEPTH,
+    concurrency: int = DEFAULT_SITEMAP_CONCURRENCY,
+    cache: Optional["SitemapCache"] = None,
+) -> AsyncIterator[SitemapEntry]:
+    """Crawls a sitemap or sitemap index, yielding entries as they're parsed.
+
+    Like get_sitemap_entries(), but runs in the caller's event loop so the
+    entries can be used while the rest of the tree is still being crawled.
+
+    Raises:
+        SitemapError: A sitemap couldn't be retrieved or parsed, or the crawl
+            found no URLs.
+    """
+    found = False
+    async with create_sitemap_session(concurrency) as session:
+        crawler = SitemapCrawler(session, max_depth, concurrency, cache)
+        async for entry in crawler.crawl(url):
+            found = True
+            yield entry
+    if not found:
+        raise SitemapParseError("No URLs found in the sitemap(s).")  # Logged in main()
+
+
+async def fetch_sitemap(
+    session: aiohttp.ClientSession,
+    url: str,
+    validators: Optional[SitemapValidators] = None,
+) -> AsyncIterator[bytes]:
+    """Retrieves the sitemap from the given URL as a stream of chunks.
 
     Validates the url format and whether the url is a valid sitemap.
     Makes a get request to retrieve the sitemap content in XML format.
+    Gzipped content is decompressed as it streams in.
+    If `validators` are given, the request is conditional and nothing is
+    yielded if the sitemap wasn't modified (see SitemapValidators).
 
-    Returns:
-        A str with XML sitemap text content.
+    Yields:
+        Chunks of the XML sitemap content as bytes.
     Raises:
         SitemapRetrievalError: The sitemap URL is invalid or a request failed.
     """
     url = validate_url(url)
-    # Set a dummy user agent to avoid bot detection by firewalls
-    # e.g. CloudFlare issues a 403 if it detects the default requests module user-agent
-    dummy_user_agent = (
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/104.0.5112.79 Safari/537.36"
-    )
-    headers = {"user-agent": dummy_user_agent}
 
     # Below errors logged as CRITICAL in main() before exit
     logger.info("Checking if sitemap URL is a valid sitemap URL.")
@@ -59,99 +168,382 @@ def request_sitemap(url: str) -> str:
         raise SitemapRetrievalError(err)
     try:
         logger.info(f"Requesting sitemap ({url})")
-        resp = requests.get(url, headers=headers, timeout=(3.05, 5))
-        resp.raise_for_status()
-    except requests.exceptions.HTTPError as errh:
+        async with session.get(
+            url, headers=_get_conditional_headers(validators)
+        ) as resp:
+            if validators is not None and resp.status == 304:
+                logger.info(f"Sitemap not modified. ({url})")
+                validators.not_modified = True
+                return
+            resp.raise_for_status()
+            if validators is not None:
+                validators.etag = resp.headers.get("ETag")
+                validators.last_modified = resp.headers.get("Last-Modified")
+            chunks = resp.content.iter_chunked(CHUNK_SIZE)
+            async for chunk in _decompress(chunks):
+                yield chunk
+    except aiohttp.ClientResponseError as errh:
         raise SitemapRetrievalError(f"HTTP Error: {errh}")
-    except requests.exceptions.ConnectionError as errc:
+    # Timeouts are also connection errors in aiohttp, so check them first.
+    except asyncio.TimeoutError as errt:
+        raise SitemapRetrievalError(f"Timeout Error: {errt!r}")
+    except aiohttp.ClientConnectionError as errc:
         raise SitemapRetrievalError(f"Connection Error: {errc}")
-    except requests.exceptions.Timeout as errt:
-        raise SitemapRetrievalError(f"Timeout Error: {errt}")
-    except requests.exceptions.RequestException as err:
+    except aiohttp.ClientError as err:
         raise SitemapRetrievalError(f"Request Error: {err}")
+    except zlib.error as errz:
+        raise SitemapRetrievalError(f"Decompression Error: {errz}")
 
-    sitemap = resp.text
-    logger.info("Sitemap retrieval successful.")
-    return sitemap
+    logger.info(f"Sitemap retrieval successful. ({url})")
 
 
-def validate_sitemap_url(url: str) -> bool:
-    """Checks that the sitemap URL is valid (.xml format)."""
-    u = urlsplit(url)
-    ext = splitext(u.path)[-1]
-    return ext == ".xml"
+def create_sitemap_session(concurrency: int) -> aiohttp.ClientSession:
+    """Creates a client session with a connection pool for fetching sitemaps."""
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers={"user-agent": DUMMY_USER_AGENT},
+        timeout=SITEMAP_TIMEOUT,
+    )
 
 
-def get_sitemap_root(sitemap: str) -> XMLElement:
-    """Gets the root element of the sitemap."""
-    logger.info("Locating sitemap root.")
-    return ET.fromstring(sitemap)
+class SitemapParser:
+    """Class for parsing a sitemap or sitemap index incrementally.
 
+    Chunks of the document are fed to a defusedxml parser, which protects
+    against entity expansion and external entity attacks. No element tree is
+    built: each `<url>` or `<sitemap>` is turned into an item as soon as it's
+    closed, and parsed items are handed off with pop_items().
+    """
 
-def get_sitemap_type(root: XMLElement) -> str:
-    """Gets the tag value of the root element to determine sitemap type."""
-    logger.info("Getting sitemap type.")
-    return root.tag.split("}")[-1]
+    def __init__(self) -> None:
+        self._target = _SitemapTarget()
+        self._parser = ET.XMLParser(target=self._target)
+
+    @property
+    def sitemap_type(self) -> Optional[str]:
+        """The type of the sitemap, `urlset` or `sitemapindex`, once detected."""
+        return self._target.sitemap_type
+
+    def feed(self, data: Union[bytes, str]) -> None:
+        """Parses the next chunk of the document.
+
+        Raises:
+            SitemapParseError: The document isn't a valid sitemap.
+        """
+        try:
+            self._parser.feed(data)
+        except (ET.ParseError, defusedxml.DefusedXmlException) as err:
+            raise SitemapParseError(f"Sitemap format invalid: {err}")
+
+    def close(self) -> None:
+        """Finishes parsing the document.
+
+        Raises:
+            SitemapParseError: The document is incomplete.
+        """
+        try:
+            self._parser.close()
+        except ET.ParseError as err:
+            raise SitemapParseError(f"Sitemap format invalid: {err}")
+
+    def pop_items(self) -> list[SitemapItem]:
+        """Gets the items parsed since the last call."""
+        items, self._target.items = self._target.items, []
+        return items
+
+
+class SitemapCrawler:
+    """Class for fetching and processing a sitemap and its children concurrently.
+
+    Tracks visited sitemap URLs so cycles between indexes are only followed
+    once, and stops following nested indexes past `max_depth`. Entries are
+    yielded in sitemap order. Up to `concurrency` children of an index are
+    fetched ahead of the one being yielded.
+    """
 
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        max_depth: int,
+        concurrency: int,
+        cache: Optional["SitemapCache"] = None,
+    ) -> None:
+        self.session = session
+        self.cache = cache
+        self.max_depth = max_depth
+        self.concurrency = concurrency
+        self.visited: set[str] = set()
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def crawl(self, url: str, depth: int = 0) -> AsyncIterator[SitemapEntry]:
+        """Fetches a sitemap and yields its entries and those of its children."""
+        url = validate_url(url)
+        if url in self.visited:
+            logger.warning(f"Sitemap already processed. Skipping it. ({url})")
+            return
+        self.visited.add(url)
+
+        children = []
+        async for item in self._fetch_items(url):
+            if isinstance(item, SitemapEntry):
+                yield item
+            else:
+                children.append(item)
+        async for entry in self._crawl_children(children, depth):
+            yield entry
+
+    async def _fetch_items(self, url: str) -> AsyncIterator[SitemapItem]:
+        """Fetches and parses a sitemap, yielding its items as they're parsed.
+
+        If the sitemap is cached and hasn't changed, its cached items are
+        yielded instead. Otherwise the new items are cached if the response has
+        validators. Items are only buffered for the cache in that case, since
+        a sitemap without validators can't be requested conditionally.
+        """
+        validators = None if self.cache is None else self.cache.get_validators(url)
+        validators = validators or SitemapValidators()
+        parser = SitemapParser()
+        items: list[SitemapItem] = []
+        async with self._semaphore:
+            async for chunk in fetch_sitemap(self.session, url, validators):
+                # The validators are those of the response by the first chunk.
+                cacheable = self._is_cacheable(validators)
+                parser.feed(chunk)
+                for item in parser.pop_items():
+                    if cacheable:
+                        items.append(item)
+                    yield item
+
+        if self.cache is not None and validators.not_modified:
+            logger.info(f"Using cached URLs of the unchanged sitemap. ({url})")
+            for item in self.cache.get_items(url):
+                yield item
+            return
+        parser.close()
+        cacheable = self._is_cacheable(validators)
+        for item in parser.pop_items():
+            if cacheable:
+                items.append(item)
+            yield item
+        if self.cache is not None and cacheable:
+            self.cache.set(url, validators, items)
+
+    def _is_cacheable(self, validators: SitemapValidators) -> bool:
+        """Checks if a sitemap's items can be cached under its validators."""
+        return self.cache is not None and bool(
+            validators.etag or validators.last_modified
+        )
 
-def process_sitemap(sitemap: str) -> list[Optional[str]]:
-    """Processes a sitemap or sitemap index based on type.
+    async def _crawl_children(
+        self, children: list[str], depth: int
+    ) -> AsyncIterator[SitemapEntry]:
+        """Crawls the children of a sitemap index and yields their entries in order.
+
+        Each child is collected by its own task, and tasks are started up to
+        `concurrency` ahead of the child being yielded to bound memory use.
+        Children that can't be retrieved or parsed are logged and skipped, so one
+        broken child doesn't stop the rest of the tree from being crawled.
+        """
+        if not children:
+            return
+        if depth >= self.max_depth:
+            logger.warning(
+                f"Sitemap index nested deeper than {self.max_depth} level(s). "
+                "Skipping its children."
+            )
+            return
+        logger.info(f"Fetching {len(children)} child sitemap(s) concurrently.")
+
+        async def collect(child: str) -> list[SitemapEntry]:
+            entries = []
+            try:
+                async for entry in self.crawl(child, depth + 1):
+                    entries.append(entry)
+            except (SitemapError, InvalidURLError) as err:
+                logger.error(f"Skipping child sitemap. {err} ({child})")
+            return entries
+
+        pending: list[asyncio.Future] = []
+        remaining = iter(children)
+        try:
+            for child in remaining:
+                pending.append(asyncio.ensure_future(collect(child)))
+                if len(pending) < self.concurrency:
+                    continue
+                for entry in await pending.pop(0):
+                    yield entry
+            while pending:
+                for entry in await pending.pop(0):
+                    yield entry
+        finally:
+            for task in pending:
+                task.cancel()
 
-    Multiple sitemaps are processed recursively via a sitemap index.
 
-    Returns:
-        A full list of request URLs for use in requests.
-    Raises:
-        SitemapParseError: The sitemap type couldn't be parsed from the root element.
-                    The sitemap type parsed from the root element is invalid.
-                    No URLs were parsed from the sitemap(s) successfully.
-    """
-    err = "Sitemap format invalid."
-    logger.info("Processing sitemap.")
+def validate_sitemap_url(url: str) -> bool:
+    """Checks that the sitemap URL is valid (.xml or gzipped .xml.gz format)."""
+    u = urlsplit(url)
+    root, ext = splitext(u.path)
+    if ext == ".gz":
+        ext = splitext(root)[-1] + ext
+    return ext in SITEMAP_EXTENSIONS
 
-    try:
-        root = get_sitemap_root(sitemap)
-        sitemap_type = get_sitemap_type(root)
-    except ET.ParseError:
-        raise SitemapParseError(err)  # Logged in main()
-
-    if sitemap_type == "sitemapindex":
-        logger.info("Sitemap index detected. Recursively parsing children.")
-        request_urls = []
-        sitemap_urls = _parse_sitemap_index(root)
-        for sm_url in sitemap_urls:
-            if sm_url is not None:
-                sitemap = request_sitemap(sm_url)
-                request_urls.extend(process_sitemap(sitemap))
-    elif sitemap_type == "urlset":
-        logger.info("Standard sitemap detected.")
-        request_urls = _parse_sitemap_urls(root)
-    else:
-        raise SitemapParseError(err)  # Logged in main()
-
-    if not request_urls:
-        raise SitemapParseError("No URLs found in the sitemap(s).")  # Logged in main()
-    return request_urls
 
+def parse_lastmod(lastmod: str) -> Optional[float]:
+    """Parses a W3C datetime `<lastmod>` value into a Unix timestamp.
 
-def _parse_sitemap_index(root: XMLElement) -> list[Optional[str]]:
-    """Parse sitemap URLs from the sitemap index and return them as a list."""
-    logger.info("Parsing child sitemap URLs from index.")
-    return _parse_urls_from_root(root, type="sitemap")
+    Dates without a time and datetimes without a timezone are treated as UTC.
 
+    Returns:
+        The timestamp as a float or None if the value isn't a valid datetime.
+    """
+    value = lastmod.strip()
+    if value.endswith(("Z", "z")):
+        value = value[:-1] + "+00:00"
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+async def _crawl(
+    url: str,
+    max_depth: int,
+    concurrency: int,
+    cache: Optional["SitemapCache"] = None,
+) -> list[SitemapEntry]:
+    """Crawls a sitemap from its URL with a new session."""
+    stream = stream_sitemap_entries(url, max_depth, concurrency, cache)
+    return [entry async for entry in stream]
+
+
+def _get_conditional_headers(
+    validators: Optional[SitemapValidators],
+) -> dict[str, str]:
+    """Gets the headers of a conditional request from a sitemap's validators."""
+    headers = {}
+    if validators is not None and validators.etag is not None:
+        headers["If-None-Match"] = validators.etag
+    if validators is not None and validators.last_modified is not None:
+        headers["If-Modified-Since"] = validators.last_modified
+    return headers
+
+
+async def _decompress(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Decompresses a stream of chunks if it's gzipped, passing it through if not.
+
+    Gzip is detected from the content rather than the URL, since servers often
+    send `.xml.gz` files with `Content-Encoding: gzip`, which aiohttp decodes.
+    Decompressed chunks are at most CHUNK_SIZE bytes. Chunks that are passed
+    through count towards MAX_DECOMPRESSED_SIZE too, since they may have been
+    decoded by aiohttp already.
 
-def _parse_sitemap_urls(root: XMLElement) -> list[Optional[str]]:
-    """Parse URLs from the XML sitemap and return a list of request URLs."""
-    logger.info("Parsing URLs from sitemap.")
-    return _parse_urls_from_root(root)
+    Raises:
+        zlib.error: The content is corrupt or decompresses past
+            MAX_DECOMPRESSED_SIZE.
+    """
+    head = b""
+    decompressor = None
+    size = 0
+    async for chunk in chunks:
+        if decompressor is None:
+            head += chunk
+            if len(head) < len(GZIP_MAGIC):
+                continue
+            if not head.startswith(GZIP_MAGIC):
+                size = _check_size(size, head)
+                yield head
+                async for rest in chunks:
+                    size = _check_size(size, rest)
+                    yield rest
+                return
+            logger.info("Gzipped sitemap detected. Decompressing it.")
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            chunk = head
+        while chunk:
+            data = decompressor.decompress(chunk, CHUNK_SIZE)
+            chunk = decompressor.unconsumed_tail
+            size = _check_size(size, data)
+            if data:
+                yield data
+    if decompressor is None:
+        if head:
+            yield head
+        return
+    if not decompressor.eof:
+        raise zlib.error("Gzipped sitemap is incomplete.")
+    data = decompressor.flush()
+    if data:
+        yield data
+
+
+def _check_size(size: int, data: bytes) -> int:
+    """Adds a chunk to the decompressed size of a sitemap.
+
+    Raises:
+        zlib.error: The sitemap is past MAX_DECOMPRESSED_SIZE.
+    """
+    size += len(data)
+    if size > MAX_DECOMPRESSED_SIZE:
+        raise zlib.error("Decompressed sitemap is too large.")
+    return size
+
+
+def _create_entry(fields: dict[str, str]) -> Optional[SitemapEntry]:
+    """Creates a sitemap entry from the fields of a `<url>`, if it has a loc."""
+    loc = fields.get("loc")
+    if not loc:
+        return None
+    lastmod = fields.get("lastmod")
+    try:
+        priority = float(fields.get("priority", DEFAULT_PRIORITY))
+    except ValueError:
+        priority = DEFAULT_PRIORITY
+    return SitemapEntry(
+        loc=loc,
+        lastmod=None if lastmod is None else parse_lastmod(lastmod),
+        priority=priority,
+        changefreq=fields.get("changefreq"),
+    )
 
 
-def _parse_urls_from_root(root: XMLElement, type: str = "url") -> list[Optional[str]]:
-    """Parse URL locs from root xml element."""
-    namespace = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
-    urls = []
-    for el in root.findall(f"{namespace}{type}"):
-        loc = el.find(f"{namespace}loc")
-        if loc is not None:
-            urls.append(loc.text)
-    return urls
+class _SitemapTarget:
+    """Parser target that turns sitemap elements into items as they're closed."""
+
+    def __init__(self) -> None:
+        self.sitemap_type: Optional[str] = None
+        self.items: list[SitemapItem] = []
+        self._fields: dict[str, str] = {}
+        self._text: list[str] = []
+
+    def start(self, tag: str, attrib: dict[str, str]) -> None:
+        self._text = []
+        if self.sitemap_type is not None:
+            return
+        sitemap_type = tag.split("}")[-1]
+        if sitemap_type not in ("urlset", "sitemapindex"):
+            raise SitemapParseError("Sitemap format invalid.")  # Logged in main()
+        self.sitemap_type = sitemap_type
+        logger.info(f"Sitemap type detected: {sitemap_type}")
+
+    def data(self, data: str) -> None:
+        self._text.append(data)
+
+    def end(self, tag: str) -> None:
+        name = tag[len(NAMESPACE) :] if tag.startswith(NAMESPACE) else None
+        if name in ("loc", "lastmod", "priority", "changefreq"):
+            self._fields[name] = "".join(self._text).strip()
+        elif name == "url" and self.sitemap_type == "urlset":
+            entry = _create_entry(self._fields)
+            if entry is not None:
+                self.items.append(entry)
+            self._fields = {}
+        elif name == "sitemap" and self.sitemap_type == "sitemapindex":
+            if self._fields.get("loc"):
+                self.items.append(self._fields["loc"])
+            self._fields = {}
+        self._text = []
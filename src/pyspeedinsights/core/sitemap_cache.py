@@ -0,0 +1,127 @@
+"""Persistent on-disk cache of parsed sitemaps for conditional requests.
+
+Each sitemap's parsed URLs (or child sitemaps, for an index) are stored with the
+`ETag` and `Last-Modified` validators of its response. Later runs send them back
+as `If-None-Match` and `If-Modified-Since`, and reuse the cached URLs when the
+server responds with 304 Not Modified, skipping the download and the parse.
+"""
+
+import logging
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from ..utils.paths import get_cache_dir
+from ..utils.serialization import dumps, loads
+from .sitemap import SitemapEntry, SitemapItem, SitemapValidators
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_CACHE_TTL = 30.0  # Days a sitemap is kept without being requested
+
+
+class SitemapCache:
+    """Class for storing the parsed items and validators of sitemaps by URL.
+
+    Sitemaps that haven't been requested for `ttl` seconds are removed when
+    the cache is opened.
+    """
+
+    def __init__(self, path: Path, ttl: float) -> None:
+        self.path = path
+        self.hits = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sitemaps ("
+            "url TEXT PRIMARY KEY, "
+            "etag TEXT, "
+            "last_modified TEXT, "
+            "accessed_at REAL NOT NULL, "
+            "items BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "DELETE FROM sitemaps WHERE accessed_at < ?", (time.time() - ttl,)
+        )
+        self._conn.commit()
+
+    def get_validators(self, url: str) -> Optional[SitemapValidators]:
+        """Gets the validators of a cached sitemap, if it has any."""
+        row = self._conn.execute(
+            "SELECT etag, last_modified FROM sitemaps WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None or not any(row):
+            return None
+        return SitemapValidators(etag=row[0], last_modified=row[1])
+
+    def get_items(self, url: str) -> list[SitemapItem]:
+        """Gets the parsed items of a cached sitemap and marks it as used."""
+        row = self._conn.execute(
+            "SELECT items FROM sitemaps WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return []
+        self._conn.execute(
+            "UPDATE sitemaps SET accessed_at = ? WHERE url = ?", (time.time(), url)
+        )
+        self._conn.commit()
+        self.hits += 1
+        return [
+            item if isinstance(item, str) else SitemapEntry(*item)
+            for item in loads(zlib.decompress(row[0]))
+        ]
+
+    def set(
+        self, url: str, validators: SitemapValidators, items: list[SitemapItem]
+    ) -> None:
+        """Stores the parsed items of a sitemap with its validators.
+
+        Sitemaps without validators can't be requested conditionally, so
+        they aren't stored.
+        """
+        if validators.etag is None and validators.last_modified is None:
+            return
+        serialized = [
+            (
+                item
+                if isinstance(item, str)
+                else [item.loc, item.lastmod, item.priority, item.changefreq]
+            )
+            for item in items
+        ]
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sitemaps VALUES (?, ?, ?, ?, ?)",
+            (
+                url,
+                validators.etag,
+                validators.last_modified,
+                time.time(),
+                zlib.compress(dumps(serialized)),
+            ),
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        """Closes the connection to the cache database."""
+        self._conn.close()
+
+
+def open_sitemap_cache(ttl: float = SITEMAP_CACHE_TTL) -> Optional[SitemapCache]:
+    """Opens the sitemap cache in the local cache directory.
+
+    Args:
+        ttl: Days a sitemap is kept without being requested.
+    Returns:
+        A SitemapCache instance or None if the cache couldn't be opened,
+        in which case sitemaps are always downloaded in full.
+    """
+    try:
+        path = get_cache_dir() / "sitemaps.sqlite3"
+        cache = SitemapCache(path, ttl * 86400)
+    except (OSError, sqlite3.Error) as err:
+        logger.warning(f"Unable to open sitemap cache. Caching disabled: {err}")
+        return None
+    logger.info(f"Using sitemap cache ({path})")
+    return cache
@@ -0,0 +1,119 @@
+"""Writing of PSI API responses to the selected report format as they arrive."""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Optional, Union
+
+from ..api.response import process_excel, process_json
+from .excel import ExcelWorkbook
+from .journal import JournalRecord, RunJournal
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReportWriter:
+    """Class for writing each PSI API response to JSON or Excel as it completes.
+
+    A single response can cover several categories. For Excel, it is split into
+    per-category results, each written to a workbook per strategy and category.
+    Each workbook is created from the first successfully processed response for
+    its strategy and category and updated in place for each subsequent one.
+    If a journal is set, each written response is recorded in it along with its
+    processed Excel results so the report can be rebuilt when a run is resumed.
+    `workbook_suffix` is appended to the name of each workbook.
+    """
+
+    format: str
+    categories: list[str]
+    journal: Optional[RunJournal] = None
+    pretty: bool = False
+    workbook_suffix: str = ""
+    workbooks: dict[tuple[str, str], ExcelWorkbook] = field(default_factory=dict)
+
+    def write(self, request_url: str, strategy: str, json_resp: dict) -> None:
+        """Writes a single response to the report format.
+
+        Called for each response by run_requests() in pyspeedinsights.api.request.
+        """
+        if self.format == "json":
+            logger.info("JSON format selected. Processing JSON.")
+            process_json(json_resp, "_".join(self.categories), strategy, self.pretty)
+            if self.journal is not None:
+                self.journal.record(request_url, strategy)
+        else:
+            self._write_excel(request_url, strategy, json_resp)
+
+    def replay(self, record: JournalRecord) -> None:
+        """Writes the processed results of a journal record from a previous run."""
+        for excel_results in record.get("results") or []:
+            self.write_results(record["final_url"], excel_results)
+
+    def write_results(
+        self, url: str, excel_results: dict[str, Union[dict, None]]
+    ) -> None:
+        """Writes processed Excel results for a single URL, strategy and category."""
+        metadata = excel_results.get("metadata")
+        audit_results = excel_results.get("audit_results")
+        metrics_results = excel_results.get("metrics_results")
+        if metadata is None or audit_results is None:
+            return
+
+        strategy, category = metadata["strategy"], metadata["category"]
+        workbook = self.workbooks.get((strategy, category))
+        first_resp = workbook is None
+        if workbook is None:
+            logger.info(
+                f"Excel format selected. Creating {strategy} {category} workbook."
+            )
+            workbook = ExcelWorkbook(
+                url, metadata, audit_results, metrics_results, self.workbook_suffix
+            )
+            workbook.set_up_worksheet()
+            self.workbooks[(strategy, category)] = workbook
+        else:
+            # Simply update the workbook attrs after the first response.
+            workbook.url = url
+            workbook.metadata = metadata
+            workbook.audit_results = audit_results
+            workbook.metrics_results = metrics_results
+            logger.info("Updating workbook to process next URL.")
+
+        workbook.write_to_worksheet(first_resp)
+
+    def finalize(self) -> None:
+        """Saves the Excel workbooks once all responses have been written."""
+        if self.format == "json":
+            return
+        if not self.workbooks:
+            logger.warning("No results were processed. Excel workbook not created.")
+            return
+        for workbook in self.workbooks.values():
+            workbook.finalize_and_save()
+
+    def _write_excel(self, request_url: str, strategy: str, json_resp: dict) -> None:
+        """Processes a response for Excel and writes its results to the workbooks."""
+        try:
+            final_url = json_resp["lighthouseResult"]["finalUrl"]
+        except KeyError as err:
+            logger.warning(
+                f"The response data contains no URL: {err}. "
+                f"Falling back to the request URL ({request_url})"
+            )
+            final_url = request_url
+
+        results = []
+        for category in self.categories:
+            excel_results = process_excel(json_resp, category)
+            if not excel_results:
+                # Empty results from process_excel() mean a processing issue.
+                logger.warning(
+                    f"Skipping Excel processing of {category} for {final_url} "
+                    "due to malformed JSON."
+                )
+                continue
+            self.write_results(final_url, excel_results)
+            results.append(excel_results)
+
+        if self.journal is not None:
+            self.journal.record(request_url, strategy, final_url, results)
@@ -7,8 +7,8 @@ def remove_nonetype_dict_items(dct: dict) -> dict:
 
 
 def remove_dupes_from_list(lst: list) -> list:
-    """Removes duplicate values from a list."""
-    return list(set(lst))
+    """Removes duplicate values from a list, keeping the first occurrence of each."""
+    return list(dict.fromkeys(lst))
 
 
 def sort_dict_alpha(dct: dict) -> dict:
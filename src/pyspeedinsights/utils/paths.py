@@ -0,0 +1,23 @@
+"""Utilities for locating data stored locally between runs."""
+
+import os
+from pathlib import Path
+
+
+def get_cache_dir() -> Path:
+    """Gets the directory used for local caches and run state, creating it if needed.
+
+    Uses `PSI_CACHE_DIR` if set, otherwise `pyspeedinsights` in `XDG_CACHE_HOME`
+    or `~/.cache`.
+
+    Returns:
+        A pathlib.Path to the cache directory.
+    """
+    cache_dir = os.environ.get("PSI_CACHE_DIR")
+    if cache_dir:
+        path = Path(cache_dir)
+    else:
+        xdg_cache = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+        path = Path(xdg_cache) / "pyspeedinsights"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
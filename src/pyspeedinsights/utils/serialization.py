@@ -0,0 +1,60 @@
+"""JSON encoding and decoding with the fastest available backend.
+
+Uses orjson or msgspec if either is installed (e.g. `pip install
+pyspeedinsights[fast]`), otherwise falls back to the stdlib json module.
+Lighthouse reports are several MB each, so the backend makes a real
+difference to CPU time on large runs.
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None  # type: ignore[assignment]
+
+if orjson is not None:
+    BACKEND = "orjson"
+elif msgspec is not None:
+    BACKEND = "msgspec"
+else:
+    BACKEND = "json"
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decodes a JSON document from raw bytes or a str.
+
+    Raises:
+        ValueError: The data isn't valid JSON, whichever the backend.
+    """
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    if BACKEND == "msgspec":
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError as err:
+            raise ValueError(str(err)) from err
+    return json.loads(data)
+
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    """Encodes an object as UTF-8 JSON bytes.
+
+    Output is compact unless `pretty` is set, in which case it's indented.
+    """
+    if BACKEND == "orjson":
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        return orjson.dumps(obj, option=option)
+    if BACKEND == "msgspec":
+        encoded = msgspec.json.encode(obj)
+        return msgspec.json.format(encoded, indent=2) if pretty else encoded
+
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -1,10 +1,14 @@
 """Utilities for URL processing."""
 
+import hashlib
 import logging
+from typing import Iterable, Optional
 from urllib.parse import urlsplit
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
 
 class InvalidURLError(Exception):
     """A base exception for an invalid URL format."""
@@ -49,3 +53,99 @@ def validate_url(url: str) -> str:
     replacements["query"] = ""
     u = u._replace(**replacements)
     return u.geturl()
+
+
+def canonicalize_url(url: str, trailing_slash: str = "keep") -> str:
+    """Validates a URL and normalizes it so variants of the same page are equal.
+
+    On top of validate_url() (which also drops query params such as `utm_`
+    tracking params), the scheme and host are lowercased, default ports are
+    removed and the trailing slash policy is applied to the path.
+
+    Args:
+        trailing_slash: `strip` or `add` a trailing slash to non-root paths,
+            or `keep` them as they are.
+    Raises:
+        InvalidURLError: The URL isn't valid (see validate_url()).
+    """
+    u = urlsplit(validate_url(url))
+    scheme = u.scheme.lower()
+    netloc = u.netloc.rpartition("@")[2].lower()
+    host, _, port = netloc.rpartition(":")
+    if host and not host.endswith("]") and port.isdigit():
+        if int(port) == DEFAULT_PORTS.get(scheme):
+            netloc = host
+
+    path = u.path or "/"
+    if trailing_slash == "strip" and path != "/":
+        path = path.rstrip("/") or "/"
+    elif trailing_slash == "add" and not path.endswith("/"):
+        path += "/"
+    return u._replace(scheme=scheme, netloc=netloc, path=path).geturl()
+
+
+def index_urls(urls: Iterable[str], trailing_slash: str = "keep") -> dict[str, int]:
+    """Builds an order-preserving index of unique canonical URLs.
+
+    Each URL is validated once. With the `keep` trailing slash policy, URLs that
+    only differ by a trailing slash are still duplicates and the first one seen
+    is kept.
+
+    Returns:
+        A dict of each unique canonical URL to the position of its first
+        occurrence in `urls`.
+    Raises:
+        InvalidURLError: A URL isn't valid (see validate_url()).
+    """
+    deduplicator = URLDeduplicator(trailing_slash)
+    index = {}
+    for i, url in enumerate(urls):
+        canonical_url = deduplicator.add(url)
+        if canonical_url is not None:
+            index[canonical_url] = i
+    return index
+
+
+class URLDeduplicator:
+    """Class for removing duplicate URLs inline as they're discovered.
+
+    Only the canonical form of each unique URL is kept, not the URLs
+    themselves. See index_urls() for how duplicates are detected.
+    """
+
+    def __init__(self, trailing_slash: str = "keep") -> None:
+        self.trailing_slash = trailing_slash
+        self.duplicates = 0
+        self._seen: set[str] = set()
+
+    def add(self, url: str) -> Optional[str]:
+        """Canonicalizes a URL and records it as seen.
+
+        Returns:
+            The canonical URL or None if it's a duplicate.
+        Raises:
+            InvalidURLError: The URL isn't valid (see validate_url()).
+        """
+        canonical_url = canonicalize_url(url, self.trailing_slash)
+        key = canonical_url
+        if self.trailing_slash == "keep":
+            key = canonical_url.rstrip("/")
+        if key in self._seen:
+            self.duplicates += 1
+            return None
+        self._seen.add(key)
+        return canonical_url
+
+
+def in_shard(url: str, shard_index: int, shard_count: int) -> bool:
+    """Checks if a URL belongs to a shard of a hash-partitioned list of URLs.
+
+    The partition is stable across processes and machines, so each of N workers
+    can select its own shard of the same URL list without coordination.
+
+    Args:
+        shard_index: The 1-based index of the shard.
+        shard_count: The total number of shards.
+    """
+    digest = hashlib.sha256(url.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count == shard_index - 1
@@ -0,0 +1,79 @@
+import os
+import time
+
+import pytest
+
+from pyspeedinsights.api.cache import ResponseCache, open_cache
+from pyspeedinsights.utils.serialization import dumps
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite3", ttl=60, max_size=1024 * 1024)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def params():
+    return {"key": "secret", "url": "https://example.com", "strategy": "mobile"}
+
+
+class TestResponseCache:
+    """Tests storing and retrieving cached responses."""
+
+    def test_miss_returns_none(self, cache, params):
+        assert cache.get(params) is None
+
+    def test_hit_returns_response(self, cache, params):
+        cache.set(params, dumps({"id": 1}))
+        assert cache.get(params) == {"id": 1}
+        assert cache.hits == 1
+
+    def test_contains_does_not_count_a_hit(self, cache, params):
+        assert not cache.contains(params)
+        cache.set(params, dumps({"id": 1}))
+        assert cache.contains(params)
+        assert cache.hits == 0
+
+    def test_key_ignores_api_key(self, cache, params):
+        cache.set(params, dumps({"id": 1}))
+        assert cache.get({**params, "key": "other"}) == {"id": 1}
+
+    def test_key_includes_query_params(self, cache, params):
+        cache.set(params, dumps({"id": 1}))
+        assert cache.get({**params, "strategy": "desktop"}) is None
+
+    def test_expired_response_is_a_miss(self, tmp_path, params):
+        cache = ResponseCache(tmp_path / "cache.sqlite3", ttl=0, max_size=1024)
+        cache.set(params, dumps({"id": 1}))
+        time.sleep(0.01)
+        assert cache.get(params) is None
+        cache.close()
+
+    def test_least_recently_used_is_evicted(self, tmp_path, params):
+        # Random data barely compresses so each response is over 500 bytes
+        cache = ResponseCache(tmp_path / "cache.sqlite3", ttl=60, max_size=1500)
+        payloads = [{"data": os.urandom(500).hex()} for _ in range(3)]
+        for i, payload in enumerate(payloads):
+            cache.set({**params, "url": str(i)}, dumps(payload))
+            time.sleep(0.01)
+        assert cache.get({**params, "url": "0"}) is None
+        assert cache.get({**params, "url": "2"}) == payloads[2]
+        cache.close()
+
+    def test_responses_persist_between_runs(self, tmp_path, params):
+        path = tmp_path / "cache.sqlite3"
+        cache = ResponseCache(path, ttl=60, max_size=1024)
+        cache.set(params, dumps({"id": 1}))
+        cache.close()
+        cache = ResponseCache(path, ttl=60, max_size=1024)
+        assert cache.get(params) == {"id": 1}
+        cache.close()
+
+
+def test_open_cache_uses_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("PSI_CACHE_DIR", str(tmp_path))
+    cache = open_cache()
+    assert cache.path == tmp_path / "responses.sqlite3"
+    cache.close()
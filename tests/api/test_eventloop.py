@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import time
+
+from pyspeedinsights.api import eventloop
+from pyspeedinsights.api.eventloop import (
+    SlowCallbackLog,
+    monitor_loop_lag,
+    record_slow_callbacks,
+    run,
+)
+from pyspeedinsights.api.telemetry import Histogram
+
+
+async def block(seconds):
+    await asyncio.sleep(0)
+    time.sleep(seconds)  # Blocks the event loop
+
+
+class TestRun:
+    """Tests running coroutines in a new event loop."""
+
+    def test_result_is_returned(self):
+        async def coro():
+            return 42
+
+        assert run(coro()) == 42
+
+    def test_missing_uvloop_falls_back(self, monkeypatch, caplog):
+        async def coro():
+            return type(asyncio.get_running_loop()).__module__
+
+        monkeypatch.setattr(eventloop, "uvloop", None)
+        with caplog.at_level(logging.WARNING):
+            assert run(coro(), use_uvloop=True).startswith("asyncio")
+        assert "uvloop isn't installed" in caplog.text
+
+    def test_policy_is_restored(self):
+        policy = asyncio.get_event_loop_policy()
+
+        async def coro():
+            pass
+
+        run(coro(), use_uvloop=True)
+        assert asyncio.get_event_loop_policy() is policy
+
+
+class TestMonitoring:
+    """Tests loop lag sampling and slow callback reporting."""
+
+    def test_loop_lag_is_sampled(self):
+        histogram = Histogram((0.05,))
+
+        async def coro():
+            monitor = asyncio.create_task(monitor_loop_lag(histogram, 0.01))
+            await asyncio.sleep(0.02)
+            await block(0.1)
+            await asyncio.sleep(0.02)
+            monitor.cancel()
+
+        run(coro())
+        assert histogram.count >= 2
+        assert max(histogram.values) >= 0.05
+
+    def test_slowest_callbacks_are_recorded(self):
+        slow_callbacks = SlowCallbackLog(limit=1)
+
+        async def coro():
+            await block(0.06)
+            await block(0.12)
+
+        with record_slow_callbacks(slow_callbacks):
+            run(coro(), debug=True)
+        assert slow_callbacks.count == 2
+        assert len(slow_callbacks.slowest) == 1
+        assert slow_callbacks.slowest[0][0] >= 0.12
+
+    def test_other_asyncio_records_are_still_logged(self, caplog):
+        asyncio_logger = logging.getLogger("asyncio")
+        with record_slow_callbacks(SlowCallbackLog()):
+            asyncio_logger.error("Task exception was never retrieved")
+            asyncio_logger.warning("Executing %s took %.3f seconds", "<Handle>", 0.1)
+        assert "Task exception was never retrieved" in caplog.text
+        assert "Executing" not in caplog.text
+
+    def test_asyncio_logger_is_restored(self):
+        asyncio_logger = logging.getLogger("asyncio")
+        with record_slow_callbacks(SlowCallbackLog()):
+            assert asyncio_logger.filters
+        assert not asyncio_logger.filters
@@ -1,7 +1,8 @@
+import keyring
 import pytest
 from keyring.errors import KeyringError
 
-from pyspeedinsights.api.keys import get_api_key
+from pyspeedinsights.api.keys import get_api_key, get_api_keys
 
 
 class TestKeyRetrieval:
@@ -42,3 +43,31 @@ class TestKeyRetrieval:
         patch_keyring(mock_pw=None)
         patch_input(mock_input="")  # Empty input will eventually hit limit
         self.throws_keyringerror()
+
+
+class TestKeyPoolRetrieval:
+    def test_keys_read_from_file(self, tmp_path):
+        keys_file = tmp_path / "keys.txt"
+        keys_file.write_text("key1\n# comment\n\nkey2\nkey1\n")
+        assert get_api_keys(str(keys_file)) == ["key1", "key2"]
+
+    def test_missing_keys_file_raises_keyringerror(self, tmp_path):
+        with pytest.raises(KeyringError):
+            get_api_keys(str(tmp_path / "missing.txt"))
+
+    def test_keys_read_from_env_var(self, monkeypatch):
+        monkeypatch.setenv("PSI_API_KEYS", "key1, key2")
+        assert get_api_keys() == ["key1", "key2"]
+
+    def test_numbered_keys_read_from_keyring(self, monkeypatch):
+        monkeypatch.delenv("PSI_API_KEYS", raising=False)
+        stored = {"psikey": "key1", "psikey2": "key2", "psikey3": "key3"}
+        monkeypatch.setattr(
+            keyring, "get_password", lambda service, name: stored.get(name)
+        )
+        assert get_api_keys() == ["key1", "key2", "key3"]
+
+    def test_single_key_falls_back_to_keyring(self, monkeypatch, patch_keyring):
+        monkeypatch.delenv("PSI_API_KEYS", raising=False)
+        patch_keyring("secret")
+        assert get_api_keys() == ["secret"]
@@ -0,0 +1,84 @@
+import pytest
+
+from pyspeedinsights.api import quota
+from pyspeedinsights.api.quota import QuotaLedger, open_ledger, plan_requests
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return QuotaLedger(tmp_path / "quota.sqlite3")
+
+
+class TestQuotaLedger:
+    """Tests recording of daily quota usage per key."""
+
+    def test_unused_key_has_full_quota(self, ledger):
+        assert ledger.get_used("key") == 0
+        assert ledger.get_remaining("key", 100) == 100
+
+    def test_usage_is_recorded_per_key(self, ledger):
+        ledger.record("key", 30)
+        ledger.record("key", 20)
+        ledger.record("other", 5)
+        assert ledger.get_remaining("key", 100) == 50
+        assert ledger.get_remaining("other", 100) == 95
+
+    def test_remaining_quota_is_not_negative(self, ledger):
+        ledger.record("key", 150)
+        assert ledger.get_remaining("key", 100) == 0
+
+    def test_usage_resets_on_a_new_day(self, ledger, monkeypatch):
+        monkeypatch.setattr(quota, "get_quota_day", lambda: "2024-01-01")
+        ledger.record("key", 30)
+        monkeypatch.setattr(quota, "get_quota_day", lambda: "2024-01-02")
+        assert ledger.get_used("key") == 0
+
+    def test_usage_is_saved_without_keys(self, ledger):
+        ledger.record("secret-key", 10)
+        ledger.close()
+        assert b"secret-key" not in ledger.path.read_bytes()
+        assert QuotaLedger(ledger.path).get_used("secret-key") == 10
+
+    def test_concurrent_runs_add_to_each_others_usage(self, ledger):
+        other = QuotaLedger(ledger.path)
+        ledger.record("key", 100)
+        other.record("other", 200)
+        other.record("key", 5)
+        assert ledger.get_used("key") == 105
+        assert ledger.get_used("other") == 200
+
+    def test_usage_from_previous_days_is_pruned(self, ledger, monkeypatch):
+        monkeypatch.setattr(quota, "get_quota_day", lambda: "2024-01-01")
+        ledger.record("key", 30)
+        monkeypatch.setattr(quota, "get_quota_day", lambda: "2024-01-02")
+        QuotaLedger(ledger.path)
+        rows = ledger._conn.execute("SELECT * FROM quota_usage").fetchall()
+        assert rows == []
+
+    def test_open_ledger_uses_cache_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("PSI_CACHE_DIR", str(tmp_path))
+        ledger = open_ledger()
+        ledger.record("key", 1)
+        ledger.close()
+        assert QuotaLedger(tmp_path / "quota.sqlite3").get_used("key") == 1
+
+
+class TestPlanRequests:
+    """Tests planning of calls against the remaining daily quota."""
+
+    def test_calls_within_quota(self):
+        plan = plan_requests(100, 500, 1, rate=4, concurrency=1000)
+        assert (plan.batch, plan.deferred, plan.days) == (100, 0, 1)
+        assert plan.seconds == 25  # Limited by the rate of a single key
+
+    def test_calls_beyond_quota_are_deferred(self):
+        plan = plan_requests(250, 40, 1, rate=4, concurrency=50, daily_quota=100)
+        assert (plan.batch, plan.deferred, plan.days) == (40, 210, 4)
+
+    def test_keys_share_the_load(self):
+        plan = plan_requests(200, 400, 2, rate=4, concurrency=1000, daily_quota=200)
+        assert plan.seconds == 25
+
+    def test_duration_is_limited_by_concurrency(self):
+        plan = plan_requests(100, 500, 1, rate=100, concurrency=10)
+        assert plan.seconds == 100 * quota.ESTIMATED_LATENCY / 10
@@ -0,0 +1,488 @@
+import asyncio
+import gc
+import weakref
+import zlib
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from pyspeedinsights.api import request
+from pyspeedinsights.api.cache import ResponseCache, open_cache
+from pyspeedinsights.api.quota import QuotaLedger
+from pyspeedinsights.api.request import (
+    RequestContext,
+    create_session,
+    get_request_params,
+    get_response,
+    run_requests,
+    schedule_requests,
+    stream_responses,
+)
+from pyspeedinsights.api.retry import RetryPolicy
+from pyspeedinsights.api.scheduler import RequestScheduler
+from pyspeedinsights.api.telemetry import RunMetrics
+from pyspeedinsights.utils.serialization import dumps
+from pyspeedinsights.utils.urls import InvalidURLError
+
+
+class TestCreateSession:
+    """Tests the shared client session used for all requests."""
+
+    def test_connection_pool_is_sized_to_concurrency(self):
+        async def get_limits():
+            async with create_session(8) as session:
+                connector = session.connector
+                return connector.limit, connector.limit_per_host
+
+        assert asyncio.run(get_limits()) == (8, 8)
+
+    def test_connection_pool_closes_with_session(self):
+        async def get_session():
+            async with create_session(8) as session:
+                pass
+            return session
+
+        assert asyncio.run(get_session()).closed
+
+
+class TestStreamResponses:
+    """Tests streaming of responses as they complete."""
+
+    async def _respond(self, url, delay, exception=None):
+        await asyncio.sleep(delay)
+        if exception is not None:
+            raise exception
+        return url, "desktop", {"url": url}
+
+    def _collect(self, tasks):
+        async def collect():
+            return [r async for r in stream_responses(tasks)]
+
+        return asyncio.run(collect())
+
+    def test_responses_are_yielded_in_completion_order(self):
+        tasks = [self._respond("slow", 0.05), self._respond("fast", 0.01)]
+        responses = self._collect(tasks)
+        assert [url for url, _, _ in responses] == ["fast", "slow"]
+
+    def test_handled_responses_are_released(self):
+        class Response:
+            pass
+
+        async def respond(i):
+            await asyncio.sleep(i * 0.005)
+            return str(i), "desktop", Response()
+
+        async def count_alive():
+            refs = []
+            tasks = [respond(i) for i in range(20)]
+            async for i, _, response in stream_responses(tasks):
+                if i == "19":
+                    gc.collect()
+                    return sum(ref() is not None for ref in refs)
+                refs.append(weakref.ref(response))
+                del response
+
+        # Handled responses don't pile up in memory while the run goes on.
+        assert asyncio.run(count_alive()) <= 1
+
+    def test_client_errors_are_skipped(self):
+        tasks = [
+            self._respond("ok", 0.01),
+            self._respond("failed", 0, aiohttp.ClientError()),
+        ]
+        responses = self._collect(tasks)
+        assert responses == [("ok", "desktop", {"url": "ok"})]
+
+    def test_timeouts_are_skipped(self):
+        tasks = [
+            self._respond("ok", 0.01),
+            self._respond("timed out", 0, asyncio.TimeoutError()),
+        ]
+        responses = self._collect(tasks)
+        assert responses == [("ok", "desktop", {"url": "ok"})]
+
+    def test_critical_errors_are_raised(self):
+        tasks = [
+            self._respond("slow", 1),
+            self._respond("failed", 0, InvalidURLError()),
+        ]
+        with pytest.raises(InvalidURLError):
+            self._collect(tasks)
+
+
+class TestGetResponse:
+    """Tests requests and retries against a local PSI API stand-in."""
+
+    def _get_response(
+        self, monkeypatch, statuses, retry_policy=None, keys=None, **context_args
+    ):
+        """Responds with each status in turn and returns the result and keys used."""
+        hits = []
+        scheduler = RequestScheduler(1000, 1, keys or ["key"])
+
+        async def handler(req):
+            status = statuses[min(len(hits), len(statuses) - 1)]
+            hits.append(req.query["key"])
+            if status == 200:
+                return web.json_response({"id": req.query["url"]})
+            if status == "invalid":
+                return web.Response(text="<html>Not JSON</html>")
+            body = "Quota exceeded for 'Queries per day'" if status == 429 else ""
+            return web.Response(status=status, text=body, headers={"Retry-After": "0"})
+
+        async def run():
+            app = web.Application()
+            app.router.add_get("/", handler)
+            async with TestServer(app) as server:
+                monkeypatch.setattr(request, "PSI_API_URL", str(server.make_url("/")))
+                async with create_session(1) as session:
+                    policy = retry_policy or RetryPolicy(base_delay=0.001)
+                    context = RequestContext(session, scheduler, policy, **context_args)
+                    return await get_response(context, "https://example.com")
+
+        try:
+            return asyncio.run(run()), hits
+        except aiohttp.ClientError as err:
+            return err, hits
+
+    def test_success(self, monkeypatch):
+        result, hits = self._get_response(monkeypatch, [200])
+        assert result == {"id": "https://example.com"}
+        assert len(hits) == 1
+
+    def test_decode_in_thread(self, monkeypatch):
+        result, hits = self._get_response(monkeypatch, [200], decode_in_thread=True)
+        assert result == {"id": "https://example.com"}
+
+    @pytest.mark.parametrize("decode_in_thread", [False, True])
+    def test_raw_response_is_cached(self, monkeypatch, tmp_path, decode_in_thread):
+        cache = ResponseCache(tmp_path / "cache.sqlite3", 60, 1024 * 1024)
+        args = {"cache": cache, "decode_in_thread": decode_in_thread}
+        self._get_response(monkeypatch, [200], **args)
+        params = get_request_params("https://example.com")
+        compressed = cache.get_compressed(params)
+        assert zlib.decompress(compressed) == b'{"id": "https://example.com"}'
+
+        result, hits = self._get_response(monkeypatch, [200], **args)
+        assert result == {"id": "https://example.com"}
+        assert hits == []
+        cache.close()
+
+    def test_fields_mask_is_sent(self, monkeypatch):
+        hits = []
+
+        async def handler(req):
+            hits.append(req.query.get("fields"))
+            return web.json_response({})
+
+        async def run():
+            app = web.Application()
+            app.router.add_get("/", handler)
+            async with TestServer(app) as server:
+                monkeypatch.setattr(request, "PSI_API_URL", str(server.make_url("/")))
+                async with create_session(1) as session:
+                    scheduler = RequestScheduler(1000, 1, ["key"])
+                    context = RequestContext(session, scheduler, RetryPolicy())
+                    await get_response(context, "https://example.com", fields="id")
+
+        asyncio.run(run())
+        assert hits == ["id"]
+
+    def test_retry_reissues_request(self, monkeypatch):
+        result, hits = self._get_response(monkeypatch, [503, 500, 200])
+        assert result == {"id": "https://example.com"}
+        assert len(hits) == 3
+
+    def test_metrics_are_recorded(self, monkeypatch):
+        metrics = RunMetrics()
+        self._get_response(monkeypatch, [503, 200], metrics=metrics)
+        assert metrics.request_latency.count == 2
+        assert metrics.queue_wait.count == 2
+        assert metrics.retries == {"server": 1}
+        assert metrics.bytes_received > 0
+        assert metrics.stage_seconds["decode"] > 0
+
+    def test_each_call_sent_is_recorded_in_the_ledger(self, monkeypatch, tmp_path):
+        ledger = QuotaLedger(tmp_path / "quota.sqlite3")
+        self._get_response(monkeypatch, [503, 200], ledger=ledger)
+        assert ledger.get_used("key") == 2
+
+    def test_quota_exceeded_key_is_rotated_out(self, monkeypatch):
+        result, hits = self._get_response(monkeypatch, [429, 200], keys=["a", "b"])
+        assert result == {"id": "https://example.com"}
+        assert hits == ["a", "b"]
+
+    def test_non_retryable_error_is_not_retried(self, monkeypatch):
+        result, hits = self._get_response(monkeypatch, [400, 200])
+        assert result.status == 400
+        assert len(hits) == 1
+
+    def test_invalid_json_is_retried(self, monkeypatch):
+        result, hits = self._get_response(monkeypatch, ["invalid", 200])
+        assert result == {"id": "https://example.com"}
+        assert len(hits) == 2
+
+    def test_invalid_json_fails_after_retries(self, monkeypatch):
+        policy = RetryPolicy(network_retries=1, base_delay=0.001)
+        result, hits = self._get_response(monkeypatch, ["invalid"], policy)
+        assert isinstance(result, aiohttp.ClientPayloadError)
+        assert len(hits) == 2
+
+    def test_retry_limit_is_per_error_class(self, monkeypatch):
+        policy = RetryPolicy(server_retries=2, base_delay=0.001)
+        result, hits = self._get_response(monkeypatch, [500], policy)
+        assert result.status == 500
+        assert len(hits) == 3
+
+
+class TestTimeouts:
+    """Tests per-request timeouts and the run deadline."""
+
+    def _serve(self, monkeypatch, coro_fn):
+        """Runs a coroutine against a stand-in API that hangs for /slow URLs
+        and responds with invalid JSON for /invalid URLs."""
+
+        async def handler(req):
+            if req.query["url"].endswith("/slow"):
+                await asyncio.sleep(5)
+            if req.query["url"].endswith("/invalid"):
+                return web.Response(text="Not JSON")
+            return web.json_response({"id": req.query["url"]})
+
+        async def run():
+            app = web.Application()
+            app.router.add_get("/", handler)
+            async with TestServer(app) as server:
+                monkeypatch.setattr(request, "PSI_API_URL", str(server.make_url("/")))
+                return await coro_fn()
+
+        return asyncio.run(run())
+
+    def test_timed_out_request_is_retried_then_raised(self, monkeypatch):
+        async def run():
+            timeout = aiohttp.ClientTimeout(total=0.05)
+            async with create_session(1, timeout) as session:
+                scheduler = RequestScheduler(1000, 1, ["key"])
+                policy = RetryPolicy(network_retries=1, base_delay=0.001)
+                context = RequestContext(session, scheduler, policy)
+                return await get_response(context, "https://example.com/slow")
+
+        with pytest.raises(asyncio.TimeoutError):
+            self._serve(monkeypatch, run)
+
+    def test_deadline_cancels_unfinished_requests(self, monkeypatch):
+        handled = []
+
+        async def run():
+            return await schedule_requests(
+                ["https://example.com/slow", "https://example.com/fast"],
+                {"strategy": ["desktop"]},
+                lambda url, strategy, resp: handled.append(url),
+                set(),
+                RequestScheduler(1000, 2, ["key"]),
+                RetryPolicy(),
+                deadline=0.5,
+            )
+
+        unfinished = self._serve(monkeypatch, run)
+        assert handled == ["https://example.com/fast"]
+        assert unfinished == [("https://example.com/slow", "desktop")]
+
+    def test_invalid_json_response_is_skipped(self, monkeypatch):
+        handled = []
+        metrics = RunMetrics()
+
+        async def run():
+            return await schedule_requests(
+                ["https://example.com/invalid", "https://example.com/fast"],
+                {"strategy": ["desktop"]},
+                lambda url, strategy, resp: handled.append(url),
+                set(),
+                RequestScheduler(1000, 2, ["key"]),
+                RetryPolicy(network_retries=0),
+                metrics=metrics,
+            )
+
+        assert self._serve(monkeypatch, run) == []
+        assert handled == ["https://example.com/fast"]
+        assert metrics.failures == 1
+
+    def test_exhausted_keys_stop_the_run(self, monkeypatch):
+        urls = ["https://example.com/fast", "https://example.com/other"]
+
+        async def run():
+            scheduler = RequestScheduler(1000, 2, ["key"])
+            scheduler.keys[0].exhausted = True
+            return await schedule_requests(
+                urls,
+                {"strategy": ["desktop"]},
+                lambda *args: None,
+                set(),
+                scheduler,
+                RetryPolicy(),
+            )
+
+        assert sorted(self._serve(monkeypatch, run)) == [
+            (url, "desktop") for url in urls
+        ]
+
+    def test_all_requests_finish_before_deadline(self, monkeypatch):
+        async def run():
+            return await schedule_requests(
+                ["https://example.com/fast"],
+                {"strategy": ["desktop"]},
+                lambda url, strategy, resp: None,
+                set(),
+                RequestScheduler(1000, 2, ["key"]),
+                RetryPolicy(),
+                deadline=5,
+            )
+
+        assert self._serve(monkeypatch, run) == []
+
+
+class TestPipelinedRequests:
+    """Tests sending requests for URLs while they're still being discovered."""
+
+    def _serve(self, monkeypatch, coro_fn):
+        """Runs a coroutine against a stand-in API that echoes each URL."""
+
+        async def handler(req):
+            return web.json_response({"id": req.query["url"]})
+
+        async def run():
+            app = web.Application()
+            app.router.add_get("/", handler)
+            async with TestServer(app) as server:
+                monkeypatch.setattr(request, "PSI_API_URL", str(server.make_url("/")))
+                return await coro_fn()
+
+        return asyncio.run(run())
+
+    def _schedule(self, urls, handle_response, completed=(), max_requests=None):
+        return schedule_requests(
+            urls,
+            {"strategy": ["desktop"]},
+            handle_response,
+            set(completed),
+            RequestScheduler(1000, 2, ["key"]),
+            RetryPolicy(),
+            deadline=5,
+            max_requests=max_requests,
+        )
+
+    def test_requests_start_before_discovery_ends(self, monkeypatch):
+        handled = []
+        first_handled = asyncio.Event()
+
+        def handle_response(url, strategy, resp):
+            handled.append(url)
+            first_handled.set()
+
+        async def discover():
+            yield "https://example.com/1"
+            # Only continues once the first response is in.
+            await first_handled.wait()
+            yield "https://example.com/2"
+
+        async def run():
+            first_handled.clear()
+            return await self._schedule(discover(), handle_response)
+
+        assert self._serve(monkeypatch, run) == []
+        assert handled == ["https://example.com/1", "https://example.com/2"]
+
+    def test_completed_and_over_quota_requests_are_skipped(self, monkeypatch):
+        handled = []
+        completed = [("https://example.com/1", "desktop")]
+
+        async def discover():
+            for i in range(1, 5):
+                yield f"https://example.com/{i}"
+
+        async def run():
+            return await self._schedule(
+                discover(), lambda url, *_: handled.append(url), completed, 2
+            )
+
+        assert self._serve(monkeypatch, run) == []
+        assert sorted(handled) == ["https://example.com/2", "https://example.com/3"]
+
+    def test_exhausted_keys_stop_the_run(self, monkeypatch):
+        async def discover():
+            yield "https://example.com/1"
+
+        async def run():
+            scheduler = RequestScheduler(1000, 2, ["key"])
+            scheduler.keys[0].exhausted = True
+            return await schedule_requests(
+                discover(),
+                {"strategy": ["desktop"]},
+                lambda *args: None,
+                set(),
+                scheduler,
+                RetryPolicy(),
+                deadline=5,
+            )
+
+        assert self._serve(monkeypatch, run) == [("https://example.com/1", "desktop")]
+
+    def test_discovery_errors_are_raised(self, monkeypatch):
+        async def discover():
+            yield "https://example.com/1"
+            raise InvalidURLError("Invalid URL.")
+
+        async def run():
+            return await self._schedule(discover(), lambda *args: None)
+
+        with pytest.raises(InvalidURLError):
+            self._serve(monkeypatch, run)
+
+
+class TestRunRequests:
+    """Tests planning a run against the daily quota."""
+
+    urls = ["https://example.com/1", "https://example.com/2"]
+
+    @pytest.fixture(autouse=True)
+    def cache_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("PSI_CACHE_DIR", str(tmp_path))
+        monkeypatch.setattr(request, "get_api_keys", lambda keys_file: ["key"])
+
+    def cache_responses(self, urls):
+        cache = open_cache()
+        for url in urls:
+            params = get_request_params(url, strategy="desktop")
+            cache.set(params, dumps({"id": url}))
+        cache.close()
+
+    def test_cached_requests_are_sent_without_quota(self):
+        self.cache_responses(self.urls)
+        handled = []
+        unfinished = run_requests(
+            self.urls,
+            {"strategy": ["desktop"]},
+            lambda url, strategy, resp: handled.append(url),
+            daily_quota=0,
+        )
+        assert unfinished == []
+        assert sorted(handled) == self.urls
+
+    def test_cached_requests_are_not_deferred(self, monkeypatch):
+        self.cache_responses(self.urls[1:])
+        planned = []
+        monkeypatch.setattr(
+            request, "log_plan", lambda plan, dry_run: planned.append(plan)
+        )
+        run_requests(
+            self.urls,
+            {"strategy": ["desktop"]},
+            lambda *args: None,
+            daily_quota=1,
+            dry_run=True,
+        )
+        assert planned[0].calls == 1
+        assert planned[0].deferred == 0
@@ -7,6 +7,7 @@ from pyspeedinsights.api.response import (
     _parse_audits,
     _parse_metadata,
     _parse_metrics,
+    get_fields_mask,
     process_excel,
 )
 
@@ -139,6 +140,32 @@ def test_get_audits_base():
     assert audits_base == "base"
 
 
+def test_get_audits_base_filters_by_category_with_multiple_categories():
+    json_resp = {
+        "lighthouseResult": {
+            "categories": {
+                "seo": {"auditRefs": [{"id": "seo-audit"}]},
+                "performance": {"auditRefs": [{"id": "perf-audit"}]},
+            },
+            "audits": {"seo-audit": {}, "perf-audit": {}},
+        }
+    }
+    audits_base = _get_audits_base(json_resp, "seo")
+    assert audits_base == {"seo-audit": {}}
+
+
+class TestGetFieldsMask:
+    def test_json_gets_full_response(self):
+        assert get_fields_mask("json") is None
+
+    def test_excel_formats_get_fields_read_by_processing(self):
+        fields = ["analysisUTCTimestamp", "loadingExperience/metrics", "finalUrl"]
+        fields += ["formFactor", "categories", "auditRefs", "audits", "numericValue"]
+        for format in ("excel", "sitemap"):
+            mask = get_fields_mask(format)
+            assert all(field in mask for field in fields)
+
+
 def test_get_metrics_base():
     json_resp = {"loadingExperience": {"metrics": "base"}}
     audits_base = _get_metrics_base(json_resp)
@@ -0,0 +1,75 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from pyspeedinsights.api.retry import (
+    NETWORK,
+    RATE_LIMIT,
+    SERVER,
+    RetryPolicy,
+    get_retry_after,
+)
+
+
+def response_error(status, headers=None):
+    return aiohttp.ClientResponseError(
+        request_info=None, history=(), status=status, headers=headers
+    )
+
+
+class TestClassify:
+    """Tests classification of failed requests by error class."""
+
+    policy = RetryPolicy()
+
+    def test_429_is_rate_limit(self):
+        assert self.policy.classify(response_error(429)) == RATE_LIMIT
+
+    @pytest.mark.parametrize("status", [500, 502, 503])
+    def test_5xx_is_server(self, status):
+        assert self.policy.classify(response_error(status)) == SERVER
+
+    @pytest.mark.parametrize("status", [400, 403, 404])
+    def test_other_4xx_is_not_retryable(self, status):
+        assert self.policy.classify(response_error(status)) is None
+
+    def test_connection_error_is_network(self):
+        assert self.policy.classify(aiohttp.ServerDisconnectedError()) == NETWORK
+
+    def test_timeout_is_network(self):
+        assert self.policy.classify(asyncio.TimeoutError()) == NETWORK
+
+    def test_limits_are_per_error_class(self):
+        policy = RetryPolicy(rate_limit_retries=7, server_retries=0)
+        assert policy.get_limit(RATE_LIMIT) == 7
+        assert policy.get_limit(SERVER) == 0
+        assert policy.get_limit(NETWORK) == 3
+
+
+class TestDelay:
+    """Tests exponential backoff with jitter and Retry-After."""
+
+    def test_backoff_is_capped_exponentially(self):
+        policy = RetryPolicy(base_delay=1, max_delay=10)
+        for attempt in range(8):
+            delay = policy.get_delay(attempt, response_error(500))
+            assert 0 <= delay <= min(10, 2**attempt)
+
+    def test_retry_after_seconds_is_honoured(self):
+        policy = RetryPolicy(base_delay=0.001)
+        err = response_error(429, {"Retry-After": "5"})
+        assert policy.get_delay(0, err) == 5
+
+    def test_retry_after_is_capped_at_max_delay(self):
+        policy = RetryPolicy(max_delay=2)
+        err = response_error(503, {"Retry-After": "120"})
+        assert policy.get_delay(0, err) == 2
+
+    def test_retry_after_http_date_is_parsed(self):
+        err = response_error(503, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+        assert get_retry_after(err) == 0
+
+    def test_retry_after_ignored_for_other_statuses(self):
+        err = response_error(500, {"Retry-After": "5"})
+        assert get_retry_after(err) is None
@@ -0,0 +1,214 @@
+import asyncio
+import time
+
+import pytest
+
+from pyspeedinsights.api.keys import KeyPoolExhaustedError
+from pyspeedinsights.api.scheduler import (
+    AdaptiveConcurrency,
+    RequestScheduler,
+    TokenBucket,
+)
+
+
+class TestTokenBucket:
+    """Tests rate limiting with the token bucket."""
+
+    def test_invalid_rate_raises_value_error(self):
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0)
+
+    def test_burst_up_to_capacity_is_immediate(self):
+        async def acquire_all():
+            bucket = TokenBucket(rate=5)
+            start = time.monotonic()
+            for _ in range(5):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        assert asyncio.run(acquire_all()) < 0.05
+
+    def test_acquire_is_limited_to_rate(self):
+        async def acquire_all():
+            bucket = TokenBucket(rate=50, capacity=1)
+            start = time.monotonic()
+            for _ in range(6):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        # 1 token available up front, 5 more refilled at 50/s
+        assert asyncio.run(acquire_all()) >= 0.09
+
+
+class TestRequestScheduler:
+    """Tests bounding of in-flight requests with the scheduler."""
+
+    def test_invalid_concurrency_raises_value_error(self):
+        with pytest.raises(ValueError):
+            RequestScheduler(rate=1, max_concurrency=0, keys=["key"])
+
+    def test_concurrency_is_bounded(self):
+        in_flight = 0
+        max_in_flight = 0
+
+        async def request(scheduler):
+            nonlocal in_flight, max_in_flight
+            async with scheduler.slot():
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+
+        async def run_all():
+            scheduler = RequestScheduler(rate=1000, max_concurrency=3, keys=["key"])
+            await asyncio.gather(*(request(scheduler) for _ in range(10)))
+
+        asyncio.run(run_all())
+        assert max_in_flight == 3
+
+
+class TestAdaptiveConcurrency:
+    """Tests raising and cutting the concurrency limit with AIMD."""
+
+    def test_invalid_bounds_raise_value_error(self):
+        with pytest.raises(ValueError):
+            AdaptiveConcurrency(minimum=0, maximum=10)
+        with pytest.raises(ValueError):
+            AdaptiveConcurrency(minimum=10, maximum=5)
+
+    def test_initial_limit_is_within_bounds(self):
+        assert AdaptiveConcurrency(1, 50).limit == 8
+        assert AdaptiveConcurrency(1, 3).limit == 3
+        assert AdaptiveConcurrency(20, 50).limit == 20
+
+    def test_limit_rises_with_successes_up_to_max(self):
+        concurrency = AdaptiveConcurrency(1, 12)
+        for _ in range(4):
+            concurrency.increase()
+        assert concurrency.limit == 12
+        concurrency.increase()
+        assert concurrency.limit == 12
+
+    def test_limit_is_cut_once_per_burst(self):
+        concurrency = AdaptiveConcurrency(1, 50)
+        sent_at = time.monotonic()
+        concurrency.decrease(sent_at)
+        concurrency.decrease(sent_at)
+        assert concurrency.limit == 4
+        concurrency.decrease(time.monotonic())
+        assert concurrency.limit == 2
+
+    def test_limit_is_not_cut_below_min(self):
+        concurrency = AdaptiveConcurrency(3, 50)
+        for _ in range(5):
+            concurrency.decrease(time.monotonic())
+        assert concurrency.limit == 3
+
+    def test_limit_rises_additively_after_cut(self):
+        concurrency = AdaptiveConcurrency(1, 50)
+        concurrency.decrease(time.monotonic())
+        for _ in range(4):
+            concurrency.increase()
+        assert concurrency.limit == 4
+        for _ in range(4):
+            concurrency.increase()
+        assert concurrency.limit == 5
+
+    def test_each_release_wakes_one_waiter_in_order(self):
+        async def run():
+            concurrency = AdaptiveConcurrency(1, 1)
+            await concurrency.acquire()
+            woken = []
+
+            async def wait(i):
+                await concurrency.acquire()
+                woken.append(i)
+
+            tasks = [asyncio.create_task(wait(i)) for i in range(3)]
+            await asyncio.sleep(0)
+            concurrency.release()
+            await asyncio.sleep(0)
+            assert woken == [0]
+            concurrency.release()
+            await asyncio.sleep(0)
+            assert woken == [0, 1]
+            concurrency.release()
+            await asyncio.gather(*tasks)
+            assert woken == [0, 1, 2]
+
+        asyncio.run(run())
+
+    def test_increase_wakes_waiters_up_to_limit(self):
+        async def run():
+            concurrency = AdaptiveConcurrency(1, 3)
+            for _ in range(3):
+                await concurrency.acquire()
+            concurrency.decrease(time.monotonic())
+            tasks = [asyncio.create_task(concurrency.acquire()) for _ in range(3)]
+            await asyncio.sleep(0)
+            for _ in range(3):
+                concurrency.release()
+            await asyncio.sleep(0)
+            assert sum(task.done() for task in tasks) == 1
+            concurrency.increase()
+            await asyncio.sleep(0)
+            assert sum(task.done() for task in tasks) == 2
+            for task in tasks:
+                task.cancel()
+
+        asyncio.run(run())
+
+    def test_cancelled_waiter_passes_on_its_slot(self):
+        async def run():
+            concurrency = AdaptiveConcurrency(1, 1)
+            await concurrency.acquire()
+            cancelled = asyncio.create_task(concurrency.acquire())
+            waiting = asyncio.create_task(concurrency.acquire())
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            concurrency.release()
+            await asyncio.wait_for(waiting, 1)
+
+        asyncio.run(run())
+
+
+class TestKeyPool:
+    """Tests spreading requests across API keys and rotating them out."""
+
+    def _send(self, scheduler, num_requests):
+        async def send_all():
+            for _ in range(num_requests):
+                async with scheduler.slot() as key_state:
+                    scheduler.report_success(key_state)
+
+        asyncio.run(send_all())
+
+    def test_requests_are_spread_across_keys(self):
+        scheduler = RequestScheduler(rate=2, max_concurrency=1, keys=["a", "b"])
+        self._send(scheduler, 4)
+        assert [k.requests for k in scheduler.keys] == [2, 2]
+        assert [k.successes for k in scheduler.keys] == [2, 2]
+
+    def test_quota_exceeded_key_is_removed_from_rotation(self):
+        scheduler = RequestScheduler(rate=100, max_concurrency=1, keys=["a", "b"])
+        scheduler.report_rate_limited(scheduler.keys[0], quota_exceeded=True)
+        self._send(scheduler, 3)
+        assert scheduler.keys[0].exhausted
+        assert [k.requests for k in scheduler.keys] == [0, 3]
+
+    def test_rate_limited_key_rests(self):
+        scheduler = RequestScheduler(rate=100, max_concurrency=1, keys=["a", "b"])
+        scheduler.report_rate_limited(scheduler.keys[0], retry_after=60)
+        self._send(scheduler, 3)
+        assert not scheduler.keys[0].exhausted
+        assert [k.requests for k in scheduler.keys] == [0, 3]
+
+    def test_all_keys_exhausted_raises(self):
+        scheduler = RequestScheduler(rate=100, max_concurrency=1, keys=["a"])
+        scheduler.report_rate_limited(scheduler.keys[0], quota_exceeded=True)
+        with pytest.raises(KeyPoolExhaustedError):
+            self._send(scheduler, 1)
+
+    def test_key_label_is_masked(self):
+        scheduler = RequestScheduler(rate=1, max_concurrency=1, keys=["secret1234"])
+        assert scheduler.keys[0].label == "...1234"
@@ -0,0 +1,69 @@
+from pyspeedinsights.api.telemetry import Histogram, RunMetrics
+
+
+class TestHistogram:
+    """Tests recording the distribution of values."""
+
+    def test_values_are_counted_per_bucket(self):
+        histogram = Histogram((1.0, 5.0))
+        for value in [0.5, 1.0, 3.0, 10.0]:
+            histogram.observe(value)
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.count == 4
+        assert histogram.sum == 14.5
+
+    def test_quantiles(self):
+        histogram = Histogram((1.0,))
+        for value in range(1, 101):
+            histogram.observe(value)
+        assert histogram.quantile(0.5) == 51
+        assert histogram.quantile(0.99) == 100
+
+    def test_empty_summary(self):
+        assert Histogram((1.0,)).summary()["p99"] == 0
+
+
+class TestRunMetrics:
+    """Tests exporting run metrics."""
+
+    def _get_metrics(self):
+        metrics = RunMetrics()
+        metrics.request_latency.observe(3.0)
+        metrics.request_latency.observe(70.0)
+        metrics.retries["server"] += 2
+        metrics.stage_seconds["write"] += 0.5
+        metrics.successes = 2
+        metrics.bytes_received = 1024
+        metrics.finish()
+        return metrics
+
+    def test_to_dict(self):
+        metrics = self._get_metrics().to_dict()
+        assert metrics["successes"] == 2
+        assert metrics["retries"] == {"server": 2}
+        assert metrics["request_latency_seconds"]["count"] == 2
+        assert metrics["stage_seconds"] == {"write": 0.5}
+        assert metrics["loop_lag_seconds"]["count"] == 0
+
+    def test_prometheus_histogram_buckets_are_cumulative(self):
+        text = self._get_metrics().to_prometheus()
+        assert 'psi_request_duration_seconds_bucket{le="5.0"} 1' in text
+        assert 'psi_request_duration_seconds_bucket{le="60.0"} 1' in text
+        assert 'psi_request_duration_seconds_bucket{le="+Inf"} 2' in text
+        assert "psi_request_duration_seconds_count 2" in text
+
+    def test_prometheus_labelled_samples(self):
+        text = self._get_metrics().to_prometheus()
+        assert "# TYPE psi_retries_total counter" in text
+        assert 'psi_retries_total{error_class="server"} 2' in text
+        assert 'psi_requests_total{result="success"} 2' in text
+        assert "psi_received_bytes_total 1024" in text
+
+    def test_files_are_written(self, tmp_path):
+        metrics = self._get_metrics()
+        metrics.write_json(tmp_path / "metrics.json")
+        metrics.write_prometheus(tmp_path / "psi.prom")
+        assert '"successes": 2' in (tmp_path / "metrics.json").read_text()
+        assert (tmp_path / "psi.prom").read_text().endswith("\n")
+        assert [p.name for p in tmp_path.iterdir()].count("psi.prom") == 1
+        assert len(list(tmp_path.iterdir())) == 2
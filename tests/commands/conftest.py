@@ -22,6 +22,38 @@ def all_args():
         "desktop",
         "-f",
         "json",
+        "--resume",
+        "--full-response",
+        "--max-sitemap-depth",
+        "2",
+        "--sitemap-concurrency",
+        "4",
+        "--incremental",
+        "--max-age",
+        "1.5",
+        "--trailing-slash",
+        "strip",
+        "--pretty",
+        "--decode-in-thread",
+        "--connect-timeout",
+        "5.0",
+        "--read-timeout",
+        "60.0",
+        "--timeout",
+        "90.0",
+        "--deadline",
+        "3600.0",
+        "--metrics-file",
+        "metrics.json",
+        "--prometheus-file",
+        "psi.prom",
+        "--daily-quota",
+        "1000",
+        "--plan",
+        "--uvloop",
+        "--monitor-loop",
+        "--shard",
+        "3/8",
         "-l",
         "en",
         "-uc",
@@ -30,4 +62,24 @@ def all_args():
         "test-us",
         "-t",
         "test-ct",
+        "-r",
+        "2.5",
+        "-cc",
+        "10",
+        "--min-concurrency",
+        "2",
+        "--rate-limit-retries",
+        "6",
+        "--server-retries",
+        "2",
+        "--network-retries",
+        "1",
+        "-k",
+        "keys.txt",
+        "--no-cache",
+        "--refresh",
+        "--cache-ttl",
+        "1.5",
+        "--cache-size",
+        "100.0",
     ]
@@ -32,6 +32,26 @@ class TestArgParser:
         patch_argv(["psi", "-c" "invalid"])
         self.raises_system_exit()
 
+    def test_invalid_shard_exits(self, patch_argv):
+        for shard in ["0/4", "5/4", "3", "a/b"]:
+            patch_argv(["psi", "url", "--shard", shard])
+            self.raises_system_exit()
+
+    def test_non_positive_numbers_exit(self, patch_argv):
+        for arg, value in [
+            ("--rate", "0"),
+            ("--rate", "-1"),
+            ("--rate", "nan"),
+            ("--rate", "inf"),
+            ("--concurrency", "0"),
+            ("--min-concurrency", "-2"),
+            ("--sitemap-concurrency", "0"),
+            ("--max-sitemap-depth", "0"),
+            ("--concurrency", "1.5"),
+        ]:
+            patch_argv(["psi", "url", arg, value])
+            self.raises_system_exit()
+
     def test_parse_all_args(self, patch_argv, all_args):
         patch_argv(all_args)
         parser = set_up_arg_parser()
@@ -39,7 +59,14 @@ class TestArgParser:
         for arg in vars(args).values():
             if type(arg) == list:
                 arg = arg[0]
-            assert arg in all_args
+            if type(arg) == tuple:
+                arg = "/".join(str(a) for a in arg)
+            if type(arg) == bool:
+                # Flags are stored as True when passed.
+                assert arg
+                continue
+            # Numeric args are converted from their str form by argparse.
+            assert str(arg) in all_args
 
 
 class TestCreateArgGroups:
@@ -61,13 +88,34 @@ class TestCreateArgGroups:
     def test_args_belong_to_correct_group(self, patch_argv):
         patch_argv(["psi", "url", "-c", "seo", "-f", "json"])
         arg_groups = self.get_arg_groups()
-        assert arg_groups["API Group"].category == "seo"
+        assert arg_groups["API Group"].category == ["seo"]
         assert arg_groups["Processing Group"].format == "json"
 
+    def test_multiple_categories(self, patch_argv):
+        patch_argv(["psi", "url", "-c", "performance", "seo"])
+        arg_groups = self.get_arg_groups()
+        assert arg_groups["API Group"].category == ["performance", "seo"]
+
+    def test_multiple_strategies(self, patch_argv):
+        patch_argv(["psi", "url", "-s", "desktop", "mobile"])
+        arg_groups = self.get_arg_groups()
+        assert arg_groups["API Group"].strategy == ["desktop", "mobile"]
+
+    def test_request_args_are_typed(self, patch_argv):
+        patch_argv(["psi", "url", "-r", "0.5", "-cc", "8"])
+        arg_groups = self.get_arg_groups()
+        assert arg_groups["Request Group"].rate == 0.5
+        assert arg_groups["Request Group"].concurrency == 8
+
+    def test_shard_is_parsed(self, patch_argv):
+        patch_argv(["psi", "url", "--shard", "3/8"])
+        arg_groups = self.get_arg_groups()
+        assert arg_groups["Processing Group"].shard == (3, 8)
+
     def test_arg_group_to_dict(self, patch_argv):
         patch_argv(["psi", "url", "-c", "seo", "-f", "json"])
         arg_groups = self.get_arg_groups()
         api_args_dict = arg_group_to_dict(arg_groups, "API Group")
-        assert api_args_dict.get("category") == "seo"
+        assert api_args_dict.get("category") == ["seo"]
         proc_args_dict = arg_group_to_dict(arg_groups, "Processing Group")
         assert proc_args_dict.get("format") == "json"
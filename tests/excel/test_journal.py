@@ -0,0 +1,95 @@
+from pyspeedinsights.core.journal import RunJournal, get_journal_path
+from pyspeedinsights.core.writer import ReportWriter
+
+
+class TestRunJournal:
+    """Tests recording and loading completed requests."""
+
+    def test_records_are_loaded_in_order(self, tmp_path):
+        journal = RunJournal(tmp_path / "journal.jsonl")
+        journal.record("https://example.com/a", "mobile")
+        journal.record("https://example.com/b", "desktop", "https://example.com/b/")
+        records = list(journal.load())
+        assert [r["url"] for r in records] == [
+            "https://example.com/a",
+            "https://example.com/b",
+        ]
+        assert records[1]["final_url"] == "https://example.com/b/"
+
+    def test_truncated_record_is_ignored(self, tmp_path):
+        journal = RunJournal(tmp_path / "journal.jsonl")
+        journal.record("https://example.com/a", "mobile")
+        with open(journal.path, "a") as f:
+            f.write('{"url": "https://exa')
+        assert len(list(journal.load())) == 1
+
+    def test_record_after_truncated_record_is_kept(self, tmp_path):
+        path = tmp_path / "journal.jsonl"
+        RunJournal(path).record("https://example.com/a", "mobile")
+        with open(path, "a") as f:
+            f.write('{"url": "https://exa')
+        RunJournal(path).record("https://example.com/b", "mobile")
+        assert [r["url"] for r in RunJournal(path).load()] == [
+            "https://example.com/a",
+            "https://example.com/b",
+        ]
+
+    def test_missing_journal_is_empty(self, tmp_path):
+        journal = RunJournal(tmp_path / "journal.jsonl")
+        assert list(journal.load()) == []
+
+    def test_reset_clears_journal(self, tmp_path):
+        journal = RunJournal(tmp_path / "journal.jsonl")
+        journal.record("https://example.com/a", "mobile")
+        journal.reset()
+        assert not journal.path.exists()
+
+
+class TestJournalPath:
+    """Tests journal paths are unique to each run's arguments."""
+
+    def test_same_args_share_path(self):
+        args = {"category": ["seo"], "strategy": ["mobile"]}
+        assert get_journal_path("url", args, "sitemap") == get_journal_path(
+            "url", dict(args), "sitemap"
+        )
+
+    def test_different_args_have_different_paths(self):
+        args = {"category": ["seo"], "strategy": ["mobile"]}
+        other_args = {"category": ["seo"], "strategy": ["desktop"]}
+        assert get_journal_path("url", args, "sitemap") != get_journal_path(
+            "url", other_args, "sitemap"
+        )
+
+    def test_shards_have_different_paths(self):
+        args = {"category": ["seo"], "strategy": ["mobile"]}
+        assert get_journal_path("url", args, "sitemap", (1, 2)) != get_journal_path(
+            "url", args, "sitemap", (2, 2)
+        )
+
+
+class TestReplay:
+    """Tests rebuilding a report from the journal of an earlier run."""
+
+    def test_written_results_are_journaled_and_replayed(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        journal = RunJournal(tmp_path / "journal.jsonl")
+        writer = ReportWriter("sitemap", ["seo"], journal)
+        json_resp = {
+            "analysisUTCTimestamp": "2023-02-26T17:36:18",
+            "lighthouseResult": {
+                "finalUrl": "https://example.com/",
+                "configSettings": {"formFactor": "mobile"},
+                "categories": {"seo": {"score": 0.9}},
+                "audits": {"audit": {"score": 1, "numericValue": 300}},
+            },
+        }
+        writer.write("https://example.com", "mobile", json_resp)
+
+        resumed_writer = ReportWriter("sitemap", ["seo"])
+        for record in journal.load():
+            resumed_writer.replay(record)
+        workbook = resumed_writer.workbooks[("mobile", "seo")]
+        assert workbook.url == "https://example.com/"
+        assert workbook.category_scores == [90]
+        assert workbook.audit_results == {"audit": [100, 300]}
@@ -0,0 +1,88 @@
+from pyspeedinsights.core.writer import ReportWriter
+
+
+class TestReportWriter:
+    """Tests writing responses to Excel as they arrive."""
+
+    def _get_json_resp(self, final_url=None, strategy="desktop"):
+        json_resp = {
+            "analysisUTCTimestamp": "2023-02-26T17:36:18",
+            "lighthouseResult": {
+                "configSettings": {"formFactor": strategy},
+                "categories": {"seo": {"score": 1}},
+                "audits": {"audit": {"score": 1, "numericValue": 300}},
+            },
+        }
+        if final_url is not None:
+            json_resp["lighthouseResult"]["finalUrl"] = final_url
+        return json_resp
+
+    def test_workbook_created_on_first_response(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        writer = ReportWriter("sitemap", ["seo"])
+        writer.write("https://example.com/", "desktop", self._get_json_resp())
+        assert ("desktop", "seo") in writer.workbooks
+        first_workbook = writer.workbooks[("desktop", "seo")]
+
+        writer.write("https://example.com/a", "desktop", self._get_json_resp())
+        assert writer.workbooks[("desktop", "seo")] is first_workbook
+        assert first_workbook.category_scores == [100, 100]
+
+        writer.finalize()
+        assert list(tmp_path.glob("*.xlsx"))
+
+    def test_suffixed_workbook_does_not_overwrite_others(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        for suffix in ("", "-merged"):
+            writer = ReportWriter("sitemap", ["seo"], workbook_suffix=suffix)
+            writer.write("https://example.com/", "desktop", self._get_json_resp())
+            writer.finalize()
+        names = [path.name for path in tmp_path.glob("*.xlsx")]
+        assert len(names) == 2
+        assert sum(name.endswith("-merged.xlsx") for name in names) == 1
+
+    def test_missing_final_url_falls_back_to_request_url(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        writer = ReportWriter("excel", ["seo"])
+        writer.write("https://example.com/", "desktop", self._get_json_resp())
+        assert writer.workbooks[("desktop", "seo")].url == "https://example.com/"
+
+    def test_malformed_response_is_skipped(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        writer = ReportWriter("excel", ["seo"])
+        writer.write("https://example.com/", "desktop", {})
+        assert not writer.workbooks
+        writer.finalize()
+        assert not list(tmp_path.glob("*.xlsx"))
+
+    def test_multiple_categories_are_split_into_workbooks(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        json_resp = self._get_json_resp()
+        json_resp["lighthouseResult"]["categories"] = {
+            "seo": {"score": 1, "auditRefs": [{"id": "audit"}]},
+            "accessibility": {"score": 0.5, "auditRefs": [{"id": "label"}]},
+        }
+        json_resp["lighthouseResult"]["audits"]["label"] = {"score": 0}
+        writer = ReportWriter("sitemap", ["seo", "accessibility"])
+        writer.write("https://example.com/", "desktop", json_resp)
+
+        seo, accessibility = (
+            writer.workbooks[("desktop", "seo")],
+            writer.workbooks[("desktop", "accessibility")],
+        )
+        assert list(seo.audit_results) == ["audit"]
+        assert list(accessibility.audit_results) == ["label"]
+        assert accessibility.category_scores == [50]
+        writer.finalize()
+        assert len(list(tmp_path.glob("*.xlsx"))) == 2
+
+    def test_strategies_are_written_to_separate_workbooks(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        writer = ReportWriter("sitemap", ["seo"])
+        for strategy in ("desktop", "mobile"):
+            json_resp = self._get_json_resp(strategy=strategy)
+            writer.write("https://example.com/", strategy, json_resp)
+
+        assert set(writer.workbooks) == {("desktop", "seo"), ("mobile", "seo")}
+        writer.finalize()
+        assert len(list(tmp_path.glob("*.xlsx"))) == 2
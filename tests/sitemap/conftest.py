@@ -1,43 +1,31 @@
-from typing import Optional
+import asyncio
 
 import pytest
-import requests
-from requests.exceptions import HTTPError, RequestException
 
-from pyspeedinsights.core.sitemap import get_sitemap_root
+from pyspeedinsights.core import sitemap as sitemap_module
 
 
-class MockResponse:
-    """Mock response used to patch requests.Response objects"""
-
-    def __init__(
-        self, text: str, status_code: int, exception: Optional[RequestException] = None
-    ):
-        self.text = text  # requests.Response.text
-        self.status_code = status_code  # requests.Response.status_code
-        self.exception = exception  # Custom exception
-        if self.exception:
-            self.raise_for_exception()
-
-    def raise_for_status(self):
-        if 400 <= self.status_code < 600 and self.exception:
-            raise HTTPError("Error", response=self)
+@pytest.fixture
+def patch_fetch(monkeypatch, sitemap):
+    """Fixture to patch sitemap retrieval with sitemaps keyed by URL.
 
-    def raise_for_exception(self):
-        """Response.raise_for_status() only throws HTTPError"""
-        raise self.exception("Error")
+    URLs that aren't in `sitemaps` get the regular sitemap. The URLs fetched and
+    the max number of concurrent fetches are recorded in the returned dict.
+    """
 
+    def wrapper(sitemaps=None, delay=0):
+        stats = {"fetched": [], "in_flight": 0, "max_in_flight": 0}
 
-@pytest.fixture
-def patch_response(monkeypatch, sitemap):
-    """Fixture to patch response with custom status_code and exception"""
+        async def fetch_sitemap(session, url, validators=None):
+            stats["fetched"].append(url)
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            await asyncio.sleep(delay)
+            stats["in_flight"] -= 1
+            yield (sitemaps or {}).get(url, sitemap).encode("utf-8")
 
-    def wrapper(status_code=None, exception=None, *args, **kwargs):
-        monkeypatch.setattr(
-            requests,
-            "get",
-            lambda *args, **kwargs: MockResponse(sitemap, status_code, exception),
-        )
+        monkeypatch.setattr(sitemap_module, "fetch_sitemap", fetch_sitemap)
+        return stats
 
     return wrapper
 
@@ -68,16 +56,6 @@ def sitemap_no_urls(shared_datadir):
     return (shared_datadir / "sitemap_no_urls.xml").read_text()
 
 
-@pytest.fixture
-def sitemap_root(sitemap):
-    return get_sitemap_root(sitemap)
-
-
-@pytest.fixture
-def sitemap_index_root(sitemap_index):
-    return get_sitemap_root(sitemap_index)
-
-
 @pytest.fixture
 def request_url():
     return "https://www.example.com/sitemap.xml"
@@ -86,8 +64,3 @@ def request_url():
 @pytest.fixture
 def sitemap_url():
     return "https://www.example.com/"
-
-
-@pytest.fixture
-def invalid_url():
-    return "https://www.example.com/sitemap.html"
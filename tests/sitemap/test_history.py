@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from pyspeedinsights.core.history import (
+    RunHistory,
+    get_run_id,
+    open_history,
+    sort_by_priority,
+)
+from pyspeedinsights.core.sitemap import SitemapEntry
+
+URL = "https://example.com/"
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = RunHistory(tmp_path / "history.sqlite3")
+    yield history
+    history.close()
+
+
+class TestRunHistory:
+    """Tests the record of when URLs were last tested."""
+
+    def test_untested_url(self, history):
+        assert history.get_tested_at(URL, "desktop") is None
+
+    def test_tested_at_is_recorded_per_strategy(self, history):
+        history.record(URL, "desktop", 100.0)
+        history.record(URL, "desktop", 200.0)
+        assert history.get_tested_at(URL, "desktop") == 200.0
+        assert history.get_tested_at(URL, "mobile") is None
+
+    def test_runs_have_separate_histories(self, tmp_path):
+        path = tmp_path / "history.sqlite3"
+        performance = RunHistory(path, get_run_id({"category": ["performance"]}))
+        performance.record(URL, "desktop", 100.0)
+        performance.close()
+        seo = RunHistory(path, get_run_id({"category": ["seo"]}))
+        assert seo.get_tested_at(URL, "desktop") is None
+        seo.close()
+
+    def test_recording_handler(self, history):
+        handled = []
+        handler = history.recording(lambda *args: handled.append(args))
+        handler(URL, "desktop", {})
+        assert handled == [(URL, "desktop", {})]
+        assert history.get_tested_at(URL, "desktop") is not None
+
+    def test_open_history_uses_cache_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("PSI_CACHE_DIR", str(tmp_path))
+        history = open_history()
+        history.close()
+        assert (tmp_path / "history.sqlite3").exists()
+
+
+class TestGetUnchanged:
+    """Tests selection of the pages an incremental run can skip."""
+
+    def get_unchanged(self, history, tested_at, lastmod=None, max_age=7):
+        history.record(URL, "desktop", tested_at)
+        entries = {URL: SitemapEntry(URL, lastmod=lastmod)}
+        return history.get_unchanged(entries, ["desktop", "mobile"], max_age)
+
+    def test_recently_tested_page_is_skipped(self, history):
+        unchanged = self.get_unchanged(history, time.time() - 3600)
+        assert unchanged == {(URL, "desktop")}  # Never tested with mobile
+
+    def test_page_modified_after_test_is_not_skipped(self, history):
+        tested_at = time.time() - 3600
+        assert not self.get_unchanged(history, tested_at, lastmod=tested_at + 1)
+
+    def test_page_modified_before_test_is_skipped(self, history):
+        tested_at = time.time() - 3600
+        assert self.get_unchanged(history, tested_at, lastmod=tested_at - 1)
+
+    def test_page_older_than_max_age_is_not_skipped(self, history):
+        assert not self.get_unchanged(history, time.time() - 3 * 86400, max_age=2)
+
+
+def test_sort_by_priority_keeps_ties_in_order():
+    entries = {
+        "a": SitemapEntry("a", priority=0.5),
+        "b": SitemapEntry("b", priority=1.0),
+        "c": SitemapEntry("c", priority=0.5),
+    }
+    assert sort_by_priority(["a", "b", "c"], entries) == ["b", "a", "c"]
+
+
+def test_run_id_ignores_url_strategy_and_category_order():
+    args = {"category": ["seo", "performance"], "locale": "en"}
+    assert get_run_id(args) == get_run_id(
+        {"url": "https://example.com", "strategy": ["mobile"], **args}
+    )
+    assert get_run_id(args) == get_run_id({**args, "category": ["performance", "seo"]})
+    assert get_run_id(args) != get_run_id({**args, "locale": "fr"})
@@ -1,64 +1,144 @@
+from datetime import datetime, timezone
+
 import pytest
 
 from pyspeedinsights.core.sitemap import (
+    DEFAULT_PRIORITY,
     SitemapParseError,
-    _parse_sitemap_index,
-    _parse_sitemap_urls,
-    _parse_urls_from_root,
-    process_sitemap,
+    SitemapParser,
+    get_sitemap_entries,
+    parse_lastmod,
 )
 
 
-class TestParseSitemap:
-    """Tests parsing of URLs from sitemap root."""
-
-    def test_regular_sitemap_url_found(self, sitemap_root, sitemap_url):
-        sitemap_urls = _parse_sitemap_urls(sitemap_root)
-        assert sitemap_url in sitemap_urls
-
-    def test_regular_sitemap_wrong_type_url_not_found(self, sitemap_root):
-        sitemap_urls = _parse_urls_from_root(sitemap_root, type="sitemap")
-        assert not sitemap_urls
-
-    def test_sitemap_index_url_found(self, sitemap_index_root, request_url):
-        sitemap_urls = _parse_sitemap_index(sitemap_index_root)
+class TestSitemapParser:
+    """Tests incremental parsing of sitemaps."""
+
+    def parse(self, text, chunk_size=None):
+        parser = SitemapParser()
+        data = text.encode("utf-8")
+        chunk_size = chunk_size or len(data)
+        items = []
+        for i in range(0, len(data), chunk_size):
+            parser.feed(data[i : i + chunk_size])
+            items.extend(parser.pop_items())
+        parser.close()
+        return parser.sitemap_type, items + parser.pop_items()
+
+    def test_regular_sitemap_url_found(self, sitemap, sitemap_url):
+        sitemap_type, entries = self.parse(sitemap)
+        assert sitemap_type == "urlset"
+        assert sitemap_url in [entry.loc for entry in entries]
+
+    def test_sitemap_index_url_found(self, sitemap_index, request_url):
+        sitemap_type, sitemap_urls = self.parse(sitemap_index)
+        assert sitemap_type == "sitemapindex"
         assert request_url in sitemap_urls
 
-    def test_sitemap_index_wrong_type_url_not_found(self, sitemap_index_root):
-        sitemap_urls = _parse_urls_from_root(sitemap_index_root)
-        assert not sitemap_urls
+    def test_small_chunks_give_the_same_items(self, sitemap):
+        assert self.parse(sitemap, chunk_size=7) == self.parse(sitemap)
+
+    def test_items_are_handed_off_as_they_are_parsed(self, sitemap):
+        parser = SitemapParser()
+        parser.feed(sitemap[: sitemap.index("</url>") + len("</url>")])
+        assert len(parser.pop_items()) == 1
+        assert parser.pop_items() == []
+
+    def test_locs_of_other_namespaces_are_ignored(self):
+        _, entries = self.parse(
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+            'xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">'
+            "<url><loc>https://example.com/</loc><image:image>"
+            "<image:loc>https://example.com/a.png</image:loc>"
+            "</image:image></url></urlset>"
+        )
+        assert [entry.loc for entry in entries] == ["https://example.com/"]
+
+    def test_entity_expansion_is_forbidden(self):
+        bomb = (
+            '<!DOCTYPE urlset [<!ENTITY a "aaaaaaaaaa">]>'
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            "<url><loc>&a;</loc></url></urlset>"
+        )
+        with pytest.raises(SitemapParseError):
+            self.parse(bomb)
 
 
 class TestProcessSitemap:
     """Tests processing of URLs from sitemap."""
 
-    def sitemap_raises_parse_error(self, sitemap):
+    def get_sitemap_urls(self, patch_fetch, request_url, sitemap=None):
+        patch_fetch({request_url: sitemap} if sitemap is not None else None)
+        return [entry.loc for entry in get_sitemap_entries(request_url)]
+
+    def sitemap_raises_parse_error(self, patch_fetch, request_url, sitemap):
         with pytest.raises(SitemapParseError):
-            process_sitemap(sitemap)
+            self.get_sitemap_urls(patch_fetch, request_url, sitemap)
 
-    def test_regular_sitemap_processed(self, sitemap, sitemap_url):
+    def test_regular_sitemap_processed(
+        self, patch_fetch, request_url, sitemap, sitemap_url
+    ):
         num_urls = sitemap.count("<loc>")
-        sitemap_urls = process_sitemap(sitemap)
+        sitemap_urls = self.get_sitemap_urls(patch_fetch, request_url)
 
         assert sitemap_url in sitemap_urls
         assert len(sitemap_urls) == num_urls
 
     def test_sitemap_index_processed(
-        self, patch_response, sitemap_index, sitemap, sitemap_url
+        self, patch_fetch, request_url, sitemap_index, sitemap, sitemap_url
     ):
         num_sitemaps = sitemap_index.count("<sitemap>")
         num_urls = sitemap.count("<url>")
-        patch_response(status_code=200, exception=None)
-        sitemap_urls = process_sitemap(sitemap_index)
+        index_url = "https://www.example.com/sitemap_index.xml"
+        sitemap_urls = self.get_sitemap_urls(patch_fetch, index_url, sitemap_index)
 
         assert sitemap_url in sitemap_urls
         assert len(sitemap_urls) == num_sitemaps * num_urls
 
-    def test_invalid_sitemap_exits(self, sitemap_invalid):
-        self.sitemap_raises_parse_error(sitemap_invalid)
+    def test_invalid_sitemap_exits(self, patch_fetch, request_url, sitemap_invalid):
+        self.sitemap_raises_parse_error(patch_fetch, request_url, sitemap_invalid)
+
+    def test_invalid_sitemap_tag_exits(
+        self, patch_fetch, request_url, sitemap_invalid_tag
+    ):
+        self.sitemap_raises_parse_error(patch_fetch, request_url, sitemap_invalid_tag)
+
+    def test_sitemap_no_urls_exits(self, patch_fetch, request_url, sitemap_no_urls):
+        self.sitemap_raises_parse_error(patch_fetch, request_url, sitemap_no_urls)
+
+
+class TestSitemapEntries:
+    """Tests parsing of sitemap URL metadata."""
+
+    @pytest.fixture
+    def entries(self, patch_fetch, request_url):
+        patch_fetch()
+        return get_sitemap_entries(request_url)
+
+    def test_entry_metadata_is_parsed(self, entries):
+        entry = entries[0]
+        assert entry.loc == "https://www.example.com/"
+        assert entry.lastmod == datetime(2005, 1, 1, tzinfo=timezone.utc).timestamp()
+        assert entry.priority == 0.8
+        assert entry.changefreq == "monthly"
+
+    def test_missing_metadata_uses_defaults(self, entries):
+        entry = entries[1]
+        assert entry.lastmod is None
+        assert entry.priority == DEFAULT_PRIORITY
+
+
+class TestParseLastmod:
+    """Tests parsing of W3C datetime lastmod values."""
+
+    def test_date(self):
+        expected = datetime(2024, 5, 1, tzinfo=timezone.utc).timestamp()
+        assert parse_lastmod("2024-05-01") == expected
 
-    def test_invalid_sitemap_tag_exits(self, sitemap_invalid_tag):
-        self.sitemap_raises_parse_error(sitemap_invalid_tag)
+    def test_datetime_with_timezone(self):
+        expected = datetime(2024, 5, 1, 10, tzinfo=timezone.utc).timestamp()
+        assert parse_lastmod("2024-05-01T12:00:00+02:00") == expected
+        assert parse_lastmod("2024-05-01T10:00:00Z") == expected
 
-    def test_sitemap_no_urls_exits(self, sitemap_no_urls):
-        self.sitemap_raises_parse_error(sitemap_no_urls)
+    def test_invalid_value(self):
+        assert parse_lastmod("yesterday") is None
@@ -1,42 +1,225 @@
+import asyncio
+import gzip
+
+import aiohttp
 import pytest
-from requests.exceptions import ConnectionError, HTTPError, RequestException, Timeout
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from pyspeedinsights.core import sitemap as sitemap_module
+from pyspeedinsights.core.sitemap import (
+    SitemapParseError,
+    SitemapRetrievalError,
+    create_sitemap_session,
+    fetch_sitemap,
+    get_sitemap_entries,
+    stream_sitemap_entries,
+)
+
+INDEX = """<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+{}
+</sitemapindex>"""
 
-from pyspeedinsights.core.sitemap import SitemapRetrievalError, request_sitemap
 
+def make_index(*urls):
+    return INDEX.format("".join(f"<sitemap><loc>{u}</loc></sitemap>" for u in urls))
 
-class TestRequestSitemap:
+
+class TestFetchSitemap:
     """Tests requesting sitemap text from a sitemap URL."""
 
-    def raises_retrieval_error(self, url):
+    def fetch(self, handler, path="/sitemap.xml"):
+        async def run():
+            app = web.Application()
+            app.router.add_get(path, handler)
+            async with TestServer(app) as server:
+                async with create_sitemap_session(1) as session:
+                    url = str(server.make_url(path))
+                    chunks = [chunk async for chunk in fetch_sitemap(session, url)]
+                    return b"".join(chunks).decode("utf-8")
+
+        return asyncio.run(run())
+
+    def raises_retrieval_error(self, handler, path="/sitemap.xml"):
         with pytest.raises(SitemapRetrievalError):
-            request_sitemap(url)
+            self.fetch(handler, path)
+
+    def test_200_returns_sitemap(self, sitemap):
+        async def handler(req):
+            return web.Response(text=sitemap, content_type="application/xml")
+
+        assert self.fetch(handler) == sitemap
+
+    def test_gzipped_sitemap_is_decompressed(self, sitemap):
+        async def handler(req):
+            body = gzip.compress(sitemap.encode("utf-8"))
+            return web.Response(body=body, content_type="application/x-gzip")
+
+        assert self.fetch(handler, "/sitemap.xml.gz") == sitemap
+
+    def test_gzip_content_encoding_is_decoded_once(self, sitemap):
+        async def handler(req):
+            body = gzip.compress(sitemap.encode("utf-8"))
+            headers = {"Content-Encoding": "gzip"}
+            return web.Response(body=body, headers=headers)
+
+        assert self.fetch(handler, "/sitemap.xml.gz") == sitemap
+
+    def test_corrupt_gzipped_sitemap_exits(self, sitemap):
+        async def handler(req):
+            body = gzip.compress(sitemap.encode("utf-8"))[:-20]
+            return web.Response(body=body)
+
+        self.raises_retrieval_error(handler, "/sitemap.xml.gz")
+
+    def test_gzip_bomb_exits(self, monkeypatch, sitemap):
+        async def handler(req):
+            return web.Response(body=gzip.compress(sitemap.encode("utf-8")))
+
+        monkeypatch.setattr(sitemap_module, "MAX_DECOMPRESSED_SIZE", 100)
+        self.raises_retrieval_error(handler, "/sitemap.xml.gz")
+
+    def test_gzip_content_encoding_bomb_exits(self, monkeypatch, sitemap):
+        async def handler(req):
+            body = gzip.compress(sitemap.encode("utf-8"))
+            return web.Response(body=body, headers={"Content-Encoding": "gzip"})
+
+        monkeypatch.setattr(sitemap_module, "MAX_DECOMPRESSED_SIZE", 100)
+        self.raises_retrieval_error(handler, "/sitemap.xml.gz")
+
+    def test_invalid_url_exits(self, sitemap):
+        async def handler(req):
+            return web.Response(text=sitemap)
+
+        self.raises_retrieval_error(handler, "/sitemap.html")
+
+    def test_404_client_error_exits(self):
+        async def handler(req):
+            raise web.HTTPNotFound()
+
+        self.raises_retrieval_error(handler)
+
+    def test_500_server_error_exits(self):
+        async def handler(req):
+            raise web.HTTPInternalServerError()
+
+        self.raises_retrieval_error(handler)
+
+    def test_timeout_exits(self, monkeypatch):
+        async def handler(req):
+            await asyncio.sleep(1)
+            return web.Response(text="")
+
+        timeout = aiohttp.ClientTimeout(sock_read=0.05)
+        monkeypatch.setattr(sitemap_module, "SITEMAP_TIMEOUT", timeout)
+        self.raises_retrieval_error(handler)
+
+    def test_connection_error_exits(self):
+        async def run():
+            async with create_sitemap_session(1) as session:
+                async for _ in fetch_sitemap(session, "http://127.0.0.1:1/sitemap.xml"):
+                    pass
+
+        with pytest.raises(SitemapRetrievalError):
+            asyncio.run(run())
+
+
+class TestGetSitemapEntries:
+    """Tests concurrent retrieval of sitemap indexes and their children."""
+
+    root = "https://www.example.com/sitemap_index.xml"
+
+    def test_children_are_fetched_concurrently_in_order(self, patch_fetch, sitemap):
+        children = [f"https://www.example.com/sitemap{i}.xml" for i in range(20)]
+        sitemaps = {self.root: make_index(*children)}
+        for i, child in enumerate(children):
+            sitemaps[child] = sitemap.replace("www.example.com/", f"{i}.example.com/")
+        stats = patch_fetch(sitemaps, delay=0.01)
+
+        entries = get_sitemap_entries(self.root, concurrency=4)
+        hosts = [entry.loc.split("/")[2] for entry in entries]
+        assert list(dict.fromkeys(hosts)) == [f"{i}.example.com" for i in range(20)]
+        assert stats["max_in_flight"] == 4
+
+    def test_index_cycles_are_only_followed_once(self, patch_fetch):
+        child = "https://www.example.com/child_index.xml"
+        sitemaps = {
+            self.root: make_index(child, "https://www.example.com/sitemap.xml"),
+            child: make_index(self.root),
+        }
+        stats = patch_fetch(sitemaps)
+        assert get_sitemap_entries(self.root)
+        assert sorted(stats["fetched"]) == sorted(
+            [self.root, child, "https://www.example.com/sitemap.xml"]
+        )
+
+    def test_indexes_past_max_depth_are_skipped(self, patch_fetch):
+        nested = "https://www.example.com/nested_index.xml"
+        sitemaps = {
+            self.root: make_index(nested, "https://www.example.com/sitemap.xml"),
+            nested: make_index("https://www.example.com/deep.xml"),
+        }
+        stats = patch_fetch(sitemaps)
+        assert get_sitemap_entries(self.root, max_depth=1)
+        assert "https://www.example.com/deep.xml" not in stats["fetched"]
+
+    def test_no_urls_exits(self, patch_fetch):
+        patch_fetch({self.root: make_index()})
+        with pytest.raises(SitemapParseError):
+            get_sitemap_entries(self.root)
+
+    def test_broken_children_are_skipped(self, patch_fetch, sitemap):
+        broken = "https://www.example.com/broken.xml"
+        child = "https://www.example.com/sitemap.xml"
+        patch_fetch({self.root: make_index(broken, child), broken: "<urlset"})
+        locs = {entry.loc for entry in get_sitemap_entries(self.root)}
+        assert locs == {entry.loc for entry in get_sitemap_entries(child)}
+
+
+class TestDecompress:
+    """Tests streaming decompression of gzipped sitemaps."""
+
+    def decompress(self, data, chunk_size):
+        async def chunks():
+            for i in range(0, len(data), chunk_size):
+                yield data[i : i + chunk_size]
+
+        async def run():
+            return [chunk async for chunk in sitemap_module._decompress(chunks())]
+
+        return asyncio.run(run())
+
+    def test_tiny_chunks(self, sitemap):
+        data = sitemap.encode("utf-8")
+        assert b"".join(self.decompress(gzip.compress(data), 1)) == data
+        assert b"".join(self.decompress(data, 1)) == data
+
+    def test_decompressed_chunks_are_bounded(self, monkeypatch, sitemap):
+        monkeypatch.setattr(sitemap_module, "CHUNK_SIZE", 64)
+        data = sitemap.encode("utf-8") * 10
+        chunks = self.decompress(gzip.compress(data), len(data))
+        assert max(len(chunk) for chunk in chunks) <= 64
+        assert b"".join(chunks) == data
 
-    def test_200_no_exception_returns_sitemap(
-        self, patch_response, request_url, sitemap
-    ):
-        patch_response(status_code=200, exception=None)
-        assert request_sitemap(request_url) == sitemap
 
-    def test_200_no_exception_invalid_url_exits(self, patch_response, invalid_url):
-        patch_response(status_code=200, exception=None)
-        self.raises_retrieval_error(invalid_url)
+class TestStreamSitemapEntries:
+    """Tests yielding sitemap entries while the rest of the tree is crawled."""
 
-    def test_404_client_error_exits(self, patch_response, request_url):
-        patch_response(status_code=404, exception=HTTPError)
-        self.raises_retrieval_error(request_url)
+    root = TestGetSitemapEntries.root
 
-    def test_500_server_error_exits(self, patch_response, request_url):
-        patch_response(status_code=500, exception=HTTPError)
-        self.raises_retrieval_error(request_url)
+    def collect(self, url):
+        async def run():
+            return [entry async for entry in stream_sitemap_entries(url)]
 
-    def test_connection_error_exits(self, patch_response, request_url):
-        patch_response(status_code=None, exception=ConnectionError)
-        self.raises_retrieval_error(request_url)
+        return asyncio.run(run())
 
-    def test_timeout_exits(self, patch_response, request_url):
-        patch_response(status_code=None, exception=Timeout)
-        self.raises_retrieval_error(request_url)
+    def test_entries_match_get_sitemap_entries(self, patch_fetch, sitemap):
+        child = "https://www.example.com/sitemap.xml"
+        patch_fetch({self.root: make_index(child)})
+        assert self.collect(self.root) == get_sitemap_entries(self.root)
 
-    def test_request_exception_exits(self, patch_response, request_url):
-        patch_response(status_code=None, exception=RequestException)
-        self.raises_retrieval_error(request_url)
+    def test_no_urls_exits(self, patch_fetch):
+        patch_fetch({self.root: make_index()})
+        with pytest.raises(SitemapParseError):
+            self.collect(self.root)
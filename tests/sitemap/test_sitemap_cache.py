@@ -0,0 +1,121 @@
+import asyncio
+import gc
+import weakref
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from pyspeedinsights.core import sitemap as sitemap_module
+from pyspeedinsights.core.sitemap import SitemapEntry, SitemapValidators
+from pyspeedinsights.core.sitemap_cache import SitemapCache, open_sitemap_cache
+
+URL = "https://www.example.com/sitemap.xml"
+ITEMS = [
+    SitemapEntry("https://www.example.com/", 1700000000.0, 0.8, "daily"),
+    "https://www.example.com/child.xml",
+]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SitemapCache(tmp_path / "sitemaps.sqlite3", 86400)
+    yield cache
+    cache.close()
+
+
+class TestSitemapCache:
+    """Tests storing parsed sitemaps with their validators."""
+
+    def test_items_are_stored_with_validators(self, cache):
+        cache.set(URL, SitemapValidators(etag='"abc"'), ITEMS)
+        assert cache.get_validators(URL) == SitemapValidators(etag='"abc"')
+        assert cache.get_items(URL) == ITEMS
+        assert cache.hits == 1
+
+    def test_sitemaps_without_validators_are_not_stored(self, cache):
+        cache.set(URL, SitemapValidators(), ITEMS)
+        assert cache.get_validators(URL) is None
+        assert cache.get_items(URL) == []
+
+    def test_expired_sitemaps_are_removed(self, tmp_path):
+        path = tmp_path / "sitemaps.sqlite3"
+        cache = SitemapCache(path, 86400)
+        cache.set(URL, SitemapValidators(last_modified="yesterday"), ITEMS)
+        cache.close()
+        cache = SitemapCache(path, -1)
+        assert cache.get_validators(URL) is None
+        cache.close()
+
+    def test_open_sitemap_cache_uses_cache_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("PSI_CACHE_DIR", str(tmp_path))
+        cache = open_sitemap_cache()
+        cache.close()
+        assert (tmp_path / "sitemaps.sqlite3").exists()
+
+
+class TestConditionalRequests:
+    """Tests reusing cached sitemaps the server reports as not modified."""
+
+    def crawl_twice(self, handler, cache):
+        async def run():
+            app = web.Application()
+            app.router.add_get("/sitemap.xml", handler)
+            async with TestServer(app) as server:
+                url = str(server.make_url("/sitemap.xml"))
+                return [await sitemap_module._crawl(url, 1, 1, cache) for _ in range(2)]
+
+        return asyncio.run(run())
+
+    def test_unchanged_sitemap_is_reused(self, cache, sitemap):
+        requests = []
+
+        async def handler(req):
+            requests.append(req.headers.get("If-None-Match"))
+            if req.headers.get("If-None-Match") == '"v1"':
+                return web.Response(status=304)
+            return web.Response(
+                text=sitemap, content_type="application/xml", headers={"ETag": '"v1"'}
+            )
+
+        first, second = self.crawl_twice(handler, cache)
+        assert requests == [None, '"v1"']
+        assert second == first
+        assert cache.hits == 1
+
+    def test_changed_sitemap_replaces_cached_one(self, cache, sitemap):
+        async def handler(req):
+            modified = req.headers.get("If-Modified-Since") is not None
+            text = sitemap.replace("www.example.com/", "new.example.com/")
+            return web.Response(
+                text=text if modified else sitemap,
+                content_type="application/xml",
+                headers={"Last-Modified": "Wed, 21 Oct 2026 07:28:00 GMT"},
+            )
+
+        _, entries = self.crawl_twice(handler, cache)
+        assert all("new.example.com" in entry.loc for entry in entries)
+        assert cache.hits == 0
+
+    def test_sitemap_without_validators_is_not_buffered(
+        self, cache, sitemap, monkeypatch
+    ):
+        async def fetch_sitemap(session, url, validators=None):
+            data = sitemap.encode("utf-8")
+            for i in range(0, len(data), 7):
+                yield data[i : i + 7]
+
+        monkeypatch.setattr(sitemap_module, "fetch_sitemap", fetch_sitemap)
+
+        async def run():
+            crawler = sitemap_module.SitemapCrawler(None, 1, 1, cache)
+            refs, kept = [], 0
+            async for item in crawler.crawl(URL):
+                gc.collect()
+                kept += sum(ref() is not None for ref in refs)
+                refs.append(weakref.ref(item))
+            return len(refs), kept
+
+        crawled, kept = asyncio.run(run())
+        assert crawled > 1
+        assert kept == 0
@@ -15,3 +15,9 @@ class TestValidateSitemapUrl:
 
     def test_no_filename_fails(self):
         assert not validate_sitemap_url(".xml")
+
+    def test_gzipped_extension_passes(self):
+        assert validate_sitemap_url("https://example.com/sitemap.xml.gz")
+
+    def test_other_gzipped_extension_fails(self):
+        assert not validate_sitemap_url("https://example.com/sitemap.txt.gz")
@@ -1,11 +1,19 @@
 import pytest
 
+from pyspeedinsights.utils import serialization
 from pyspeedinsights.utils.generic import (
     remove_dupes_from_list,
     remove_nonetype_dict_items,
     sort_dict_alpha,
 )
-from pyspeedinsights.utils.urls import InvalidURLError, validate_url
+from pyspeedinsights.utils.urls import (
+    InvalidURLError,
+    URLDeduplicator,
+    canonicalize_url,
+    in_shard,
+    index_urls,
+    validate_url,
+)
 
 
 class TestValidateUrl:
@@ -79,6 +87,79 @@ class TestValidateUrl:
         assert mod_url == url.split("?")[0]
 
 
+class TestCanonicalizeUrl:
+    """Tests normalization of URL variants."""
+
+    def test_scheme_and_host_are_lowercased(self):
+        url = canonicalize_url("HTTP://WWW.Example.com/Path")
+        assert url == "http://www.example.com/Path"
+
+    def test_default_ports_are_removed(self):
+        assert canonicalize_url("https://example.com:443/a") == "https://example.com/a"
+        assert canonicalize_url("http://example.com:80/a") == "http://example.com/a"
+
+    def test_other_ports_are_kept(self):
+        url = "https://example.com:8443/a"
+        assert canonicalize_url(url) == url
+
+    def test_tracking_params_are_removed(self):
+        url = canonicalize_url("https://example.com/a?utm_source=x&gclid=y")
+        assert url == "https://example.com/a"
+
+    def test_root_path_gets_a_slash(self):
+        assert canonicalize_url("example.com") == "https://example.com/"
+
+    def test_trailing_slash_policies(self):
+        assert canonicalize_url("https://example.com/a/") == "https://example.com/a/"
+        url = canonicalize_url("https://example.com/a/", "strip")
+        assert url == "https://example.com/a"
+        url = canonicalize_url("https://example.com/a", "add")
+        assert url == "https://example.com/a/"
+
+    def test_invalid_url_raises(self):
+        with pytest.raises(InvalidURLError):
+            canonicalize_url("badurl")
+
+
+class TestIndexUrls:
+    """Tests order-preserving deduplication of canonical URLs."""
+
+    urls = [
+        "https://example.com/b",
+        "https://example.com/a",
+        "HTTP://Example.com/a",
+        "https://example.com/b/",
+        "https://example.com/a?utm_campaign=x",
+        "http://example.com/a",
+    ]
+
+    def test_variants_are_removed_in_order(self):
+        assert list(index_urls(self.urls)) == [
+            "https://example.com/b",
+            "https://example.com/a",
+            "http://example.com/a",
+        ]
+
+    def test_trailing_slash_policy_is_applied(self):
+        assert list(index_urls(self.urls, "add"))[:2] == [
+            "https://example.com/b/",
+            "https://example.com/a/",
+        ]
+
+    def test_deduplicator_removes_variants_inline(self):
+        deduplicator = URLDeduplicator()
+        unique = [deduplicator.add(url) for url in self.urls]
+        assert unique == [
+            "https://example.com/b",
+            "https://example.com/a",
+            "http://example.com/a",
+            None,
+            None,
+            None,
+        ]
+        assert deduplicator.duplicates == 3
+
+
 class TestDictUtils:
     """Tests dictionary utilities."""
 
@@ -108,3 +189,53 @@ class TestDedupeList:
 
     def test_multiple_duplicates_are_removed(self):
         assert remove_dupes_from_list(self.lst).count(self.md) == self.s
+
+    def test_order_is_kept(self):
+        assert remove_dupes_from_list([3, 1, 3, 2, 1]) == [3, 1, 2]
+
+
+class TestInShard:
+    """Tests hash partitioning of URLs into shards."""
+
+    urls = [f"https://example.com/page-{i}" for i in range(100)]
+
+    def get_shards(self, count):
+        return [
+            [u for u in self.urls if in_shard(u, index, count)]
+            for index in range(1, count + 1)
+        ]
+
+    def test_shards_cover_every_url_once(self):
+        shards = self.get_shards(4)
+        assert sorted(u for shard in shards for u in shard) == sorted(self.urls)
+
+    def test_single_shard_has_every_url(self):
+        assert self.get_shards(1) == [self.urls]
+
+    def test_shards_are_stable(self):
+        assert self.get_shards(3) == self.get_shards(3)
+
+
+class TestSerialization:
+    """Tests JSON encoding and decoding with each available backend."""
+
+    obj = {"url": "https://example.com/é", "audits": {"a": {"score": 0.5}}}
+
+    @pytest.fixture(params=["default", "json"])
+    def backend(self, request, monkeypatch):
+        if request.param != "default":
+            monkeypatch.setattr(serialization, "BACKEND", request.param)
+
+    def test_round_trip(self, backend):
+        assert serialization.loads(serialization.dumps(self.obj)) == self.obj
+
+    def test_output_is_compact_by_default(self, backend):
+        assert b"\n" not in serialization.dumps(self.obj)
+        assert b": " not in serialization.dumps(self.obj)
+
+    def test_pretty_output_is_indented(self, backend):
+        assert b'\n  "url"' in serialization.dumps(self.obj, pretty=True)
+
+    def test_invalid_json_raises_value_error(self, backend):
+        with pytest.raises(ValueError):
+            serialization.loads(b"<html>")